@@ -0,0 +1,110 @@
+import asyncio
+import functools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+
+# bcrypt work factor, every stored hash with another cost is rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads doing bcrypt work, bcrypt releases the GIL so they run in parallel
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Requests allowed to wait for a worker before new ones get a 503
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+@functools.lru_cache(maxsize=None)
+def pwd_context():
+    # Built on the first password operation, workers that never see a login
+    # don't import passlib at startup
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context().hash(password)
+
+
+def verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    # Returns a new hash when the stored one was made with another work factor
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    # Dedicated, bounded pool for bcrypt so a login storm cannot take over the
+    # threadpool that serves every other request
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        # Running average of one bcrypt call, used for Retry-After
+        self.average_seconds = 0.25
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                retry_after = math.ceil(self.pending / self.workers * self.average_seconds)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password operations, try again shortly",
+                    headers={"Retry-After": str(max(retry_after, 1))},
+                )
+            self.pending += 1
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                # Released by the worker, a cancelled request still holds its slot until bcrypt finishes
+                self.pending -= 1
+                self.average_seconds = 0.9 * self.average_seconds + 0.1 * elapsed
+
+    async def run(self, func, *args):
+        self._admit()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, func, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "average_ms": round(self.average_seconds * 1000, 1),
+                "rounds": BCRYPT_ROUNDS,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def check_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.run(verify_and_update, password, hashed_password)
@@ -1,31 +1,27 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from app.database.database import get_db
+from app.database.database import get_async_db
 from app.models.models import User
+from app.auth.hashing import check_password
+from app.auth.principal import principal_cache
+from app.models.profiling import add_phase
 
 # JWT Config
 SECRET_KEY = "your-secret-key-here"  # should be in .env in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 class TokenData(BaseModel):
     email: Optional[str] = None
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+    id: Optional[int] = None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -34,44 +30,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    # jose pulls in its crypto backends, imported on first use instead of at startup
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[User]:
+    user = await db.get(User, user_id)
+    if user is not None:
+        # Detach it so the cached copy is never flushed through another session
+        db.expunge(user)
+        principal_cache.set(user_id, user)
+    return user
 
-def authenticate_user(db: Session, email_or_username: str, password: str):
+async def authenticate_user(db: AsyncSession, email_or_username: str, password: str):
     # Try to find user by email
-    user = get_user_by_email(db, email_or_username)
+    user = await get_user_by_email(db, email_or_username)
     
     # If not found, try to find by username
     if not user:
         # Try to get user by username if they provide username instead of email
-        user = db.query(User).filter(User.name == email_or_username).first()
+        user = await db.scalar(select(User).where(User.name == email_or_username).limit(1))
     
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt runs on the dedicated hashing pool, off the event loop
+    valid, new_hash = await check_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Stored with an old work factor, upgrade while we have the password
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import JWTError, jwt
+    start = time.perf_counter()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, id=payload.get("id"))
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=token_data.email)
-    if user is None:
+
+    if token_data.id is None:
+        # Tokens issued before the id claim still resolve by email until they expire
+        user = await get_user_by_email(db, email=token_data.email)
+        cached = False
+    else:
+        user = principal_cache.get(token_data.id)
+        cached = user is not None
+        if user is None:
+            user = await load_principal(db, token_data.id)
+    if user is None or user.email != token_data.email:
         raise credentials_exception
+    elapsed = time.perf_counter() - start
+    principal_cache.observe(cached, elapsed)
+    add_phase("auth", elapsed)
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
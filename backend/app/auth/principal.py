@@ -0,0 +1,70 @@
+import os
+import threading
+from typing import Any, Dict, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.cache import ResultCache
+from app.models.models import User
+
+# Principal cache settings from environment variables. Invalidation is per
+# process: the hooks below only clear this worker's cache, other workers keep
+# serving their copy until it expires, so the TTL bounds how long a profile,
+# subscription or deactivation change takes to reach every worker
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+
+
+class PrincipalCache(ResultCache):
+    # Authenticated users by id, plus the time spent resolving tokens
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size, ttl)
+        self._timing_lock = threading.Lock()
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self.cached_auths = 0
+        self.loaded_auths = 0
+
+    def observe(self, cached: bool, seconds: float) -> None:
+        with self._timing_lock:
+            if cached:
+                self.cached_auths += 1
+                self.hit_seconds += seconds
+            else:
+                self.loaded_auths += 1
+                self.miss_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._timing_lock:
+            stats["avg_auth_us"] = {
+                "cached": round(self.hit_seconds / self.cached_auths * 1e6, 1) if self.cached_auths else 0.0,
+                "loaded": round(self.miss_seconds / self.loaded_auths * 1e6, 1) if self.loaded_auths else 0.0,
+            }
+        return stats
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+# Commits made in this process drop the users they changed from this process's
+# cache, nothing is sent to other workers
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # Profile, subscription, password and is_active changes all flush a User
+    changed: Set[int] = session.info.setdefault("changed_user_ids", set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User) and instance.id is not None:
+            changed.add(instance.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # Only after commit, so a concurrent request cannot cache the old row again
+    for user_id in session.info.pop("changed_user_ids", ()):
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
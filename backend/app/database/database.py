@@ -1,7 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from app.database.pool import instrument_engine
+from app.models.profiling import instrument_queries
 import os
 
 load_dotenv()
@@ -9,9 +12,54 @@ load_dotenv()
 # Database URL from environment variable or default
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5438/houseapp")
 
-engine = create_engine(DATABASE_URL)
+# Async drivers for the same database: asyncpg for PostgreSQL, aiosqlite for SQLite
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Connection pool settings, shared by both engines
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Connections opened at startup, 0 disables pre-warming
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", str(DB_POOL_SIZE)))
+
+def pool_options(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    # SQLite picks its own pool class, which may not take sizing arguments
+    if not url.startswith("sqlite"):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+# Sync engine for startup, scripts and migrations
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request handlers
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Checkout latency and pool usage, served by /api/metrics/pool, checkout
+# latency also by /metrics
+pool_metrics = {
+    "sync": instrument_engine(engine, "sync"),
+    "async": instrument_engine(async_engine.sync_engine, "async"),
+}
+
+# Query time and count per request, for /metrics
+instrument_queries(engine)
+instrument_queries(async_engine.sync_engine)
+
 Base = declarative_base()
 
 # Dependency to get DB session
@@ -20,4 +68,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db 
\ No newline at end of file
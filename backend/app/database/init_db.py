@@ -1,6 +1,90 @@
+import argparse
+import os
+from typing import Optional
+from sqlalchemy import Column, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
-from app.models.models import User, Material, HouseType, MaterialType
-from app.auth.jwt import get_password_hash
+from app.database.database import engine
+from app.models.models import Base, User, Material, HouseType, MaterialType
+from app.models.pricing import bump_catalog_version
+from app.auth.hashing import get_password_hash
+
+# Head revision of migrations/versions, bump it with every new migration.
+# Workers only compare it with the database at startup, creating or migrating
+# the database is a separate step: python -m app.database.init_db
+SCHEMA_VERSION = "9d2b7e4f1a63"
+
+# alembic.ini and migrations/ live next to the app package
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The table alembic keeps the applied revision in
+alembic_version = Table(
+    "alembic_version", MetaData(),
+    Column("version_num", String(32), primary_key=True),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def schema_version(engine: Engine) -> Optional[str]:
+    # One query, None when the database has never been migrated
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(alembic_version.c.version_num))
+    except DBAPIError:
+        return None
+
+
+def setup_database(engine: Engine) -> None:
+    # Fresh database: the models are the head schema, so create them and
+    # stamp the head revision instead of replaying every migration
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        init_db(db)
+    with engine.begin() as connection:
+        alembic_version.create(connection, checkfirst=True)
+        connection.execute(alembic_version.delete())
+        connection.execute(alembic_version.insert().values(version_num=SCHEMA_VERSION))
+    print(f"Database created at revision {SCHEMA_VERSION}")
+
+
+def check_schema(engine: Engine) -> None:
+    # Run by every worker at startup, a single SELECT once the database is set up
+    version = schema_version(engine)
+    if version == SCHEMA_VERSION:
+        return
+    if version is None and not inspect(engine).get_table_names():
+        # Nothing there yet, e.g. a development database: set it up once.
+        # Run the CLI before starting several workers against a fresh database
+        setup_database(engine)
+        return
+    found = f"at revision {version}" if version else "not versioned"
+    raise SchemaVersionError(
+        f"Database schema is {found}, this code needs {SCHEMA_VERSION}: "
+        "run `alembic upgrade head` before starting the app"
+    )
+
+
+def upgrade_database(engine: Engine) -> None:
+    # Brings an existing database to SCHEMA_VERSION. The migrations start from
+    # the tables the app created before it was versioned, so they cannot build
+    # an empty database: that one is created at head and stamped instead
+    version = schema_version(engine)
+    if version == SCHEMA_VERSION:
+        return
+    if version is None and not inspect(engine).get_table_names():
+        setup_database(engine)
+        return
+    from alembic import command
+    from alembic.config import Config
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    print(f"Migrating the database from {version or 'an unversioned schema'} to {SCHEMA_VERSION}")
+    command.upgrade(config, "head")
+
 
 def init_db(db: Session):
     # Check if we already have the admin user
@@ -209,5 +293,26 @@ def init_db(db: Session):
         for material in (brick_materials + concrete_materials + wooden_materials + blocks_materials):
             db.add(material)
         
+        bump_catalog_version(db)
         db.commit()
-        print("Sample materials added successfully") 
\ No newline at end of file
+        print("Sample materials added successfully")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Create or migrate the database and seed the admin user and sample materials"
+    )
+    parser.parse_args()
+    upgrade_database(engine)
+    try:
+        check_schema(engine)
+    except SchemaVersionError as exc:
+        raise SystemExit(str(exc))
+    # Already set up: only adds the admin user or materials when they are missing
+    with Session(engine) as db:
+        init_db(db)
+    print(f"Database is at revision {SCHEMA_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.models.profiling import POOL_CHECKOUT_SECONDS
+
+# Number of recent checkouts kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+
+class PoolMetrics:
+    # Checkout latency and connection counters for one engine's pool
+
+    def __init__(self, engine: Engine, name: str):
+        self.engine = engine
+        self.name = name
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def observe_checkout(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+            self._latencies.append(seconds)
+        # Also exported on /metrics, the window above only covers recent checkouts
+        POOL_CHECKOUT_SECONDS.observe((self.name,), seconds)
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "pool": type(pool).__name__,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_ms": {
+                    "avg": round(self.checkout_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "p50": _percentile_ms(latencies, 0.5),
+                    "p95": _percentile_ms(latencies, 0.95),
+                    "p99": _percentile_ms(latencies, 0.99),
+                    "max": round(self.max_checkout_seconds * 1000, 3),
+                },
+            }
+        # Only queue pools keep a fixed size and overflow
+        if hasattr(pool, "checkedout"):
+            stats.update(
+                size=pool.size(),
+                in_use=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return stats
+
+
+def _percentile_ms(latencies, fraction: float) -> float:
+    if not latencies:
+        return 0.0
+    index = min(int(len(latencies) * fraction), len(latencies) - 1)
+    return round(latencies[index] * 1000, 3)
+
+
+def _time_checkouts(pool, metrics: PoolMetrics) -> None:
+    # Pool.connect is where a request waits for a free connection (and pays
+    # for pre-ping or a new connection), so that is what gets timed
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            connection = connect()
+        except PoolTimeoutError:
+            metrics.count("timeouts")
+            raise
+        metrics.observe_checkout(time.perf_counter() - start)
+        return connection
+
+    pool.connect = timed_connect
+
+
+def instrument_engine(engine: Engine, name: str) -> PoolMetrics:
+    metrics = PoolMetrics(engine, name)
+    _time_checkouts(engine.pool, metrics)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.count("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.count("invalidations")
+
+    @event.listens_for(engine, "engine_disposed")
+    def on_disposed(disposed_engine):
+        # dispose() swaps in a fresh pool, keep timing it
+        _time_checkouts(disposed_engine.pool, metrics)
+
+    return metrics
+
+
+def prewarm_engine(engine: Engine, connections: int) -> int:
+    # Open the connections together so they all stay in the pool afterwards
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+async def prewarm_async_engine(engine: AsyncEngine, connections: int) -> int:
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(connections)), return_exceptions=True
+    )
+    opened = [result for result in results if not isinstance(result, BaseException)]
+    await asyncio.gather(*(connection.close() for connection in opened))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return len(opened)
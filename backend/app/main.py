@@ -6,28 +6,37 @@ import app.routers.auth as auth
 import app.routers.users as users
 import app.routers.calculations as calculations
 import app.routers.materials as materials
-from app.database.database import engine, get_db
-from app.models.models import Base, User
-from app.database.init_db import init_db
+from app.database.database import engine, async_engine, get_db, get_async_db, pool_metrics, DB_POOL_PREWARM
+from app.database.pool import prewarm_async_engine
+from app.models.models import User
+from app.database.init_db import check_schema
+from app.models.pricing import price_index
+from app.models.jobs import job_manager
+from app.models.write_queue import calculation_queue
+from app.models.profiling import (
+    PROFILING_ENABLED, PROMETHEUS_CONTENT_TYPE, QUERY_AUDIT, ProfilingMiddleware,
+    metrics_authorized, render_metrics
+)
+from app.models.serialization import RawJSONResponse
 from app.auth.jwt import (
-    authenticate_user, create_access_token, get_password_hash,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user, create_access_token,
+    get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from app.auth.hashing import hash_password, password_hasher
 from app.models.schemas import UserCreate, UserResponse, Token
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Any
 from fastapi import status, HTTPException
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
-
 # Initialize the FastAPI app
 app = FastAPI(
     title="House Calculator API",
     description="API for calculating house construction materials",
     version="1.0.0",
+    default_response_class=RawJSONResponse,
 )
 
 # Add CORS middleware
@@ -39,6 +48,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route timing broken into phases, served at /metrics, and the query
+# audit. Added last so it is the outermost middleware and times everything else
+if PROFILING_ENABLED or QUERY_AUDIT != "off":
+    app.add_middleware(ProfilingMiddleware)
+
 # Register routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -53,25 +67,63 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
         content={"message": "Database error occurred", "detail": str(exc)},
     )
 
-# Initialize database with default data on startup
 @app.on_event("startup")
 async def startup_event():
+    # Tables and seed data come from `python -m app.database.init_db` or
+    # alembic, a worker only checks the schema revision
+    check_schema(engine)
     db = next(get_db())
-    init_db(db)
+    # Load material prices once, calculations are priced from memory
+    price_index.load(db)
+    db.close()
+    # Resumes writing calculations accepted before a restart
+    calculation_queue.start()
+    # Open pooled connections now so the first requests don't pay for them
+    if DB_POOL_PREWARM and hasattr(async_engine.pool, "checkedout"):
+        await prewarm_async_engine(async_engine, min(DB_POOL_PREWARM, async_engine.pool.size()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    calculation_queue.stop()
+    await async_engine.dispose()
+    password_hasher.shutdown()
+    job_manager.shutdown()
 
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/metrics/pool")
+def get_pool_metrics(current_user: User = Depends(get_current_active_user)):
+    # Only admin users can inspect the connection pools
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view pool metrics",
+        )
+
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    # Prometheus text format, scrapers send METRICS_TOKEN instead of a user token
+    if not metrics_authorized(request.headers.get("authorization")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authorized to view metrics",
+        )
+
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to House Calculator API. Navigate to /docs for API documentation."}
 
 # Direct API routes for compatibility with frontend
 @app.post("/api/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def direct_register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def direct_register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     # Check if user with the same email already exists
-    db_user = db.query(User).filter(User.email == user_data.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user_data.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -79,7 +131,7 @@ def direct_register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -91,14 +143,13 @@ def direct_register(user_data: UserCreate, db: Session = Depends(get_db)) -> Any
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     return db_user
 
 @app.post("/api/login", response_model=Token)
-def direct_login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Any:
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def direct_login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)) -> Any:
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -107,7 +158,7 @@ def direct_login(response: Response, form_data: OAuth2PasswordRequestForm = Depe
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "id": user.id}, expires_delta=access_token_expires
     )
     
     # Set a cookie to simulate authentication
@@ -122,7 +173,7 @@ def direct_login(response: Response, form_data: OAuth2PasswordRequestForm = Depe
     return response_data
 
 @app.get("/api/user", response_model=UserResponse)
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_async_db)):
     # Try to get user id from cookie
     session_cookie = request.cookies.get("session", "")
     user_id = None
@@ -131,14 +182,14 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         try:
             user_id = int(session_cookie.split("user_id=")[1])
             # Try to get user by id
-            user = db.query(User).filter(User.id == user_id).first()
+            user = await db.scalar(select(User).where(User.id == user_id))
             if user:
                 return user
         except:
             pass
     
     # Fallback: return first active user
-    user = db.query(User).filter(User.is_active == True).first()
+    user = await db.scalar(select(User).where(User.is_active == True).limit(1))
     
     if not user:
         raise HTTPException(
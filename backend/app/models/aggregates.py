@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models.models import (
+    Calculation, CalculationDocument, HouseType, HouseTypeMaterialTotal, HouseTypeStats,
+    UserCalculationStats, UserMaterialTotal,
+)
+
+# Rows read per round trip while rebuilding
+AGGREGATE_REBUILD_BATCH_SIZE = int(os.getenv("AGGREGATE_REBUILD_BATCH_SIZE", "1000"))
+
+# (user_id, house type, result_data, +1 for a saved calculation or -1 for a removed one)
+Entry = Tuple[int, Any, Dict[str, Any], int]
+
+TOTALS = ("calculations", "total_area", "total_cost")
+MATERIAL_TOTALS = ("quantity", "total_price")
+
+TABLES = (
+    (UserCalculationStats, ("user_id",), TOTALS),
+    (HouseTypeStats, ("house_type",), TOTALS),
+    (UserMaterialTotal, ("user_id", "name", "unit"), MATERIAL_TOTALS),
+    (HouseTypeMaterialTotal, ("house_type", "name", "unit"), MATERIAL_TOTALS),
+)
+
+Sums = Dict[Any, Dict[Tuple, List[float]]]
+
+
+def _house_type(value: Any) -> HouseType:
+    return value if isinstance(value, HouseType) else HouseType(getattr(value, "value", value))
+
+
+def collect(entries: Iterable[Entry]) -> Sums:
+    # Sums per table and key, so a batch touches each summary row once
+    sums: Sums = {model: defaultdict(lambda size=len(fields): [0] * size) for model, _, fields in TABLES}
+    for user_id, house_type, result_data, sign in entries:
+        house_type = _house_type(house_type)
+        result_data = result_data or {}
+        totals = (sign, sign * (result_data.get("total_area") or 0.0), sign * (result_data.get("total_cost") or 0.0))
+        for model, key in ((UserCalculationStats, (user_id,)), (HouseTypeStats, (house_type,))):
+            row = sums[model][key]
+            for index, value in enumerate(totals):
+                row[index] += value
+        for item in result_data.get("materials", []):
+            amounts = (sign * item["quantity"], sign * (item.get("total_price") or 0.0))
+            for model, key in (
+                (UserMaterialTotal, (user_id, item["name"], item["unit"])),
+                (HouseTypeMaterialTotal, (house_type, item["name"], item["unit"])),
+            ):
+                row = sums[model][key]
+                row[0] += amounts[0]
+                row[1] += amounts[1]
+    return sums
+
+
+def record_calculations(db: Session, entries: Iterable[Entry]) -> None:
+    # Adds the entries to the summary tables with one upsert per table, in the
+    # caller's transaction so the totals commit together with the calculations
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    sums = collect(entries)
+    for model, keys, fields in TABLES:
+        rows = [
+            {**dict(zip(keys, key)), **dict(zip(fields, values))}
+            for key, values in sums[model].items()
+        ]
+        if not rows:
+            continue
+        statement = dialect.insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={field: getattr(model, field) + statement.excluded[field] for field in fields},
+        )
+        db.execute(statement)
+
+
+def compute_aggregates(db: Session) -> Sums:
+    # Recomputes every total from the saved calculations, a batch at a time
+    query = select(
+        Calculation.user_id, Calculation.house_type, CalculationDocument.result_data
+    ).join(Calculation.document).execution_options(yield_per=AGGREGATE_REBUILD_BATCH_SIZE)
+    return collect(
+        (user_id, house_type, result_data, 1)
+        for user_id, house_type, result_data in db.execute(query)
+        if house_type is not None
+    )
+
+
+def stored_aggregates(db: Session) -> Sums:
+    stored: Sums = {}
+    for model, keys, fields in TABLES:
+        stored[model] = {
+            tuple(getattr(row, key) for key in keys): [getattr(row, field) for field in fields]
+            for row in db.scalars(select(model))
+        }
+    return stored
+
+
+def differences(expected: Sums, stored: Sums) -> List[Dict[str, Any]]:
+    # Float sums built one calculation at a time drift in the last digits, so
+    # values are compared with a relative tolerance
+    found = []
+    for model, keys, fields in TABLES:
+        for key in set(expected[model]) | set(stored[model]):
+            want = expected[model].get(key, [0] * len(fields))
+            have = stored[model].get(key, [0] * len(fields))
+            if any(not math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6) for a, b in zip(want, have)):
+                found.append({
+                    "table": model.__tablename__,
+                    "key": [getattr(part, "value", part) for part in key],
+                    "expected": dict(zip(fields, want)),
+                    "stored": dict(zip(fields, have)),
+                })
+    return found
+
+
+def rebuild_aggregates(db: Session, check: bool = False) -> Dict[str, Any]:
+    # With check, only reports how the stored totals differ from a rebuild.
+    # Otherwise replaces them, in the caller's transaction
+    if not check and db.get_bind().dialect.name == "postgresql":
+        # Writers queue behind the lock and add their calculations after the
+        # rebuild commits, so none is counted twice or lost
+        db.execute(text("LOCK TABLE " + ", ".join(model.__tablename__ for model, _, _ in TABLES)
+                        + " IN EXCLUSIVE MODE"))
+    expected = compute_aggregates(db)
+    found = differences(expected, stored_aggregates(db))
+    if not check:
+        for model, keys, fields in TABLES:
+            db.execute(delete(model))
+            rows = [
+                {**dict(zip(keys, key)), **dict(zip(fields, values))}
+                for key, values in expected[model].items()
+            ]
+            if rows:
+                db.execute(insert(model), rows)
+    return {"differences": len(found), "details": found[:100], "rebuilt": not check}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the calculation summary tables")
+    parser.add_argument("--check", action="store_true", help="only report differences, change nothing")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = rebuild_aggregates(db, check=args.check)
+        db.commit()
+    finally:
+        db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.check and report["differences"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
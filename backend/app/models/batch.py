@@ -0,0 +1,180 @@
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+from pydantic import TypeAdapter
+from app.models.schemas import CalculationResult, HouseTypeEnum
+from app.models.rules import (
+    HOUSE_TYPE_RULES, FOUNDATION_BASES, ROOF_MATERIAL_NAME,
+    matches, round_quantity, units_scale, validate_rules
+)
+
+# Batch engine: packs every wall of every house into column arrays and computes
+# the materials for the whole batch in a few vectorized passes. It is compiled
+# from the same rule table as the scalar calculators and applies the factors in
+# the same order, so each house gets exactly the same CalculationResult.
+# Foundations, roofs and last wall materials are only read by the rule
+# conditions and names: the columns hold their distinct values plus a group
+# index per house, so a batch that shares them, like a sweep, checks each once.
+
+
+def _wall_column(walls: List[Dict[str, Any]], key: str, default: Any, dtype: Any = np.float64) -> np.ndarray:
+    values = map(itemgetter(key), walls)
+    if dtype is bool:
+        values = map(bool, values)
+    try:
+        return np.fromiter(values, dtype=dtype, count=len(walls))
+    except KeyError:
+        # Hand-built payloads may omit keys, fall back to the scalar defaults
+        return np.array([wall.get(key, default) for wall in walls]).astype(dtype)
+
+
+def pack_houses(houses: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    foundations = [house.get("foundation", {}) for house in houses]
+    roofs = [house.get("roof", {}) for house in houses]
+
+    walls = []
+    wall_counts = []
+    last_material = []
+    for house in houses:
+        house_walls = house.get("walls", [])
+        walls.extend(house_walls)
+        wall_counts.append(len(house_walls))
+        last_material.append(house_walls[-1].get("material", "") if house_walls else "")
+
+    every_house = np.arange(len(houses), dtype=np.intp)
+    return {
+        "count": len(houses),
+        "foundations": foundations,
+        "foundation_group": every_house,
+        "roofs": roofs,
+        "roof_group": every_house,
+        "foundation_width": np.array([f.get("width", 0) for f in foundations], dtype=np.float64),
+        "foundation_depth": np.array([f.get("depth", 0) for f in foundations], dtype=np.float64),
+        "foundation_length": np.array([f.get("length", 0) for f in foundations], dtype=np.float64),
+        "roof_length": np.array([r.get("length", 0) for r in roofs], dtype=np.float64),
+        "roof_width": np.array([r.get("width", 0) for r in roofs], dtype=np.float64),
+        "wall_house": np.repeat(np.arange(len(houses), dtype=np.intp), wall_counts),
+        "wall_length": _wall_column(walls, "length", 0),
+        "wall_height": _wall_column(walls, "height", 0),
+        "wall_width": _wall_column(walls, "width", 0),
+        "wall_finishing": _wall_column(walls, "finishing", "", dtype=bool),
+        "last_materials": last_material,
+        "last_material_group": every_house,
+    }
+
+
+def per_group(values: Sequence[Any], groups: np.ndarray) -> List[Any]:
+    # One value per distinct section, spread over the houses of its group
+    return np.array(values, dtype=object)[groups].tolist()
+
+
+def _apply_factors(values: np.ndarray, factors: Sequence[float]) -> np.ndarray:
+    for factor in factors:
+        values = values * factor
+    return values
+
+
+def _item(name: str, quantity: float, unit: str) -> Dict[str, Any]:
+    return {"name": name, "quantity": quantity, "unit": unit}
+
+
+def compile_batch_calculator(rule: Dict[str, Any]) -> Callable[[Dict[str, Any]], List[Dict[str, Any]]]:
+    roof_pitch = rule["roof_pitch"]
+
+    def calculate(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+        count = columns["count"]
+        house_items: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+
+        def add(items, name, quantities, unit, digits, selected=None):
+            for i in range(count):
+                if selected is None or selected[i]:
+                    items[i].append(_item(name if isinstance(name, str) else name[i],
+                                          round_quantity(quantities[i], digits), unit))
+
+        width = columns["foundation_width"]
+        depth = columns["foundation_depth"]
+        length = columns["foundation_length"]
+        for item in rule["foundation"]:
+            quantities = _apply_factors(FOUNDATION_BASES[item["base"]](width, depth, length), item.get("factors", ()))
+            selected = per_group([matches(f, item.get("when")) for f in columns["foundations"]],
+                                 columns["foundation_group"])
+            add(house_items, item["name"], quantities.tolist(), item["unit"], item.get("round"), selected)
+
+        def per_house(values: np.ndarray) -> List[float]:
+            # bincount accumulates in wall order, matching the scalar running sums
+            return np.bincount(columns["wall_house"], weights=values, minlength=count).tolist()
+
+        wall_area = columns["wall_length"] * columns["wall_height"]
+        wall_width = columns["wall_width"]
+        for item in rule["walls"]:
+            if item["base"] == "area":
+                values = wall_area
+            elif item["base"] == "volume":
+                values = wall_area * wall_width / 100
+            else:
+                values = wall_area * (units_scale(item) * wall_width)
+            values = _apply_factors(values, item.get("factors", ()))
+            if item.get("finished_only"):
+                values = np.where(columns["wall_finishing"], values, 0.0)
+            totals = per_house(values)
+            selected = [total > 0 for total in totals] if item.get("skip_zero") else None
+            if item.get("name_from"):
+                name = per_group(columns["last_materials"], columns["last_material_group"])
+            else:
+                name = item["name"]
+            add(house_items, name, totals, item["unit"], item.get("round"), selected)
+
+        roof_area = (columns["roof_length"] * columns["roof_width"] * roof_pitch).tolist()
+        for item in rule["roof"]:
+            quantities = _apply_factors(np.array(roof_area), item.get("factors", ())).tolist()
+            selected = per_group([matches(r, item.get("when")) for r in columns["roofs"]], columns["roof_group"])
+            add(house_items, item["name"], quantities, item["unit"], item.get("round"), selected)
+
+        roof_names = per_group([ROOF_MATERIAL_NAME.format(material=r.get("material", "")) for r in columns["roofs"]],
+                               columns["roof_group"])
+        add(house_items, roof_names, roof_area, "m²", 2)
+
+        total_area = per_house(wall_area)
+        return [
+            {"materials": house_items[i], "total_area": round(total_area[i] + roof_area[i], 2)}
+            for i in range(count)
+        ]
+
+    return calculate
+
+
+def compile_batch_rules(
+    rules: Dict[HouseTypeEnum, Dict[str, Any]]
+) -> Dict[HouseTypeEnum, Callable[[Dict[str, Any]], List[Dict[str, Any]]]]:
+    validate_rules(rules)
+    return {house_type: compile_batch_calculator(rule) for house_type, rule in rules.items()}
+
+
+# Results are assembled as plain dicts and validated into models in one call per batch
+_RESULTS_ADAPTER = TypeAdapter(List[CalculationResult])
+
+BATCH_CALCULATORS = compile_batch_rules(HOUSE_TYPE_RULES)
+
+
+def calculate_materials_batch(items: Sequence[Tuple[HouseTypeEnum, Dict[str, Any]]]) -> List[CalculationResult]:
+    # Group houses by type, keeping their position in the batch
+    groups: Dict[HouseTypeEnum, List[int]] = {}
+    for index, (house_type, _) in enumerate(items):
+        if house_type not in BATCH_CALCULATORS:
+            raise ValueError(f"Unsupported house type: {house_type}")
+        groups.setdefault(house_type, []).append(index)
+
+    results: List[Dict[str, Any]] = [None] * len(items)
+    for house_type, indices in groups.items():
+        columns = pack_houses([items[i][1] for i in indices])
+        for index, result in zip(indices, BATCH_CALCULATORS[house_type](columns)):
+            results[index] = result
+
+    return _RESULTS_ADAPTER.validate_python(results)
+
+
+def calculate_packed(house_type: HouseTypeEnum, columns: Dict[str, Any]) -> List[CalculationResult]:
+    # Houses of one type already packed into columns, as the sweep builds them
+    if house_type not in BATCH_CALCULATORS:
+        raise ValueError(f"Unsupported house type: {house_type}")
+    return _RESULTS_ADAPTER.validate_python(BATCH_CALCULATORS[house_type](columns))
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.models.schemas import CalculationResult, HouseTypeEnum
+from app.models.calculations import calculate_materials
+from app.models.rules import RULES_VERSION
+
+# Cache settings from environment variables
+CALCULATION_CACHE_SIZE = int(os.getenv("CALCULATION_CACHE_SIZE", "1024"))
+CALCULATION_CACHE_TTL = float(os.getenv("CALCULATION_CACHE_TTL", "600"))
+
+
+class ResultCache:
+    # Thread-safe LRU cache with a per-entry time to live
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+result_cache = ResultCache(CALCULATION_CACHE_SIZE, CALCULATION_CACHE_TTL)
+
+
+def canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def normalize_calculation(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Only the sections the calculators read, canonical() sorts their keys.
+    # Walls keep their order: the blocks item is named after the last wall and
+    # the totals are summed in wall order, so a reordered house is another key
+    return {
+        "foundation": data.get("foundation", {}),
+        "walls": data.get("walls", []),
+        "roof": data.get("roof", {}),
+    }
+
+
+def calculation_key(house_type: HouseTypeEnum, data: Dict[str, Any]) -> str:
+    # The rules version is part of the key, so a coefficient change misses the cache
+    payload = canonical([RULES_VERSION, house_type.value, data])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_calculate_materials(house_type: HouseTypeEnum, data: Dict[str, Any]) -> CalculationResult:
+    # The normalized payload is only the key, results are always calculated
+    # from the submitted data, exactly as calculate_materials would
+    key = calculation_key(house_type, normalize_calculation(data))
+
+    result = result_cache.get(key)
+    if result is None:
+        result = calculate_materials(house_type, data)
+        result_cache.set(key, result)
+
+    # Callers may fill in prices, never hand out the cached instance
+    return result.model_copy(deep=True)
@@ -1,5 +1,11 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from app.models.schemas import CalculationResult, CalculationResultItem, HouseTypeEnum
+from app.models.rules import HOUSE_TYPE_RULES, compile_rules
+
+# Calculators compiled once from the declarative rule table in app/models/rules.py.
+# The calculate_*_house functions below are the reference implementations the
+# compiled calculators are checked against (see benchmarks/rules_parity.py).
+CALCULATORS = compile_rules(HOUSE_TYPE_RULES)
 
 def calculate_brick_house(data: Dict[str, Any]) -> CalculationResult:
     foundation = data.get("foundation", {})
@@ -456,14 +462,19 @@ def calculate_blocks_house(data: Dict[str, Any]) -> CalculationResult:
         total_area=round(total_area, 2)
     )
 
+REFERENCE_CALCULATORS = {
+    HouseTypeEnum.BRICK: calculate_brick_house,
+    HouseTypeEnum.CONCRETE: calculate_concrete_house,
+    HouseTypeEnum.WOODEN: calculate_wooden_house,
+    HouseTypeEnum.BLOCKS: calculate_blocks_house,
+}
+
 def calculate_materials(house_type: HouseTypeEnum, data: Dict[str, Any]) -> CalculationResult:
-    if house_type == HouseTypeEnum.BRICK:
-        return calculate_brick_house(data)
-    elif house_type == HouseTypeEnum.CONCRETE:
-        return calculate_concrete_house(data)
-    elif house_type == HouseTypeEnum.WOODEN:
-        return calculate_wooden_house(data)
-    elif house_type == HouseTypeEnum.BLOCKS:
-        return calculate_blocks_house(data)
-    else:
-        raise ValueError(f"Unsupported house type: {house_type}") 
\ No newline at end of file
+    calculator = CALCULATORS.get(house_type)
+    if calculator is None:
+        raise ValueError(f"Unsupported house type: {house_type}")
+    return calculator(data)
+
+def calculate_shard(items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Entry point for batch job worker processes: plain values in and out keep pickling cheap
+    return [calculate_materials(HouseTypeEnum(house_type), data).dict() for house_type, data in items]
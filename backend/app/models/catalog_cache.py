@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+from app.models.models import Material
+
+# Seconds clients and proxies may reuse a material response before revalidating
+MATERIAL_CACHE_MAX_AGE = int(os.getenv("MATERIAL_CACHE_MAX_AGE", "60"))
+
+CACHE_CONTROL = f"public, max-age={MATERIAL_CACHE_MAX_AGE}"
+
+
+def material_dict(material: Material) -> Dict[str, Any]:
+    # Same fields and order as MaterialResponse
+    return {
+        "name": material.name,
+        "type": material.type.value if material.type else None,
+        "house_type": material.house_type.value if material.house_type else None,
+        "price_per_unit": material.price_per_unit,
+        "unit": material.unit,
+        "description": material.description,
+        "id": material.id,
+    }
+
+
+def dumps(content: Any) -> bytes:
+    # Matches FastAPI's JSONResponse encoding
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def serialize_materials(materials: Iterable[Material]) -> bytes:
+    return dumps([material_dict(material) for material in materials])
+
+
+def serialize_material(material: Material) -> bytes:
+    return dumps(material_dict(material))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so a W/ prefix still matches
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CatalogCache:
+    # Serialized material responses for one catalog version, keyed by scope
+    # ("all", "house:brick", "id:3"). A new version drops every body at once,
+    # so an entry is never served for a catalog it was not built from
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._bodies: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def etag(version: int, scope: str) -> str:
+        # The catalog version fixes the content, so the tag needs no body hash
+        # and a conditional request is answered before anything is loaded
+        return f'"materials-{version}-{scope}"'
+
+    def get(self, version: int, scope: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get(scope) if version == self.version else None
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return body
+
+    def put(self, version: int, scope: str, body: bytes) -> None:
+        with self._lock:
+            if version != self.version:
+                if self.version is not None and version < self.version:
+                    return
+                self.version = version
+                self._bodies = {}
+            self._bodies[scope] = body
+
+    def mark_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._bodies),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,217 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models.models import HouseType, Material, MaterialType
+from app.models.pricing import bump_catalog_version, price_index
+from app.models.schemas import MaterialCreate
+
+# Rows per INSERT ... ON CONFLICT statement
+MATERIAL_IMPORT_BATCH_SIZE = int(os.getenv("MATERIAL_IMPORT_BATCH_SIZE", "1000"))
+# Rejected rows listed in the import report, the rest are only counted
+MATERIAL_IMPORT_MAX_ERRORS = int(os.getenv("MATERIAL_IMPORT_MAX_ERRORS", "100"))
+
+FORMATS = ("csv", "ndjson")
+FIELDS = ("name", "type", "house_type", "price_per_unit", "unit", "description")
+UPDATED_FIELDS = ("type", "price_per_unit", "description")
+
+ImportKey = Tuple[str, Optional[HouseType], str]
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def csv_records(stream: IO[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # csv.reader pulls one line at a time, the file is never read whole
+    reader = csv.DictReader(stream)
+    missing = {"name", "type", "price_per_unit", "unit"} - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f"CSV header is missing {', '.join(sorted(missing))}")
+    for row in reader:
+        # Empty cells mean "not set", not an empty string
+        yield reader.line_num, {key: value for key, value in row.items() if key in FIELDS and value != ""}
+
+
+def ndjson_records(stream: IO[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, exc
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError("Line is not a JSON object")
+
+
+def parse_records(stream: IO[str], format: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    if format == "csv":
+        return csv_records(stream)
+    if format == "ndjson":
+        return ndjson_records(stream)
+    raise ImportFormatError(f"Unsupported import format: {format}")
+
+
+def to_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    # Same validation as POST /api/materials, then the ORM enums
+    material = MaterialCreate(**record)
+    try:
+        material_type = MaterialType(material.type)
+    except ValueError:
+        raise ValueError(f"Invalid material type: {material.type}")
+    return {
+        "name": material.name,
+        "type": material_type,
+        "house_type": HouseType(material.house_type.value) if material.house_type else None,
+        "price_per_unit": material.price_per_unit,
+        "unit": material.unit,
+        "description": material.description,
+    }
+
+
+def row_key(row: Dict[str, Any]) -> ImportKey:
+    return (row["name"], row["house_type"], row["unit"])
+
+
+def upsert(db: Session, rows: List[Dict[str, Any]]) -> None:
+    # Two partial unique indexes back the key, one for materials with a house
+    # type and one for materials that apply to every house type, because a
+    # plain unique index never treats two NULL house types as a conflict
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for typed in (True, False):
+        values = [row for row in rows if (row["house_type"] is not None) == typed]
+        if not values:
+            continue
+        statement = dialect.insert(Material).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["name", "house_type", "unit"] if typed else ["name", "unit"],
+            index_where=Material.house_type.isnot(None) if typed else Material.house_type.is_(None),
+            set_={field: statement.excluded[field] for field in UPDATED_FIELDS},
+        )
+        db.execute(statement)
+
+
+class CatalogImport:
+    # Upserts material rows keyed by (name, house_type, unit) a batch at a time.
+    # Rows are compared with what is stored first, so only new and changed
+    # rows are written and the report can tell the three apart
+
+    def __init__(self, db: Session, batch_size: int = MATERIAL_IMPORT_BATCH_SIZE,
+                 max_errors: int = MATERIAL_IMPORT_MAX_ERRORS):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def reject(self, line: int, error: Any) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            if isinstance(error, ValidationError):
+                error = "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+            self.errors.append({"line": line, "error": str(error)})
+
+    def run(self, records: Iterator[Tuple[int, Any]]) -> Dict[str, Any]:
+        while True:
+            chunk = list(itertools.islice(records, self.batch_size))
+            if not chunk:
+                break
+            # A key repeated in the file keeps its last row, and one statement
+            # may not update the same row twice
+            rows: Dict[ImportKey, Dict[str, Any]] = {}
+            for line, record in chunk:
+                if isinstance(record, Exception):
+                    self.reject(line, record)
+                    continue
+                try:
+                    row = to_row(record)
+                except (ValidationError, ValueError, TypeError) as exc:
+                    self.reject(line, exc)
+                    continue
+                rows[row_key(row)] = row
+            self.write_batch(rows)
+
+        if self.inserted or self.updated:
+            # One catalog version bump for the whole import
+            bump_catalog_version(self.db)
+        self.db.commit()
+        if self.inserted or self.updated:
+            price_index.load(self.db)
+        return self.report()
+
+    def write_batch(self, rows: Dict[ImportKey, Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        names = {name for name, _, _ in rows}
+        stored = {
+            (material.name, material.house_type, material.unit): material
+            for material in self.db.execute(
+                select(Material.name, Material.house_type, Material.unit,
+                       *[getattr(Material, field) for field in UPDATED_FIELDS]).where(Material.name.in_(names))
+            )
+        }
+        changed = []
+        for key, row in rows.items():
+            current = stored.get(key)
+            if current is None:
+                self.inserted += 1
+            elif any(getattr(current, field) != row[field] for field in UPDATED_FIELDS):
+                self.updated += 1
+            else:
+                self.unchanged += 1
+                continue
+            changed.append(row)
+        if changed:
+            upsert(self.db, changed)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def import_materials(db: Session, stream: IO[str], format: str) -> Dict[str, Any]:
+    return CatalogImport(db).run(parse_records(stream, format))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a material catalog from CSV or NDJSON")
+    parser.add_argument("path", help="file to import, - reads standard input")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    args = parser.parse_args()
+
+    format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    db = SessionLocal()
+    try:
+        if args.path == "-":
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+            report = import_materials(db, stream, format)
+        else:
+            with open(args.path, encoding="utf-8-sig", newline="") as stream:
+                report = import_materials(db, stream, format)
+    except ImportFormatError as exc:
+        raise SystemExit(str(exc))
+    finally:
+        db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import json
+import math
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# Compact binary encoding of the calculation input and result documents.
+#
+# Every value starts with a 4 byte header: b"HC", the format version and the
+# layout. Results and inputs have fixed layouts: strings are written as 2 byte
+# references into a shared vocabulary (material names, units, house types and
+# common input values) or into a table of literal strings carried by the value,
+# and numbers go into packed little-endian float64 arrays. Anything that does
+# not fit a layout exactly is stored as JSON under the same header, so every
+# document round-trips unchanged.
+#
+# A format version never changes once rows are written with it. New vocabulary
+# or layouts get a new version, and decoding keeps every old version.
+
+MAGIC = b"HC"
+VERSION = 1
+
+JSON_LAYOUT = 0
+RESULT_LAYOUT = 1
+INPUT_LAYOUT = 2
+
+HEADER = struct.Struct("<2sBB")
+NO_STRING = 0xFFFF
+
+VOCABULARY = {
+    1: (
+        # Units
+        "kg", "m²", "m³", "piece",
+        # Materials the calculators produce
+        "Cement Mortar", "Concrete Mix", "Foam Block", "Foundation Concrete",
+        "Foundation Reinforcement Steel", "Gas Block", "Insulation Material",
+        "Reinforcement Steel", "Roof Material (Metal)", "Roof Timber", "Special Mortar",
+        "Standard Brick", "Timber/Logs", "Wall Concrete", "Wall Finishing Material",
+        "Wall Reinforcement Steel", "Basement Walls Material", "Basement Floor Material",
+        # House types and common input values
+        "brick", "wooden", "concrete", "blocks",
+        "Железобетон", "Ленточный", "Свайный", "Деревянная", "Металлическая",
+        "Metal", "Mineral Wool", "Plaster", "Timber", "Log", "Brick", "Concrete", "",
+    ),
+}
+VOCABULARY_REFS = {
+    version: {value: index for index, value in enumerate(words)} for version, words in VOCABULARY.items()
+}
+
+RESULT_KEYS = ("materials", "total_area", "total_cost")
+ITEM_KEYS = ("name", "quantity", "unit", "price_per_unit", "total_price")
+INPUT_KEYS = ("houseType", "foundation", "walls", "roof")
+FOUNDATION_KEYS = ("width", "depth", "length", "type", "hasBasement", "hasBasementFloor", "floorMaterial", "finishing")
+WALL_KEYS = ("width", "length", "height", "material", "insulation", "finishing")
+ROOF_KEYS = ("type", "material", "length", "width")
+
+# House type, foundation sizes, type, basement flags, floor material and
+# finishing, roof type, material and sizes, wall count
+INPUT_HEAD = struct.Struct("<H3dHBHH2H2dH")
+
+
+class Unpackable(ValueError):
+    # The document does not fit the layout, it is stored as JSON instead
+    pass
+
+
+class Strings:
+    # Maps strings to vocabulary or literal references while encoding
+
+    def __init__(self, version: int):
+        self.vocabulary = VOCABULARY_REFS[version]
+        self.literals: List[str] = []
+        self._literal_refs: Dict[str, int] = {}
+
+    def ref(self, value: Any, optional: bool = False) -> int:
+        if value is None and optional:
+            return NO_STRING
+        if not isinstance(value, str):
+            raise Unpackable(value)
+        # Str enums such as HouseTypeEnum are stored as their value
+        value = getattr(value, "value", value)
+        ref = self.vocabulary.get(value)
+        if ref is None:
+            ref = self._literal_refs.get(value)
+            if ref is None:
+                ref = len(self.vocabulary) + len(self.literals)
+                if ref >= NO_STRING:
+                    raise Unpackable(value)
+                self.literals.append(value)
+                self._literal_refs[value] = ref
+        return ref
+
+    def pack(self) -> bytes:
+        parts = [struct.pack("<H", len(self.literals))]
+        for literal in self.literals:
+            encoded = literal.encode("utf-8")
+            parts.append(struct.pack("<H", len(encoded)))
+            parts.append(encoded)
+        return b"".join(parts)
+
+
+def _unpack_strings(version: int, data: bytes, offset: int) -> Tuple[Sequence[str], int]:
+    (count,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    literals = []
+    for _ in range(count):
+        (length,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        literals.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    return VOCABULARY[version] + tuple(literals), offset
+
+
+def _float(value: Any) -> float:
+    # Exact float64 round trip. Ints would come back as floats and change the
+    # JSON, so they (and bools) go to the JSON layout
+    if type(value) is not float or math.isnan(value):
+        raise Unpackable(value)
+    return value
+
+
+def _optional_float(value: Any) -> float:
+    return math.nan if value is None else _float(value)
+
+
+def _from_optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _check_keys(document: Any, keys: Tuple[str, ...]) -> None:
+    if not isinstance(document, dict) or tuple(document) != keys:
+        raise Unpackable(document)
+
+
+def _pack_result(result: Dict[str, Any]) -> bytes:
+    _check_keys(result, RESULT_KEYS)
+    materials = result["materials"]
+    if not isinstance(materials, list):
+        raise Unpackable(materials)
+    for item in materials:
+        _check_keys(item, ITEM_KEYS)
+
+    strings = Strings(VERSION)
+    count = len(materials)
+    return b"".join((
+        struct.pack("<Hdd", count, _float(result["total_area"]), _optional_float(result["total_cost"])),
+        struct.pack(f"<{count}H", *[strings.ref(item["name"]) for item in materials]),
+        struct.pack(f"<{count}H", *[strings.ref(item["unit"]) for item in materials]),
+        struct.pack(f"<{count}d", *[_float(item["quantity"]) for item in materials]),
+        struct.pack(f"<{count}d", *[_optional_float(item["price_per_unit"]) for item in materials]),
+        struct.pack(f"<{count}d", *[_optional_float(item["total_price"]) for item in materials]),
+        strings.pack(),
+    ))
+
+
+def _unpack_result(version: int, data: bytes, offset: int) -> Dict[str, Any]:
+    count, total_area, total_cost = struct.unpack_from("<Hdd", data, offset)
+    offset += 18
+    names = struct.unpack_from(f"<{count}H", data, offset)
+    offset += 2 * count
+    units = struct.unpack_from(f"<{count}H", data, offset)
+    offset += 2 * count
+    numbers = struct.unpack_from(f"<{3 * count}d", data, offset)
+    offset += 24 * count
+    strings, _ = _unpack_strings(version, data, offset)
+
+    quantities = numbers[:count]
+    prices = numbers[count:2 * count]
+    totals = numbers[2 * count:]
+    return {
+        "materials": [
+            {
+                "name": strings[names[index]],
+                "quantity": quantities[index],
+                "unit": strings[units[index]],
+                "price_per_unit": _from_optional(prices[index]),
+                "total_price": _from_optional(totals[index]),
+            }
+            for index in range(count)
+        ],
+        "total_area": total_area,
+        "total_cost": _from_optional(total_cost),
+    }
+
+
+def _pack_input(document: Dict[str, Any]) -> bytes:
+    _check_keys(document, INPUT_KEYS)
+    foundation, walls, roof = document["foundation"], document["walls"], document["roof"]
+    _check_keys(foundation, FOUNDATION_KEYS)
+    _check_keys(roof, ROOF_KEYS)
+    if not isinstance(walls, list):
+        raise Unpackable(walls)
+    for wall in walls:
+        _check_keys(wall, WALL_KEYS)
+    if type(foundation["hasBasement"]) is not bool or type(foundation["hasBasementFloor"]) is not bool:
+        raise Unpackable(foundation)
+
+    strings = Strings(VERSION)
+    count = len(walls)
+    flags = foundation["hasBasement"] | foundation["hasBasementFloor"] << 1
+    return b"".join((
+        INPUT_HEAD.pack(
+            strings.ref(document["houseType"]),
+            _float(foundation["width"]), _float(foundation["depth"]), _float(foundation["length"]),
+            strings.ref(foundation["type"]), flags,
+            strings.ref(foundation["floorMaterial"], optional=True), strings.ref(foundation["finishing"], optional=True),
+            strings.ref(roof["type"]), strings.ref(roof["material"]),
+            _float(roof["length"]), _float(roof["width"]), count,
+        ),
+        struct.pack(f"<{3 * count}d", *[_float(wall[key]) for wall in walls for key in ("width", "length", "height")]),
+        struct.pack(f"<{3 * count}H", *[
+            ref for wall in walls for ref in (
+                strings.ref(wall["material"]), strings.ref(wall["insulation"]),
+                strings.ref(wall["finishing"], optional=True),
+            )
+        ]),
+        strings.pack(),
+    ))
+
+
+def _unpack_input(version: int, data: bytes, offset: int) -> Dict[str, Any]:
+    (house_type, width, depth, length, foundation_type, flags, floor_material, finishing,
+     roof_type, roof_material, roof_length, roof_width, count) = INPUT_HEAD.unpack_from(data, offset)
+    offset += INPUT_HEAD.size
+    numbers = struct.unpack_from(f"<{3 * count}d", data, offset)
+    offset += 24 * count
+    refs = struct.unpack_from(f"<{3 * count}H", data, offset)
+    offset += 6 * count
+    strings, _ = _unpack_strings(version, data, offset)
+
+    def optional(ref):
+        return None if ref == NO_STRING else strings[ref]
+
+    return {
+        "houseType": strings[house_type],
+        "foundation": {
+            "width": width,
+            "depth": depth,
+            "length": length,
+            "type": strings[foundation_type],
+            "hasBasement": bool(flags & 1),
+            "hasBasementFloor": bool(flags & 2),
+            "floorMaterial": optional(floor_material),
+            "finishing": optional(finishing),
+        },
+        "walls": [
+            {
+                "width": numbers[3 * index],
+                "length": numbers[3 * index + 1],
+                "height": numbers[3 * index + 2],
+                "material": strings[refs[3 * index]],
+                "insulation": strings[refs[3 * index + 1]],
+                "finishing": optional(refs[3 * index + 2]),
+            }
+            for index in range(count)
+        ],
+        "roof": {
+            "type": strings[roof_type],
+            "material": strings[roof_material],
+            "length": roof_length,
+            "width": roof_width,
+        },
+    }
+
+
+PACKERS = {RESULT_LAYOUT: _pack_result, INPUT_LAYOUT: _pack_input}
+UNPACKERS = {RESULT_LAYOUT: _unpack_result, INPUT_LAYOUT: _unpack_input}
+
+
+def encode(document: Any, layout: int) -> bytes:
+    try:
+        return HEADER.pack(MAGIC, VERSION, layout) + PACKERS[layout](document)
+    except (Unpackable, struct.error):
+        return HEADER.pack(MAGIC, VERSION, JSON_LAYOUT) + json.dumps(
+            document, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def decode(data: bytes) -> Any:
+    if isinstance(data, str) or not data.startswith(MAGIC):
+        # A JSON value written before the column was converted
+        return json.loads(data)
+    _, version, layout = HEADER.unpack_from(data)
+    if version not in VOCABULARY:
+        raise ValueError(f"Unknown compact format version {version}")
+    if layout == JSON_LAYOUT:
+        return json.loads(data[HEADER.size:].decode("utf-8"))
+    return UNPACKERS[layout](version, data, HEADER.size)
+
+
+class CompactJSON(TypeDecorator):
+    # A JSON document column stored in the compact binary encoding
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, layout: int):
+        super().__init__()
+        self.layout = layout
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode(value, self.layout)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode(bytes(value))
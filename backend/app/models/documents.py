@@ -0,0 +1,137 @@
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models.cache import canonical
+from app.models.models import Calculation, CalculationDocument
+from app.models.rules import RULES_VERSION
+
+# Calculations keep their input and result in calculation_documents, one row
+# per distinct (house type, input, result). Saving a calculation adds a
+# reference to the existing row when the content is already stored, and a
+# document is deleted when its last reference goes away. Documents also carry
+# the digest of the input that produced them, so saving the same input again
+# finds the stored result without calculating it.
+
+Document = Tuple[Any, Dict[str, Any], Dict[str, Any]]
+
+
+def document_digest(house_type: Any, input_data: Dict[str, Any], result_data: Dict[str, Any]) -> str:
+    house_type = getattr(house_type, "value", house_type)
+    payload = canonical([house_type, input_data, result_data])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def input_digest(house_type: Any, input_data: Dict[str, Any], catalog_version: Optional[int]) -> str:
+    # Everything a priced result depends on: the rules, the catalog version
+    # the prices come from, the house type and the input
+    house_type = getattr(house_type, "value", house_type)
+    payload = canonical([RULES_VERSION, catalog_version, house_type, input_data])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def claim_document(db: Session, digest: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+    # The stored document for this input digest with a reference added for the
+    # caller, or None. A document released to nothing in between is a miss
+    row = db.execute(
+        select(CalculationDocument.id, CalculationDocument.result_data)
+        .where(CalculationDocument.input_digest == digest)
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    claimed = db.execute(
+        update(CalculationDocument)
+        .where(CalculationDocument.id == row.id, CalculationDocument.refcount > 0)
+        .values(refcount=CalculationDocument.refcount + 1)
+    ).rowcount
+    return (row.id, row.result_data) if claimed else None
+
+
+def store_documents(
+    db: Session, documents: Sequence[Document], input_digests: Optional[Sequence[Optional[str]]] = None
+) -> List[int]:
+    # One INSERT ... ON CONFLICT for the whole batch: new content is inserted,
+    # known content only gains references. input_digests, when given, are the
+    # input_digest of each entry (None where unknown). Returns the document id
+    # of each entry, in order
+    digests = [document_digest(*document) for document in documents]
+    references = Counter(digests)
+    values = {}
+    for index, (digest, (_, input_data, result_data)) in enumerate(zip(digests, documents)):
+        values.setdefault(digest, {
+            "digest": digest,
+            "input_digest": input_digests[index] if input_digests else None,
+            "input_data": input_data,
+            "result_data": result_data,
+            "refcount": references[digest],
+        })
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(CalculationDocument).values(list(values.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=["digest"],
+        set_={
+            "refcount": CalculationDocument.refcount + statement.excluded.refcount,
+            # Known content saved again under a newer catalog version is found by that input next time
+            "input_digest": func.coalesce(statement.excluded.input_digest, CalculationDocument.input_digest),
+        },
+    ).returning(CalculationDocument.digest, CalculationDocument.id)
+    ids = dict(db.execute(statement).all())
+    return [ids[digest] for digest in digests]
+
+
+def release_documents(db: Session, document_ids: Iterable[int]) -> int:
+    # Drops one reference per id and deletes the documents nobody references.
+    # Runs in the caller's transaction, so a failed write keeps its references
+    released = Counter(document_id for document_id in document_ids if document_id is not None)
+    for document_id, count in released.items():
+        db.execute(
+            update(CalculationDocument)
+            .where(CalculationDocument.id == document_id)
+            .values(refcount=CalculationDocument.refcount - count)
+        )
+    if not released:
+        return 0
+    return db.execute(
+        delete(CalculationDocument).where(
+            CalculationDocument.id.in_(list(released)), CalculationDocument.refcount <= 0
+        )
+    ).rowcount
+
+
+def recount_documents(db: Session) -> Dict[str, int]:
+    # Repairs reference counts from the calculations table and deletes
+    # documents nothing points to, for after manual edits or a crash
+    references = (
+        select(func.count(Calculation.id))
+        .where(Calculation.document_id == CalculationDocument.id)
+        .scalar_subquery()
+    )
+    fixed = db.execute(
+        update(CalculationDocument)
+        .where(CalculationDocument.refcount != references)
+        .values(refcount=references)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    deleted = db.execute(
+        delete(CalculationDocument).where(CalculationDocument.refcount <= 0)
+    ).rowcount
+    db.commit()
+    return {"fixed": fixed, "deleted": deleted}
+
+
+def main() -> None:
+    db = SessionLocal()
+    try:
+        print(json.dumps(recount_documents(db)))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
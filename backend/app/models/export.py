@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+from sqlalchemy import select
+from app.database.database import AsyncSessionLocal
+from app.models.models import Calculation, CalculationDocument
+from app.models.pagination import Cursor, after_cursor, encode_cursor, history_order
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+CSV_COLUMNS = [
+    "calculation_id", "user_id", "created_at", "house_type",
+    "material", "quantity", "unit", "price_per_unit", "total_price", "cursor",
+]
+
+
+async def export_calculations(
+    user_id: Optional[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    cursor: Optional[Cursor],
+) -> AsyncIterator[Any]:
+    # The export owns its session: it outlives the request handler and is read
+    # through a server-side cursor, so only one batch is ever in memory
+    query = select(
+        Calculation.id, Calculation.user_id, Calculation.house_type, Calculation.created_at,
+        Calculation.total_area, Calculation.total_cost,
+        CalculationDocument.input_data, CalculationDocument.result_data,
+    ).join(Calculation.document).where(after_cursor(cursor))
+    if user_id is not None:
+        query = query.where(Calculation.user_id == user_id)
+    if start is not None:
+        query = query.where(Calculation.created_at >= start)
+    if end is not None:
+        query = query.where(Calculation.created_at < end)
+    query = query.order_by(*history_order()).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for row in result:
+            yield row
+
+
+def _record(row) -> dict:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "house_type": row.house_type.value if row.house_type else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "total_area": row.total_area,
+        "total_cost": row.total_cost,
+        "input_data": row.input_data,
+        "result_data": row.result_data,
+        # Resume from here with ?cursor= after a dropped connection
+        "cursor": encode_cursor(row.created_at, row.id),
+    }
+
+
+async def ndjson_lines(rows: AsyncIterator[Any]) -> AsyncIterator[str]:
+    # One calculation per line
+    async for row in rows:
+        yield json.dumps(_record(row), ensure_ascii=False, default=str) + "\n"
+
+
+async def csv_lines(rows: AsyncIterator[Any]) -> AsyncIterator[str]:
+    # One line per material item, a calculation's lines are sent together
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+
+    async for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        record = _record(row)
+        for item in (row.result_data or {}).get("materials", []):
+            writer.writerow([
+                record["id"], record["user_id"], record["created_at"], record["house_type"],
+                item.get("name"), item.get("quantity"), item.get("unit"),
+                item.get("price_per_unit"), item.get("total_price"), record["cursor"],
+            ])
+        yield buffer.getvalue()
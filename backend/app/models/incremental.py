@@ -0,0 +1,281 @@
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.models.schemas import (
+    CalculationPatch, CalculationResult, CalculationResultItem, HouseTypeEnum, MaterialDelta
+)
+from app.models.cache import ResultCache
+from app.models.rules import (
+    FOUNDATION_BASES, HOUSE_TYPE_RULES, ROOF_MATERIAL_NAME, matches, round_quantity, units_scale
+)
+
+# Per-component partial results of saved calculations, keyed by calculation id
+INCREMENTAL_CACHE_SIZE = int(os.getenv("INCREMENTAL_CACHE_SIZE", "256"))
+INCREMENTAL_CACHE_TTL = float(os.getenv("INCREMENTAL_CACHE_TTL", "600"))
+
+# Every float is a whole multiple of 2**-1074, so sums of them kept as integers
+# in that unit are exact
+EXACT_SCALE = 1074
+EXACT_ONE = 1 << EXACT_SCALE
+
+
+class WallPart(NamedTuple):
+    # One wall's contribution to every wall rule, None where the rule skips it
+    area: float
+    totals: Tuple[Optional[float], ...]
+    material: str
+
+
+class CalculationParts(NamedTuple):
+    house_type: HouseTypeEnum
+    input_data: Dict[str, Any]
+    foundation: List[Dict[str, Any]]
+    walls: List[WallPart]
+    # Running sums over every wall, one per wall rule and then the wall area,
+    # and the same sums of absolute values, in units of 2**-1074. They are
+    # exact, so a patch adds and takes out the walls it touches without drift
+    wall_sums: Tuple[int, ...]
+    wall_magnitudes: Tuple[int, ...]
+    roof: List[Dict[str, Any]]
+    roof_area: float
+
+
+component_cache = ResultCache(INCREMENTAL_CACHE_SIZE, INCREMENTAL_CACHE_TTL)
+
+
+def _scaled(value: float, factors: List[float]) -> float:
+    # Same left to right order as the compiled calculators
+    for factor in factors:
+        value = value * factor
+    return value
+
+
+def foundation_part(rule: Dict[str, Any], foundation: Dict[str, Any]) -> List[Dict[str, Any]]:
+    width = foundation.get("width", 0)
+    depth = foundation.get("depth", 0)
+    length = foundation.get("length", 0)
+    items = []
+    for item in rule["foundation"]:
+        if not matches(foundation, item.get("when")):
+            continue
+        quantity = _scaled(FOUNDATION_BASES[item["base"]](width, depth, length), item.get("factors", []))
+        items.append({"name": item["name"], "quantity": round_quantity(quantity, item.get("round")), "unit": item["unit"]})
+    return items
+
+
+def wall_part(rule: Dict[str, Any], wall: Dict[str, Any]) -> WallPart:
+    area = wall.get("length", 0) * wall.get("height", 0)
+    width = wall.get("width", 0)
+    finished = wall.get("finishing", "")
+    totals = []
+    for item in rule["walls"]:
+        if item.get("finished_only") and not finished:
+            totals.append(None)
+            continue
+        if item["base"] == "area":
+            base = area
+        elif item["base"] == "volume":
+            base = area * width / 100
+        else:
+            base = area * (units_scale(item) * width)
+        totals.append(_scaled(base, item.get("factors", [])))
+    return WallPart(area, tuple(totals), wall.get("material", ""))
+
+
+def exact(value: float) -> int:
+    numerator, denominator = float(value).as_integer_ratio()
+    return numerator * (EXACT_ONE // denominator)
+
+
+def add_wall(sums: List[int], magnitudes: List[int], wall: WallPart, sign: int) -> None:
+    # Adds (sign 1) or takes out (sign -1) one wall's contribution in place
+    for index, value in enumerate(wall.totals + (wall.area,)):
+        if value is not None:
+            value = exact(value)
+            sums[index] += sign * value
+            magnitudes[index] += sign * abs(value)
+
+
+def roof_part(rule: Dict[str, Any], roof: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float]:
+    roof_area = roof.get("length", 0) * roof.get("width", 0) * rule["roof_pitch"]
+    items = []
+    for item in rule["roof"]:
+        if matches(roof, item.get("when")):
+            quantity = _scaled(roof_area, item.get("factors", []))
+            items.append({"name": item["name"], "quantity": round_quantity(quantity, item.get("round")), "unit": item["unit"]})
+    items.append({
+        "name": ROOF_MATERIAL_NAME.format(material=roof.get("material", "")),
+        "quantity": round(roof_area, 2),
+        "unit": "m²",
+    })
+    return items, roof_area
+
+
+def build_parts(house_type: HouseTypeEnum, input_data: Dict[str, Any]) -> CalculationParts:
+    rule = HOUSE_TYPE_RULES[house_type]
+    roof, roof_area = roof_part(rule, input_data.get("roof", {}))
+    walls = [wall_part(rule, wall) for wall in input_data.get("walls", [])]
+    sums = [0] * (len(rule["walls"]) + 1)
+    magnitudes = list(sums)
+    for wall in walls:
+        add_wall(sums, magnitudes, wall, 1)
+    return CalculationParts(
+        house_type=house_type,
+        input_data=input_data,
+        foundation=foundation_part(rule, input_data.get("foundation", {})),
+        walls=walls,
+        wall_sums=tuple(sums),
+        wall_magnitudes=tuple(magnitudes),
+        roof=roof,
+        roof_area=roof_area,
+    )
+
+
+def rounded_sum(total: int, magnitude: int, additions: int, digits: Optional[int]) -> Optional[float]:
+    # The full calculation adds the same floats up one at a time, which ends
+    # within additions * 2**-53 times the magnitude of the exact sum (doubled
+    # here for the second order term). When everything in that range rounds
+    # to the same value, that value is what it returns
+    if digits is None:
+        return None
+    error = (magnitude * additions >> 52) + 1
+    # Integer true division is correctly rounded
+    low, high = (total - error) / EXACT_ONE, (total + error) / EXACT_ONE
+    quantity = round_quantity(low, digits)
+    if quantity != round_quantity(high, digits) or (low > 0) != (high > 0):
+        return None
+    return quantity
+
+
+def summed_walls(parts: CalculationParts) -> Tuple[List[float], float]:
+    # Adds the walls up in order like the full calculation, for the rare sum
+    # that sits on a rounding boundary
+    totals = [0] * (len(parts.wall_sums) - 1)
+    area = 0
+    for wall in parts.walls:
+        area += wall.area
+        for index, value in enumerate(wall.totals):
+            if value is not None:
+                totals[index] += value
+    return totals, area + parts.roof_area
+
+
+def assemble(parts: CalculationParts) -> CalculationResult:
+    # Rounds the running sums, so this step does not grow with the wall count.
+    # apply_patch still copies the wall lists and the caller stores the whole
+    # input. The result is bit for bit the full recalculation: a sum too close
+    # to a rounding boundary to tell is added up again in wall order
+    rule = HOUSE_TYPE_RULES[parts.house_type]
+    wall_rules = rule["walls"]
+    additions = len(parts.walls) + 1
+    quantities = [
+        rounded_sum(total, magnitude, additions, item.get("round"))
+        for item, total, magnitude in zip(wall_rules, parts.wall_sums, parts.wall_magnitudes)
+    ]
+    roof_area = exact(parts.roof_area)
+    total_area = rounded_sum(
+        parts.wall_sums[-1] + roof_area, parts.wall_magnitudes[-1] + abs(roof_area), additions, 2
+    )
+    # Exact sums have the sign of the float ones whenever they round alike
+    positive = [total > 0 for total in parts.wall_sums]
+    if total_area is None or None in quantities:
+        totals, area = summed_walls(parts)
+        quantities = [round_quantity(total, item.get("round")) for item, total in zip(wall_rules, totals)]
+        positive = [total > 0 for total in totals]
+        total_area = round(area, 2)
+
+    last_material = parts.walls[-1].material if parts.walls else ""
+    materials = [CalculationResultItem(**item) for item in parts.foundation]
+    for item, quantity, counted in zip(wall_rules, quantities, positive):
+        if item.get("skip_zero") and not counted:
+            continue
+        name = last_material if item.get("name_from") else item["name"]
+        materials.append(CalculationResultItem(name=name, quantity=quantity, unit=item["unit"]))
+    materials += [CalculationResultItem(**item) for item in parts.roof]
+    return CalculationResult(materials=materials, total_area=total_area)
+
+
+def apply_patch(parts: CalculationParts, patch: CalculationPatch) -> CalculationParts:
+    # Recomputes only the components the patch touches and moves the running
+    # sums by the walls that changed. The cached parts are never modified so
+    # concurrent readers keep a consistent copy
+    rule = HOUSE_TYPE_RULES[parts.house_type]
+    input_data = dict(parts.input_data)
+    foundation, roof, roof_area = parts.foundation, parts.roof, parts.roof_area
+
+    if patch.foundation is not None:
+        input_data["foundation"] = patch.foundation.dict(by_alias=True)
+        foundation = foundation_part(rule, input_data["foundation"])
+
+    if patch.roof is not None:
+        input_data["roof"] = patch.roof.dict(by_alias=True)
+        roof, roof_area = roof_part(rule, input_data["roof"])
+
+    walls = list(parts.walls)
+    wall_data = list(input_data.get("walls", []))
+    sums = list(parts.wall_sums)
+    magnitudes = list(parts.wall_magnitudes)
+    for change in patch.walls:
+        if change.op == "add":
+            if change.wall is None:
+                raise ValueError("A wall is required to add a wall")
+            index = len(wall_data) if change.index is None else change.index
+            if not 0 <= index <= len(wall_data):
+                raise ValueError(f"Wall index {index} is out of range")
+            wall = change.wall.dict(by_alias=True)
+            wall_data.insert(index, wall)
+            walls.insert(index, wall_part(rule, wall))
+            add_wall(sums, magnitudes, walls[index], 1)
+            continue
+
+        if change.index is None or not 0 <= change.index < len(wall_data):
+            raise ValueError(f"Wall index {change.index} is out of range")
+        if change.op == "update" and change.wall is None:
+            raise ValueError("A wall is required to update a wall")
+        add_wall(sums, magnitudes, walls[change.index], -1)
+        if change.op == "remove":
+            del wall_data[change.index]
+            del walls[change.index]
+        else:
+            wall = change.wall.dict(by_alias=True)
+            wall_data[change.index] = wall
+            walls[change.index] = wall_part(rule, wall)
+            add_wall(sums, magnitudes, walls[change.index], 1)
+    input_data["walls"] = wall_data
+
+    return parts._replace(
+        input_data=input_data, foundation=foundation, walls=walls,
+        wall_sums=tuple(sums), wall_magnitudes=tuple(magnitudes), roof=roof, roof_area=roof_area,
+    )
+
+
+def material_delta(old: Dict[str, Any], new: CalculationResult) -> List[MaterialDelta]:
+    # Only materials that were added, removed or changed, keyed by name and unit
+    before = {(item["name"], item["unit"]): item for item in old.get("materials", [])}
+    after = {(item.name, item.unit): item for item in new.materials}
+
+    delta = []
+    for key, item in after.items():
+        previous = before.get(key)
+        old_quantity = previous["quantity"] if previous else 0.0
+        old_price = (previous or {}).get("total_price") or 0.0
+        if previous is not None and old_quantity == item.quantity and old_price == (item.total_price or 0.0):
+            continue
+        delta.append(MaterialDelta(
+            name=item.name,
+            unit=item.unit,
+            status="changed" if previous else "added",
+            quantity=item.quantity,
+            quantity_change=round(item.quantity - old_quantity, 6),
+            total_price_change=round((item.total_price or 0.0) - old_price, 2),
+        ))
+    for key, item in before.items():
+        if key not in after:
+            delta.append(MaterialDelta(
+                name=item["name"],
+                unit=item["unit"],
+                status="removed",
+                quantity=0.0,
+                quantity_change=round(-item["quantity"], 6),
+                total_price_change=round(-(item.get("total_price") or 0.0), 2),
+            ))
+    return delta
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.models.calculations import calculate_shard
+
+# Worker processes for batch jobs, defaults to one per core
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", str(os.cpu_count() or 1)))
+# Houses per task sent to a worker, also the progress granularity
+BATCH_JOB_SHARD_SIZE = int(os.getenv("BATCH_JOB_SHARD_SIZE", "1000"))
+# Seconds a finished job and its results are kept
+BATCH_JOB_RETENTION = float(os.getenv("BATCH_JOB_RETENTION", "3600"))
+# Jobs a user may have at once, a new one drops their oldest finished job
+BATCH_JOB_MAX_PER_USER = int(os.getenv("BATCH_JOB_MAX_PER_USER", "10"))
+# Calculations all jobs of the process may hold, running and finished
+BATCH_JOB_MAX_CALCULATIONS = int(os.getenv("BATCH_JOB_MAX_CALCULATIONS", "1000000"))
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobLimitError(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, user_id: int, shards: List[List[Tuple[str, Dict[str, Any]]]]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = PENDING
+        self.total = sum(len(shard) for shard in shards)
+        self.completed = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.shards = shards
+        # Kept for pricing the results, the payloads are dropped once computed
+        self.house_types = [house_type for shard in shards for house_type, _ in shard]
+        # Shard results land in their own slot, so the merge keeps input order
+        self.results: List[Optional[List[Dict[str, Any]]]] = [None] * len(shards)
+        self.futures: List[Future] = []
+        self.done = threading.Event()
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "progress": round(self.completed / self.total, 4) if self.total else 1.0,
+            "error": self.error,
+            "elapsed": round((self.finished_at or time.time()) - self.created_at, 3),
+        }
+
+    def merged_results(self) -> List[Dict[str, Any]]:
+        return [result for shard in self.results for result in shard]
+
+    def held(self) -> int:
+        # Calculations whose payloads or results this job keeps in memory
+        return 0 if self.status in (FAILED, CANCELLED) else self.total
+
+
+class JobManager:
+    # Runs large batches across a process pool, one task per shard. Finished
+    # jobs keep their results until the retention runs out or a new job needs
+    # the room: past either cap the oldest finished jobs are dropped, and a job
+    # that still does not fit is refused
+
+    def __init__(self, workers: int, shard_size: int, retention: float,
+                 max_per_user: int = BATCH_JOB_MAX_PER_USER,
+                 max_calculations: int = BATCH_JOB_MAX_CALCULATIONS,
+                 executor: Optional[Executor] = None):
+        self.workers = workers
+        self.shard_size = shard_size
+        self.retention = retention
+        self.max_per_user = max_per_user
+        self.max_calculations = max_calculations
+        self._executor: Optional[Executor] = executor
+        self._jobs: Dict[str, Job] = {}
+        # Reentrant: cancelling a future runs its done callback in the same thread
+        self._lock = threading.RLock()
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            # Spawned workers only import the calculation engine, forking a
+            # server with live threads and connections is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, user_id: int, items: Sequence[Tuple[str, Dict[str, Any]]]) -> Job:
+        self.prune()
+        shards = [list(items[start:start + self.shard_size]) for start in range(0, len(items), self.shard_size)]
+        job = Job(user_id, shards)
+        with self._lock:
+            self._make_room(user_id, job.total)
+            self._jobs[job.id] = job
+        if not shards:
+            self._finish(job, COMPLETED)
+            return job
+
+        job.status = RUNNING
+        pool = self._pool()
+        for index, shard in enumerate(shards):
+            future = pool.submit(calculate_shard, shard)
+            future.add_done_callback(lambda future, index=index: self._shard_done(job, index, future))
+            job.futures.append(future)
+        return job
+
+    def _shard_done(self, job: Job, index: int, future: Future) -> None:
+        with self._lock:
+            if job.status in FINISHED:
+                return
+            try:
+                results = future.result()
+            except CancelledError:
+                return
+            except BrokenProcessPool as exc:
+                # A worker died (killed, out of memory), start a fresh pool for the next job
+                self._executor = None
+                self._fail(job, f"{type(exc).__name__}: {exc}")
+                return
+            except Exception as exc:
+                self._fail(job, f"{type(exc).__name__}: {exc}")
+                return
+            job.results[index] = results
+            job.shards[index] = None
+            job.completed += len(results)
+            if job.completed == job.total:
+                self._finish(job, COMPLETED)
+
+    def _make_room(self, user_id: int, calculations: int) -> None:
+        if calculations > self.max_calculations:
+            raise JobLimitError(f"A job may hold at most {self.max_calculations} calculations")
+
+        own = [job for job in self._jobs.values() if job.user_id == user_id]
+        while len(own) >= self.max_per_user:
+            finished = [job for job in own if job.finished_at is not None]
+            if not finished:
+                raise JobLimitError(f"{len(own)} jobs are still running, wait for one to finish")
+            oldest = min(finished, key=lambda job: job.finished_at)
+            del self._jobs[oldest.id]
+            own.remove(oldest)
+
+        held = sum(job.held() for job in self._jobs.values())
+        finished = sorted((job for job in self._jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        for job in finished:
+            if held + calculations <= self.max_calculations:
+                break
+            del self._jobs[job.id]
+            held -= job.held()
+        if held + calculations > self.max_calculations:
+            raise JobLimitError("Running jobs hold as many calculations as allowed, try again later")
+
+    def _fail(self, job: Job, error: str) -> None:
+        job.error = error
+        for future in job.futures:
+            future.cancel()
+        self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        job.shards = []
+        if status != COMPLETED:
+            # Only completed results are ever served
+            job.results = []
+        job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job: Job) -> None:
+        with self._lock:
+            if job.status in FINISHED:
+                return
+            # Queued shards never start, running ones finish and are discarded
+            for future in job.futures:
+                future.cancel()
+            self._finish(job, CANCELLED)
+
+    def prune(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished_at is not None and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+job_manager = JobManager(BATCH_JOB_WORKERS, BATCH_JOB_SHARD_SIZE, BATCH_JOB_RETENTION)
@@ -1,9 +1,18 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON, Text, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Enum, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.database import Base
+from app.models.compact import INPUT_LAYOUT, RESULT_LAYOUT, CompactJSON
 import enum
 
+# SQLite fills created_at with CURRENT_TIMESTAMP, whole seconds as text. Bind
+# datetimes in the same format so keyset cursors compare equal to stored values
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
 class HouseType(enum.Enum):
     BRICK = "brick"
     WOODEN = "wooden"
@@ -44,14 +53,98 @@ class Material(Base):
     unit = Column(String)  # e.g., m², m³, kg, piece
     description = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # One row per (name, house_type, unit), the key catalog imports upsert
+        # on. NULL house types never conflict in a unique index, so materials
+        # for every house type get their own index on (name, unit)
+        Index(
+            "uq_materials_name_house_type_unit", "name", "house_type", "unit", unique=True,
+            postgresql_where=house_type.isnot(None), sqlite_where=house_type.isnot(None),
+        ),
+        Index(
+            "uq_materials_name_unit_any_house", "name", "unit", unique=True,
+            postgresql_where=house_type.is_(None), sqlite_where=house_type.is_(None),
+        ),
+    )
+
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+
+    # Single row, bumped on every material write so each worker can tell
+    # whether its in-memory price index is stale
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class CalculationDocument(Base):
+    __tablename__ = "calculation_documents"
+
+    # Input parameters and results shared by every calculation with the same
+    # content, addressed by a hash of house type, input and result
+    id = Column(Integer, primary_key=True)
+    digest = Column(String(64), nullable=False, unique=True)
+    # Hash of rules version, catalog version, house type and input, see
+    # app/models/documents.py, looked up before calculating a saved input
+    input_digest = Column(String(64), index=True)
+    # Stored in the compact binary encoding
+    input_data = Column(CompactJSON(INPUT_LAYOUT))
+    result_data = Column(CompactJSON(RESULT_LAYOUT))
+    # Calculations referencing this document, it is deleted when this drops to 0
+    refcount = Column(Integer, nullable=False, default=0)
+
 class Calculation(Base):
     __tablename__ = "calculations"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     house_type = Column(Enum(HouseType))
-    input_data = Column(JSON)  # Store all input parameters
-    result_data = Column(JSON)  # Store calculation results
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    document_id = Column(Integer, ForeignKey("calculation_documents.id"), index=True)
+    # Copied out of result_data so history lists never load the documents
+    total_area = Column(Float)
+    total_cost = Column(Float, nullable=True)
+    created_at = Column(Timestamp, server_default=func.now())
     
-    user = relationship("User", back_populates="calculations") 
\ No newline at end of file
+    user = relationship("User", back_populates="calculations")
+    document = relationship("CalculationDocument")
+
+    __table_args__ = (
+        # Keyset pagination of a user's history, newest first
+        Index("ix_calculations_user_created_id", "user_id", "created_at", "id"),
+    )
+
+class UserCalculationStats(Base):
+    __tablename__ = "user_calculation_stats"
+
+    # Running totals over a user's saved calculations, kept current by every
+    # write to calculations and rebuilt with python -m app.models.aggregates
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    calculations = Column(Integer, nullable=False, default=0)
+    total_area = Column(Float, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+
+class HouseTypeStats(Base):
+    __tablename__ = "house_type_stats"
+
+    house_type = Column(Enum(HouseType), primary_key=True)
+    calculations = Column(Integer, nullable=False, default=0)
+    total_area = Column(Float, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+
+class UserMaterialTotal(Base):
+    __tablename__ = "user_material_totals"
+
+    # Material quantities summed over a user's saved calculations
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    name = Column(String, primary_key=True)
+    unit = Column(String, primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0)
+
+class HouseTypeMaterialTotal(Base):
+    __tablename__ = "house_type_material_totals"
+
+    house_type = Column(Enum(HouseType), primary_key=True)
+    name = Column(String, primary_key=True)
+    unit = Column(String, primary_key=True)
+    quantity = Column(Float, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0)
@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import and_, or_, true
+from app.models.models import Calculation
+
+Cursor = Tuple[datetime, int]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, calculation_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), calculation_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, calculation_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(calculation_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def after_cursor(cursor: Optional[Cursor]):
+    # Rows that come after the cursor in (created_at, id) descending order,
+    # spelled out so every backend can use the composite index
+    if cursor is None:
+        return true()
+    created_at, calculation_id = cursor
+    return or_(
+        Calculation.created_at < created_at,
+        and_(Calculation.created_at == created_at, Calculation.id < calculation_id),
+    )
+
+
+def history_order():
+    return (Calculation.created_at.desc(), Calculation.id.desc())
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models.models import CatalogVersion, Material
+from app.models.profiling import unprofiled
+from app.models.schemas import CalculationResult, HouseTypeEnum
+
+# How often a worker checks the shared catalog version, in seconds
+PRICE_INDEX_REFRESH_SECONDS = float(os.getenv("PRICE_INDEX_REFRESH_SECONDS", "30"))
+
+CATALOG_VERSION_ID = 1
+
+PriceKey = Tuple[Optional[str], str, str]
+
+
+def get_catalog_version(db: Session) -> int:
+    row = db.query(CatalogVersion.version).filter(CatalogVersion.id == CATALOG_VERSION_ID).first()
+    return row[0] if row else 0
+
+
+def bump_catalog_version(db: Session) -> int:
+    # Runs inside the caller's transaction, so the bump commits with the material write
+    updated = db.query(CatalogVersion).filter(CatalogVersion.id == CATALOG_VERSION_ID).update(
+        {CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(CatalogVersion(id=CATALOG_VERSION_ID, version=1))
+    db.flush()
+    return get_catalog_version(db)
+
+
+def material_key(material: Material) -> PriceKey:
+    house_type = material.house_type.value if material.house_type else None
+    return (house_type, material.name, material.unit)
+
+
+class PriceIndex:
+    # In-memory index of material prices keyed by (house_type, name, unit)
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.version: Optional[int] = None
+        self._prices: Dict[PriceKey, float] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        # A reload serves the whole worker, even when a write request runs it
+        with unprofiled():
+            version = get_catalog_version(db)
+            prices = {}
+            for material in db.query(Material).order_by(Material.id).all():
+                prices[material_key(material)] = material.price_per_unit
+        with self._lock:
+            # Swap the whole dict so readers never see a half-built index
+            self._prices = prices
+            self.version = version
+            self._checked_at = time.monotonic()
+
+    def add(self, material: Material, version: int) -> bool:
+        with self._lock:
+            self._prices[material_key(material)] = material.price_per_unit
+            # Only skip the next reload if no other worker wrote in between
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+                return True
+            return False
+
+    def due(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.refresh_seconds
+
+    def refresh_if_stale(self) -> None:
+        # At most one version check per refresh interval, never per request
+        if not self.due():
+            return
+        with self._lock:
+            if not self.due():
+                return
+            self._checked_at = time.monotonic()
+        # Done for the whole worker, not part of the request that happens to run it
+        with unprofiled():
+            db = SessionLocal()
+            try:
+                if get_catalog_version(db) != self.version:
+                    self.load(db)
+            finally:
+                db.close()
+
+    def price(self, house_type: HouseTypeEnum, name: str, unit: str) -> Optional[float]:
+        prices = self._prices
+        price = prices.get((house_type.value, name, unit))
+        if price is None:
+            # Materials without a house type apply to every house
+            price = prices.get((None, name, unit))
+        return price
+
+    def apply(self, house_type: HouseTypeEnum, result: CalculationResult) -> CalculationResult:
+        total_cost = 0.0
+        priced = False
+        for item in result.materials:
+            price = self.price(house_type, item.name, item.unit)
+            if price is None:
+                continue
+            item.price_per_unit = price
+            item.total_price = round(item.quantity * price, 2)
+            total_cost += item.total_price
+            priced = True
+        result.total_cost = round(total_cost, 2) if priced else None
+        return result
+
+
+price_index = PriceIndex(PRICE_INDEX_REFRESH_SECONDS)
+
+
+def price_result(house_type: HouseTypeEnum, result: CalculationResult) -> CalculationResult:
+    price_index.refresh_if_stale()
+    return price_index.apply(house_type, result)
@@ -0,0 +1,362 @@
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Request profiling settings from environment variables
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bearer token Prometheus must send to scrape /metrics, empty leaves it open
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Fraction of requests run under the sampling profiler, 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests sending "X-Profile: <token>" are always profiled, empty disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Sampled requests slower than this are written out as folded stacks
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Query audit for development and CI: "log" reports repeated identical
+# statements, slow statements and requests over their query budget, "raise"
+# also answers those requests with a 500 instead of their response. "off"
+# skips recording statements altogether
+QUERY_AUDIT = os.getenv("QUERY_AUDIT", "off").lower()
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "100"))
+# Statements a request may run unless its route sets a budget, 0 for no limit
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    # A Prometheus histogram with a fixed set of label names
+
+    def __init__(self, name: str, description: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        # Counts are kept per bucket and summed up when rendered
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total!r}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the last byte.",
+    ("method", "route", "status"), SECONDS_BUCKETS,
+)
+PHASE_SECONDS = Histogram(
+    "http_request_phase_seconds",
+    "Time spent per request in auth, db (cursor execution), engine (calculations) and encode (JSON).",
+    ("method", "route", "phase"), SECONDS_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Statements executed per request.",
+    ("method", "route"), QUERY_BUCKETS,
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a connection from the pool.",
+    ("pool",), SECONDS_BUCKETS,
+)
+METRICS = (REQUEST_SECONDS, PHASE_SECONDS, REQUEST_QUERIES, POOL_CHECKOUT_SECONDS)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for histogram in METRICS for line in histogram.render()) + "\n"
+
+
+def metrics_authorized(authorization: Optional[str]) -> bool:
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+
+
+class RequestProfile:
+    # Phase times and query count of the request being served. Phases can
+    # overlap: queries run by the auth dependency count in both auth and db
+
+    __slots__ = ("phases", "queries", "threads", "statements", "slow", "budget")
+
+    def __init__(self, sampled: bool):
+        self.phases: Dict[str, float] = {}
+        self.queries = 0
+        # Threads the request ran on, only tracked while the sampler watches it
+        self.threads: Optional[Set[int]] = {threading.get_ident()} if sampled else None
+        # Executions per (statement, parameters) and slow statements, only
+        # recorded by the query audit
+        self.statements: Optional[Counter] = Counter() if QUERY_AUDIT != "off" else None
+        self.slow: List[Tuple[str, float]] = []
+        self.budget = QUERY_BUDGET
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        if self.threads is not None:
+            self.threads.add(threading.get_ident())
+
+
+# Set by the middleware, copied into the threadpool along with the rest of the context
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def unprofiled() -> Iterator[None]:
+    # Work a request does on behalf of the whole worker, like reloading the
+    # price index once per interval, stays out of its timings and query audit
+    token = current_profile.set(None)
+    try:
+        yield
+    finally:
+        current_profile.reset(token)
+
+
+def add_phase(name: str, seconds: float) -> None:
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    # Times the block, or the decorated function, as a phase of the current request
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+def instrument_queries(engine: Engine) -> None:
+    # Cursor execution time and statement count, for requests being profiled.
+    # The start time rides on the execution context, so failed statements
+    # leave nothing behind
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(connection, cursor, statement, parameters, context, executemany):
+        if context is not None and current_profile.get() is not None:
+            context._profile_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(connection, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_profile_start", None)
+        profile = current_profile.get()
+        if start is not None and profile is not None:
+            seconds = time.perf_counter() - start
+            profile.queries += 1
+            profile.add("db", seconds)
+            if profile.statements is not None:
+                profile.statements[statement, repr(parameters)] += 1
+                if seconds * 1000 >= QUERY_SLOW_MS:
+                    profile.slow.append((statement, seconds))
+
+
+def query_budget(statements: int) -> Callable[[], Awaitable[None]]:
+    # Route dependency, dependencies=[Depends(query_budget(n))], limiting the
+    # statements the whole request may run, authentication included
+    async def set_budget() -> None:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.budget = statements
+    return set_budget
+
+
+def audit_findings(profile: RequestProfile) -> List[str]:
+    # The same statement with the same parameters twice is a round trip that
+    # could have been reused, or a lazy load in a loop
+    findings = []
+    if profile.budget and profile.queries > profile.budget:
+        findings.append(f"{profile.queries} statements, budget is {profile.budget}")
+    for (statement, _), count in profile.statements.items():
+        if count > 1:
+            findings.append(f"repeated {count} times: {_shorten(statement)}")
+    for statement, seconds in profile.slow:
+        findings.append(f"slow ({seconds * 1000:.0f} ms): {_shorten(statement)}")
+    return findings
+
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= 200 else statement[:200] + "..."
+
+
+def fold(frame: Any) -> str:
+    # One stack in the folded format read by flamegraph.pl and speedscope, root first
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    # Samples the stacks of the threads a request runs on from a background
+    # thread. The event loop thread is shared, so samples taken there can
+    # belong to whichever request was running at that moment
+
+    def __init__(self, threads: Set[int], interval: float):
+        self.threads = threads
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[fold(frame)] += 1
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+def write_stacks(method: str, route: str, seconds: float, stacks: Counter) -> Optional[str]:
+    if not stacks:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+    path = os.path.join(
+        PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{method}-{slug}-{seconds * 1000:.0f}ms.folded"
+    )
+    with open(path, "w") as output:
+        for stack, count in stacks.most_common():
+            output.write(f"{stack} {count}\n")
+    return path
+
+
+class ProfilingMiddleware:
+    # Plain ASGI middleware: times every HTTP request per route template and
+    # phase, and runs the sampling profiler on the requests picked for it
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    def requested(self, scope: Dict[str, Any]) -> bool:
+        if not PROFILE_TOKEN:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, PROFILE_TOKEN.encode("latin-1"))
+        return False
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = self.requested(scope)
+        sampled = requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+        profile = RequestProfile(sampled)
+        sampler = StackSampler(profile.threads, PROFILE_INTERVAL_MS / 1000) if sampled else None
+        status_code = 500
+        # In raise mode the response is held back until the audit has seen
+        # every statement, streamed bodies included, so a failing request
+        # reaches the client as a 500
+        held: Optional[List[Dict[str, Any]]] = [] if QUERY_AUDIT == "raise" else None
+
+        async def send_status(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            if held is not None:
+                held.append(message)
+            else:
+                await send(message)
+
+        token = current_profile.set(profile)
+        findings: List[str] = []
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            seconds = time.perf_counter() - start
+            current_profile.reset(token)
+            # The router leaves the matched route in the scope, its path
+            # template keeps the label count bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            if profile.statements is not None:
+                findings = audit_findings(profile)
+                if findings:
+                    logger.warning("Query audit for %s %s: %s", method, route, "; ".join(findings))
+                    if held is not None:
+                        status_code = 500
+            REQUEST_SECONDS.observe((method, route, str(status_code)), seconds)
+            REQUEST_QUERIES.observe((method, route), profile.queries)
+            for name, phase_seconds in profile.phases.items():
+                PHASE_SECONDS.observe((method, route, name), phase_seconds)
+            if sampler is not None:
+                stacks = sampler.stop()
+                if requested or seconds * 1000 >= PROFILE_SLOW_MS:
+                    path = write_stacks(method, route, seconds, stacks)
+                    if path:
+                        logger.info("Profiled %s %s in %.0f ms: %s", method, route, seconds * 1000, path)
+
+        # Only reached when the request itself succeeded
+        if held is None:
+            return
+        if findings:
+            body = json.dumps({"detail": f"Query audit for {method} {route}: " + "; ".join(findings)}).encode("utf-8")
+            held = [
+                {"type": "http.response.start", "status": 500, "headers": [
+                    (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1")),
+                ]},
+                {"type": "http.response.body", "body": body},
+            ]
+        for message in held:
+            await send(message)
@@ -0,0 +1,293 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional
+from app.models.schemas import CalculationResult, CalculationResultItem, HouseTypeEnum
+
+# Declarative material rules for every house type.
+#
+# Each section lists the materials it produces, in output order. A quantity is
+# its "base" value multiplied by each of "factors" left to right, then rounded:
+# "round" None keeps the raw value, 0 rounds to a whole number, n keeps n digits.
+#
+# Foundation bases use the foundation width (w), depth (d) and length (l):
+#   volume          w * d * l
+#   slab_volume     (w * l) * d
+#   basement_walls  2 * (w + l) * d
+#   basement_floor  w * l
+# Wall bases are summed over all walls:
+#   area            length * height
+#   volume          area * width / 100 (width in cm)
+#   units           area * (width / (unit length * unit height)), width in units
+# Roof bases use the roof area (length * width * roof_pitch).
+#
+# "when" matches keys of the foundation or roof payload, True meaning any truthy
+# value. Wall rules may set "finished_only" to count walls with a finishing,
+# "skip_zero" to drop the item when nothing was counted and "name_from" to name
+# the item after the material of the last wall. Every house ends with its roof
+# material item.
+
+REINFORCED_CONCRETE = "Железобетон"
+WOODEN_ROOF = "Деревянная"
+
+HOUSE_TYPE_RULES: Dict[HouseTypeEnum, Dict[str, Any]] = {
+    HouseTypeEnum.BRICK: {
+        "foundation": [
+            {"name": "Concrete Mix", "unit": "kg", "base": "volume", "factors": [2400],
+             "when": {"type": REINFORCED_CONCRETE}},
+            {"name": "Reinforcement Steel", "unit": "m²", "base": "volume", "factors": [0.1, 10],
+             "when": {"type": REINFORCED_CONCRETE}},
+            {"name": "Basement Walls Material", "unit": "m²", "base": "basement_walls",
+             "when": {"has_basement": True}},
+            {"name": "Basement Floor Material", "unit": "m²", "base": "basement_floor",
+             "when": {"has_basement": True, "has_basement_floor": True}},
+        ],
+        "walls": [
+            {"name": "Standard Brick", "unit": "piece", "base": "units", "unit_size": [0.25, 0.065],
+             "factors": [0.85], "round": 0},
+            {"name": "Cement Mortar", "unit": "kg", "base": "area", "factors": [0.02, 2000], "round": 0},
+            {"name": "Insulation Material", "unit": "m²", "base": "area", "round": 2},
+        ],
+        "roof_pitch": 1.2,
+        "roof": [],
+    },
+    HouseTypeEnum.CONCRETE: {
+        "foundation": [
+            {"name": "Foundation Concrete", "unit": "kg", "base": "volume", "factors": [2400]},
+            {"name": "Foundation Reinforcement Steel", "unit": "m²", "base": "volume", "factors": [0.1, 10]},
+        ],
+        "walls": [
+            {"name": "Wall Concrete", "unit": "kg", "base": "volume", "factors": [2400], "round": 0},
+            {"name": "Wall Reinforcement Steel", "unit": "m²", "base": "volume", "factors": [0.08, 10],
+             "round": 2},
+            {"name": "Insulation Material", "unit": "m²", "base": "area", "round": 2},
+            {"name": "Wall Finishing Material", "unit": "m²", "base": "area", "round": 2,
+             "finished_only": True, "skip_zero": True},
+        ],
+        "roof_pitch": 1.2,
+        "roof": [],
+    },
+    HouseTypeEnum.WOODEN: {
+        "foundation": [
+            {"name": "Foundation Concrete", "unit": "kg", "base": "slab_volume", "factors": [2400], "round": 0},
+        ],
+        "walls": [
+            {"name": "Timber/Logs", "unit": "m³", "base": "volume", "factors": [0.85], "round": 2},
+            {"name": "Insulation Material", "unit": "m²", "base": "area", "round": 2},
+        ],
+        "roof_pitch": 1.2,
+        "roof": [
+            {"name": "Roof Timber", "unit": "m³", "base": "area", "factors": [0.04], "round": 2,
+             "when": {"type": WOODEN_ROOF}},
+        ],
+    },
+    HouseTypeEnum.BLOCKS: {
+        "foundation": [
+            {"name": "Foundation Concrete", "unit": "kg", "base": "volume", "factors": [2400], "round": 0},
+        ],
+        "walls": [
+            {"name_from": "material", "unit": "piece", "base": "units", "unit_size": [0.6, 0.2],
+             "factors": [0.85], "round": 0},
+            {"name": "Special Mortar", "unit": "kg", "base": "area", "factors": [0.01, 2000], "round": 0},
+            {"name": "Insulation Material", "unit": "m²", "base": "area", "round": 2},
+            {"name": "Wall Finishing Material", "unit": "m²", "base": "area", "round": 2,
+             "finished_only": True, "skip_zero": True},
+        ],
+        "roof_pitch": 1.2,
+        "roof": [],
+    },
+}
+
+ROOF_MATERIAL_NAME = "Roof Material ({material})"
+
+FOUNDATION_BASES: Dict[str, Callable[[float, float, float], float]] = {
+    "volume": lambda w, d, l: w * d * l,
+    "slab_volume": lambda w, d, l: w * l * d,
+    "basement_walls": lambda w, d, l: 2 * (w + l) * d,
+    "basement_floor": lambda w, d, l: w * l,
+}
+
+# Same bases as source expressions for the generated scalar calculators
+FOUNDATION_EXPRESSIONS = {
+    "volume": "width * depth * length",
+    "slab_volume": "width * length * depth",
+    "basement_walls": "2 * (width + length) * depth",
+    "basement_floor": "width * length",
+}
+
+WALL_BASES = ("area", "volume", "units")
+
+
+def rules_version(rules: Dict[HouseTypeEnum, Dict[str, Any]]) -> str:
+    # Stable fingerprint of the table, changes whenever a coefficient does
+    canonical = json.dumps(
+        {house_type.value: rule for house_type, rule in rules.items()},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def matches(section: Dict[str, Any], when: Optional[Dict[str, Any]]) -> bool:
+    if not when:
+        return True
+    for key, expected in when.items():
+        value = section.get(key)
+        if expected is True:
+            if not value:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def round_quantity(quantity: float, digits: Optional[int]) -> float:
+    if digits is None:
+        return quantity
+    if digits == 0:
+        return round(quantity)
+    return round(quantity, digits)
+
+
+def units_scale(rule: Dict[str, Any]) -> float:
+    # Units per m² of wall for one unit of wall width
+    unit_length, unit_height = rule["unit_size"]
+    return 1 / (unit_length * unit_height)
+
+
+def validate_rules(rules: Dict[HouseTypeEnum, Dict[str, Any]]) -> None:
+    for house_type, rule in rules.items():
+        for item in rule["foundation"]:
+            if item["base"] not in FOUNDATION_BASES:
+                raise ValueError(f"Unknown foundation base for {house_type}: {item['base']}")
+        for item in rule["walls"]:
+            if item["base"] not in WALL_BASES:
+                raise ValueError(f"Unknown wall base for {house_type}: {item['base']}")
+            if item["base"] == "units" and "unit_size" not in item:
+                raise ValueError(f"Wall rule for {house_type} needs a unit_size")
+        for item in rule["roof"]:
+            if item["base"] != "area":
+                raise ValueError(f"Unknown roof base for {house_type}: {item['base']}")
+
+
+def _scaled(expression: str, factors: List[float]) -> str:
+    # Python multiplies left to right, so the factors apply in table order
+    return " * ".join([expression] + [repr(factor) for factor in factors])
+
+
+def _rounded(expression: str, digits: Optional[int]) -> str:
+    if digits is None:
+        return expression
+    if digits == 0:
+        return f"round({expression})"
+    return f"round({expression}, {digits})"
+
+
+def _item_source(name: str, quantity: str, unit: str) -> str:
+    return f"materials.append(CalculationResultItem(name={name}, quantity={quantity}, unit={unit!r}))"
+
+
+def _condition(section: str, when: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not when:
+        return None
+    return f"matches({section}, {when!r})"
+
+
+def calculator_source(rule: Dict[str, Any]) -> str:
+    # Generates a straight-line calculator: constants are inlined, the rule
+    # list is unrolled and every wall is visited once
+    lines = [
+        "def calculate(data):",
+        "    foundation = data.get('foundation', {})",
+        "    walls = data.get('walls', [])",
+        "    roof = data.get('roof', {})",
+        "    materials = []",
+        "    width = foundation.get('width', 0)",
+        "    depth = foundation.get('depth', 0)",
+        "    length = foundation.get('length', 0)",
+    ]
+
+    for item in rule["foundation"]:
+        quantity = _scaled(FOUNDATION_EXPRESSIONS[item["base"]], item.get("factors", []))
+        statement = _item_source(repr(item["name"]), _rounded(quantity, item.get("round")), item["unit"])
+        condition = _condition("foundation", item.get("when"))
+        if condition:
+            lines += [f"    if {condition}:", f"        {statement}"]
+        else:
+            lines.append(f"    {statement}")
+
+    wall_rules = rule["walls"]
+    needs_finishing = any(item.get("finished_only") for item in wall_rules)
+    needs_material = any(item.get("name_from") for item in wall_rules)
+    lines += [f"    total_{index} = 0" for index in range(len(wall_rules))]
+    lines += [
+        "    total_area = 0",
+        "    last_material = ''",
+        "    for wall in walls:",
+        "        wall_area = wall.get('length', 0) * wall.get('height', 0)",
+        "        wall_width = wall.get('width', 0)",
+        "        total_area += wall_area",
+    ]
+    if needs_material:
+        lines.append("        last_material = wall.get('material', '')")
+    if needs_finishing:
+        lines.append("        finished = wall.get('finishing', '')")
+    for index, item in enumerate(wall_rules):
+        if item["base"] == "area":
+            base = "wall_area"
+        elif item["base"] == "volume":
+            base = "wall_area * wall_width / 100"
+        else:
+            base = f"wall_area * ({units_scale(item)!r} * wall_width)"
+        statement = f"total_{index} += {_scaled(base, item.get('factors', []))}"
+        if item.get("finished_only"):
+            lines += ["        if finished:", f"            {statement}"]
+        else:
+            lines.append(f"        {statement}")
+
+    for index, item in enumerate(wall_rules):
+        name = "last_material" if item.get("name_from") else repr(item["name"])
+        statement = _item_source(name, _rounded(f"total_{index}", item.get("round")), item["unit"])
+        if item.get("skip_zero"):
+            lines += [f"    if total_{index} > 0:", f"        {statement}"]
+        else:
+            lines.append(f"    {statement}")
+
+    lines.append(f"    roof_area = roof.get('length', 0) * roof.get('width', 0) * {rule['roof_pitch']!r}")
+    for item in rule["roof"]:
+        quantity = _scaled("roof_area", item.get("factors", []))
+        statement = _item_source(repr(item["name"]), _rounded(quantity, item.get("round")), item["unit"])
+        condition = _condition("roof", item.get("when"))
+        if condition:
+            lines += [f"    if {condition}:", f"        {statement}"]
+        else:
+            lines.append(f"    {statement}")
+
+    roof_name = f"{ROOF_MATERIAL_NAME!r}.format(material=roof.get('material', ''))"
+    lines += [
+        f"    {_item_source(roof_name, 'round(roof_area, 2)', 'm²')}",
+        "    total_area += roof_area",
+        "    return CalculationResult(materials=materials, total_area=round(total_area, 2))",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def compile_calculator(rule: Dict[str, Any]) -> Callable[[Dict[str, Any]], CalculationResult]:
+    source = calculator_source(rule)
+    namespace = {
+        "matches": matches,
+        "CalculationResult": CalculationResult,
+        "CalculationResultItem": CalculationResultItem,
+    }
+    exec(compile(source, "<house type rules>", "exec"), namespace)
+    calculate = namespace["calculate"]
+    calculate.source = source
+    return calculate
+
+
+def compile_rules(
+    rules: Dict[HouseTypeEnum, Dict[str, Any]]
+) -> Dict[HouseTypeEnum, Callable[[Dict[str, Any]], CalculationResult]]:
+    validate_rules(rules)
+    return {house_type: compile_calculator(rule) for house_type, rule in rules.items()}
+
+
+RULES_VERSION = rules_version(HOUSE_TYPE_RULES)
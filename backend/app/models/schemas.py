@@ -1,5 +1,5 @@
-from typing import List, Optional, Dict, Any, Union
-from pydantic import BaseModel, EmailStr, Field
+from typing import List, Literal, Optional, Dict, Any, Union
+from pydantic import BaseModel, EmailStr, Field, validator
 from enum import Enum
 from datetime import datetime
 
@@ -75,6 +75,9 @@ class CalculationCreate(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
+class CalculationBatchCreate(BaseModel):
+    calculations: List[CalculationCreate]
+
 class CalculationResultItem(BaseModel):
     name: str
     quantity: float
@@ -93,10 +96,117 @@ class CalculationResponse(BaseModel):
     input_data: Dict[str, Any]
     result_data: CalculationResult
     created_at: datetime
+
+    # The ORM column holds the models.HouseType enum
+    @validator("house_type", pre=True)
+    def house_type_value(cls, value):
+        return getattr(value, "value", value)
     
     class Config:
         orm_mode = True
 
+class CalculationSummary(BaseModel):
+    id: int
+    house_type: HouseTypeEnum
+    created_at: datetime
+    total_area: Optional[float] = None
+    total_cost: Optional[float] = None
+
+    @validator("house_type", pre=True)
+    def house_type_value(cls, value):
+        return getattr(value, "value", value)
+
+    class Config:
+        orm_mode = True
+
+class CalculationPage(BaseModel):
+    items: List[CalculationSummary]
+    # Pass back as ?cursor= for the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+class MaterialTotal(BaseModel):
+    name: str
+    unit: str
+    quantity: float
+    total_price: float
+
+class UserCalculationStatsResponse(BaseModel):
+    calculations: int
+    total_area: float
+    total_cost: float
+    average_area: Optional[float] = None
+    materials: List[MaterialTotal]
+
+class HouseTypeStatsResponse(UserCalculationStatsResponse):
+    house_type: HouseTypeEnum
+
+class WallPatch(BaseModel):
+    op: Literal["add", "update", "remove"]
+    # Wall position for update and remove, insert position for add (appends if missing)
+    index: Optional[int] = None
+    wall: Optional[WallBase] = None
+
+class CalculationPatch(BaseModel):
+    foundation: Optional[FoundationBase] = None
+    walls: List[WallPatch] = []
+    roof: Optional[RoofBase] = None
+
+class MaterialDelta(BaseModel):
+    name: str
+    unit: str
+    status: Literal["added", "changed", "removed"]
+    quantity: float
+    quantity_change: float
+    total_price_change: float
+
+class CalculationPatchResponse(BaseModel):
+    id: int
+    total_area: float
+    total_cost: Optional[float] = None
+    delta: List[MaterialDelta]
+    result: Optional[CalculationResult] = None
+
+class SweepParameter(BaseModel):
+    # "foundation.depth", "roof.material", "walls.height" (every wall) or "walls.2.height"
+    path: str
+    values: Optional[List[Union[float, str, bool]]] = None
+    # Inclusive numeric range, used when values is not given
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    step: Optional[float] = None
+
+class SweepRequest(BaseModel):
+    base: CalculationCreate
+    parameters: List[SweepParameter]
+    # Return only the best N points instead of streaming the whole grid
+    top: Optional[int] = Field(None, ge=1, le=1000)
+    sort_by: Literal["total_cost", "total_area"] = "total_cost"
+    descending: bool = False
+
+class SweepPoint(BaseModel):
+    index: int
+    parameters: Dict[str, Any]
+    result: CalculationResult
+
+class SweepResponse(BaseModel):
+    points: int
+    results: List[SweepPoint]
+
+class BatchJobStatus(BaseModel):
+    id: str
+    status: Literal["pending", "running", "completed", "failed", "cancelled"]
+    total: int
+    completed: int
+    progress: float
+    error: Optional[str] = None
+    elapsed: float
+
+class QueuedCalculation(BaseModel):
+    id: str
+    status: Literal["queued", "stored"]
+    # Set once stored, fetch it from /api/calculations/{calculation_id}
+    calculation_id: Optional[int] = None
+
 # Material Schemas
 class MaterialBase(BaseModel):
     name: str
@@ -109,8 +219,24 @@ class MaterialBase(BaseModel):
 class MaterialCreate(MaterialBase):
     pass
 
+class MaterialImportError(BaseModel):
+    line: int
+    error: str
+
+class MaterialImportReport(BaseModel):
+    inserted: int
+    updated: int
+    unchanged: int
+    rejected: int
+    errors: List[MaterialImportError]
+
 class MaterialResponse(MaterialBase):
     id: int
+
+    # The ORM columns hold the models.MaterialType and models.HouseType enums
+    @validator("type", "house_type", pre=True)
+    def enum_value(cls, value):
+        return getattr(value, "value", value)
     
     class Config:
         orm_mode = True 
\ No newline at end of file
@@ -0,0 +1,82 @@
+from typing import Any, Dict, Iterable, List, Optional, Union
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from app.models.profiling import phase
+from app.models.schemas import CalculationResult
+
+# Fast path for calculation responses. Results built by the calculators and
+# rows read back from our own tables are already valid, so they skip response
+# model validation: models are dumped to JSON by pydantic-core, everything
+# else by orjson, and documents that are already JSON bytes or text are
+# spliced into the response unparsed.
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+Raw = Union[str, bytes, Dict[str, Any], List[Any], None]
+
+# Serializers only, pydantic-core writes the models to JSON bytes directly
+RESULT_ADAPTER = TypeAdapter(CalculationResult)
+RESULTS_ADAPTER = TypeAdapter(List[CalculationResult])
+
+
+class RawJSONResponse(ORJSONResponse):
+    # Content that is already JSON bytes is sent as is
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        with phase("encode"):
+            return super().render(content)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=JSON_OPTIONS)
+
+
+def raw_json(value: Raw) -> bytes:
+    # Text columns come back as the stored JSON, decoded JSON columns are re-encoded
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return dumps(value)
+
+
+def result_content(result: CalculationResult) -> Dict[str, Any]:
+    # Dumped, not validated, the calculators only build valid results
+    return result.model_dump()
+
+
+@phase("encode")
+def result_response(result: CalculationResult) -> RawJSONResponse:
+    return RawJSONResponse(RESULT_ADAPTER.dump_json(result))
+
+
+@phase("encode")
+def results_response(results: Iterable[CalculationResult]) -> RawJSONResponse:
+    return RawJSONResponse(RESULTS_ADAPTER.dump_json(list(results)))
+
+
+@phase("encode")
+def calculation_json(calculation_id: int, house_type: Any, input_data: Raw, result_data: Raw,
+                     created_at: Optional[Any]) -> bytes:
+    # Same fields and order as CalculationResponse
+    return b"".join((
+        b'{"id":', dumps(calculation_id),
+        b',"house_type":', dumps(getattr(house_type, "value", house_type)),
+        b',"input_data":', raw_json(input_data),
+        b',"result_data":', raw_json(result_data),
+        b',"created_at":', dumps(created_at),
+        b"}",
+    ))
+
+
+def summary_content(row: Any) -> Dict[str, Any]:
+    # Same fields as CalculationSummary
+    return {
+        "id": row.id,
+        "house_type": row.house_type.value,
+        "created_at": row.created_at,
+        "total_area": row.total_area,
+        "total_cost": row.total_cost,
+    }
@@ -0,0 +1,226 @@
+import heapq
+import json
+import math
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from app.models.schemas import CalculationResult, SweepParameter, SweepRequest
+from app.models.batch import calculate_packed, pack_houses
+from app.models.pricing import price_result
+from app.models.profiling import phase
+
+# Largest grid a single sweep may evaluate
+SWEEP_MAX_POINTS = int(os.getenv("SWEEP_MAX_POINTS", "100000"))
+# Grid points evaluated per vectorized batch, bounds memory for large grids
+SWEEP_CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", "2000"))
+
+SECTIONS = ("foundation", "walls", "roof")
+
+# Keys the batch engine reads as number columns, the other foundation and
+# roof keys only feed the rule conditions and names
+NUMBER_COLUMNS = {"foundation": ("width", "depth", "length"), "roof": ("length", "width")}
+WALL_COLUMNS = {"length": np.float64, "height": np.float64, "width": np.float64, "finishing": bool}
+
+
+class SweepError(ValueError):
+    pass
+
+
+def parameter_values(parameter: SweepParameter) -> List[Any]:
+    if parameter.values is not None:
+        if not parameter.values:
+            raise SweepError(f"{parameter.path} has no values")
+        return list(parameter.values)
+    if parameter.start is None or parameter.stop is None or not parameter.step:
+        raise SweepError(f"{parameter.path} needs values or start, stop and step")
+    if (parameter.stop - parameter.start) / parameter.step < 0:
+        raise SweepError(f"{parameter.path} step does not move from start to stop")
+    # Inclusive of stop, rounded so 0.1 steps do not drift into 2.9000000000000004
+    count = math.floor((parameter.stop - parameter.start) / parameter.step + 1e-9) + 1
+    return [round(parameter.start + index * parameter.step, 10) for index in range(count)]
+
+
+class Axis(NamedTuple):
+    path: str
+    section: str
+    key: str
+    # Index of the one wall swept, None for every wall and for other sections
+    wall: Optional[int]
+    values: List[Any]
+
+
+def parse_axis(base: Dict[str, Any], parameter: SweepParameter) -> Axis:
+    values = parameter_values(parameter)
+    path = parameter.path
+    parts = path.split(".")
+    section = parts[0]
+    if section not in SECTIONS:
+        raise SweepError(f"Unknown sweep path {path}")
+
+    if section != "walls":
+        if len(parts) != 2 or parts[1] not in base[section]:
+            raise SweepError(f"Unknown sweep path {path}")
+        key, wall = parts[1], None
+    else:
+        walls = base["walls"]
+        if len(parts) == 2:
+            if not walls or parts[1] not in walls[0]:
+                raise SweepError(f"Unknown sweep path {path}")
+            key, wall = parts[1], None
+        elif len(parts) == 3 and parts[1].isdigit() and int(parts[1]) < len(walls) and parts[2] in walls[0]:
+            key, wall = parts[2], int(parts[1])
+        else:
+            raise SweepError(f"Unknown sweep path {path}")
+
+    _check_type(base, path, values)
+    return Axis(path, section, key, wall, values)
+
+
+def _check_type(base: Dict[str, Any], path: str, values: List[Any]) -> None:
+    # Numbers stay numbers, the calculators do arithmetic on them
+    parts = path.split(".")
+    current = base[parts[0]][0] if parts[0] == "walls" else base[parts[0]]
+    current = current[parts[-1]]
+    if isinstance(current, (int, float)) and not isinstance(current, bool):
+        if any(isinstance(value, (str, bool)) for value in values):
+            raise SweepError(f"{path} takes numeric values")
+
+
+def sweep_grid(request: SweepRequest) -> Tuple[int, Dict[str, Any], List[Axis]]:
+    base = request.base.dict(by_alias=True)
+    if not request.parameters:
+        raise SweepError("A sweep needs at least one parameter")
+
+    axes = [parse_axis(base, parameter) for parameter in request.parameters]
+    points = math.prod(len(axis.values) for axis in axes)
+    if points > SWEEP_MAX_POINTS:
+        raise SweepError(f"The sweep has {points} points, the limit is {SWEEP_MAX_POINTS}")
+    return points, base, axes
+
+
+def grid_positions(axes: List[Axis], start: int, stop: int) -> List[np.ndarray]:
+    # Where each point in [start, stop) sits along every axis, in the order of
+    # itertools.product: the last parameter changes fastest
+    index = np.arange(start, stop)
+    positions = []
+    stride = 1
+    for axis in reversed(axes):
+        positions.append(index // stride % len(axis.values))
+        stride *= len(axis.values)
+    return positions[::-1]
+
+
+def _distinct_sections(base_section: Dict[str, Any], swept: List[Tuple[Axis, np.ndarray]],
+                       count: int) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    # Each combination of swept values occurring in the chunk once, and the
+    # combination of every point
+    if not swept:
+        return [base_section], np.zeros(count, dtype=np.intp)
+    code = np.zeros(count, dtype=np.int64)
+    for axis, position in swept:
+        code = code * len(axis.values) + position
+    codes, groups = np.unique(code, return_inverse=True)
+
+    sections = []
+    for code in codes.tolist():
+        positions = []
+        for axis, _ in reversed(swept):
+            code, position = divmod(code, len(axis.values))
+            positions.append(position)
+        # Applied in request order, a later parameter on the same key wins
+        section = dict(base_section)
+        for (axis, _), position in zip(swept, reversed(positions)):
+            section[axis.key] = axis.values[position]
+        sections.append(section)
+    return sections, groups
+
+
+def sweep_columns(base: Dict[str, Any], packed: Dict[str, Any], axes: List[Axis],
+                  positions: List[np.ndarray]) -> Dict[str, Any]:
+    # The batch engine's columns for a chunk of the grid, built from the base
+    # house packed once and the swept values picked by position
+    count = len(positions[0])
+    columns: Dict[str, Any] = {"count": count}
+    swept = list(zip(axes, positions))
+
+    for section, keys in NUMBER_COLUMNS.items():
+        for key in keys:
+            column = np.repeat(packed[f"{section}_{key}"], count)
+            for axis, position in swept:
+                if axis.section == section and axis.key == key:
+                    column = np.asarray(axis.values, dtype=np.float64)[position]
+            columns[f"{section}_{key}"] = column
+        columns[section + "s"], columns[section + "_group"] = _distinct_sections(
+            base[section], [(axis, position) for axis, position in swept
+                            if axis.section == section and axis.key not in keys], count
+        )
+
+    walls = len(base["walls"])
+    for key, dtype in WALL_COLUMNS.items():
+        matrix = np.tile(packed["wall_" + key], (count, 1))
+        for axis, position in swept:
+            if axis.section == "walls" and axis.key == key:
+                values = np.array([bool(value) if dtype is bool else value for value in axis.values], dtype=dtype)
+                if axis.wall is None:
+                    matrix[:] = values[position][:, None]
+                else:
+                    matrix[:, axis.wall] = values[position]
+        columns["wall_" + key] = matrix.ravel()
+    columns["wall_house"] = np.repeat(np.arange(count, dtype=np.intp), walls)
+
+    columns["last_materials"] = packed["last_materials"]
+    columns["last_material_group"] = np.zeros(count, dtype=np.intp)
+    for axis, position in swept:
+        if axis.section == "walls" and axis.key == "material" and axis.wall in (None, walls - 1):
+            columns["last_materials"], columns["last_material_group"] = axis.values, position
+    return columns
+
+
+def evaluate(request: SweepRequest) -> Tuple[int, Iterator[Tuple[int, Dict[str, Any], CalculationResult]]]:
+    house_type = request.base.house_type
+    points, base, axes = sweep_grid(request)
+    packed = pack_houses([base])
+
+    def results():
+        for start in range(0, points, SWEEP_CHUNK_SIZE):
+            positions = grid_positions(axes, start, min(start + SWEEP_CHUNK_SIZE, points))
+            # Open while the stream is consumed, the chunks are computed as
+            # the response is sent
+            with phase("engine"):
+                columns = sweep_columns(base, packed, axes, positions)
+                priced = [price_result(house_type, result) for result in calculate_packed(house_type, columns)]
+            for offset, (point, result) in enumerate(zip(zip(*(position.tolist() for position in positions)), priced)):
+                parameters = {axis.path: axis.values[position] for axis, position in zip(axes, point)}
+                yield start + offset, parameters, result
+
+    return points, results()
+
+
+def top_points(request: SweepRequest) -> Tuple[int, List[Dict[str, Any]]]:
+    points, results = evaluate(request)
+    missing = -math.inf if request.descending else math.inf
+
+    def sort_key(point):
+        value = getattr(point[2], request.sort_by)
+        return missing if value is None else value
+
+    select = heapq.nlargest if request.descending else heapq.nsmallest
+    best = select(request.top, results, key=sort_key)
+    return points, [
+        {"index": index, "parameters": parameters, "result": result}
+        for index, parameters, result in best
+    ]
+
+
+def ndjson_points(results: Iterator[Tuple[int, Dict[str, Any], CalculationResult]]) -> Iterator[str]:
+    # One point per line, sent a chunk at a time instead of a write per point
+    lines = []
+    for index, parameters, result in results:
+        lines.append(json.dumps(
+            {"index": index, "parameters": parameters, "result": result.dict()}, ensure_ascii=False
+        ) + "\n")
+        if len(lines) >= SWEEP_CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from app.database.database import SessionLocal
+from app.models.models import Calculation, HouseType
+from app.models.documents import store_documents
+from app.models.aggregates import record_calculations
+from app.models.schemas import CalculationResult, HouseTypeEnum
+
+logger = logging.getLogger(__name__)
+
+# Local SQLite file holding accepted calculations until they are in the database
+CALCULATION_QUEUE_PATH = os.getenv("CALCULATION_QUEUE_PATH", "./calculation_queue.db")
+# Rows per multi-row insert
+CALCULATION_QUEUE_BATCH_SIZE = int(os.getenv("CALCULATION_QUEUE_BATCH_SIZE", "500"))
+# Longest a calculation waits for its batch to fill, in milliseconds
+CALCULATION_QUEUE_WINDOW_MS = float(os.getenv("CALCULATION_QUEUE_WINDOW_MS", "50"))
+# Seconds a stored entry stays available for polling
+CALCULATION_QUEUE_RETENTION = float(os.getenv("CALCULATION_QUEUE_RETENTION", "3600"))
+# Seconds after which a batch claimed by a writer that never stored it, e.g.
+# one whose worker was killed, can be claimed by another writer
+CALCULATION_QUEUE_CLAIM_TIMEOUT = float(os.getenv("CALCULATION_QUEUE_CLAIM_TIMEOUT", "60"))
+
+QUEUED = "queued"
+WRITING = "writing"
+STORED = "stored"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queued_calculations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    house_type TEXT NOT NULL,
+    input_data TEXT NOT NULL,
+    result_data TEXT NOT NULL,
+    accepted_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    calculation_id INTEGER,
+    stored_at REAL,
+    owner TEXT,
+    claimed_at REAL
+)
+"""
+
+# Journals created before batches were claimed
+CLAIM_COLUMNS = {"owner": "TEXT", "claimed_at": "REAL"}
+
+
+class CalculationQueue:
+    # Accepts calculations into a local SQLite journal and writes them to the
+    # database in multi-row inserts from a writer thread. Entries are journaled
+    # before the client gets its 202, so a restart resumes the backlog. Every
+    # worker process shares the journal and runs a writer: a writer claims its
+    # batch in one UPDATE, so no entry is written by two of them
+
+    def __init__(self, path: str, batch_size: int, window_ms: float, retention: float,
+                 claim_timeout: float = CALCULATION_QUEUE_CLAIM_TIMEOUT):
+        self.path = path
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.retention = retention
+        self.claim_timeout = claim_timeout
+        self.owner = uuid.uuid4().hex
+        self._journal: Optional[sqlite3.Connection] = None
+        self._journal_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._pending = 0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._waiters: Dict[str, List[Any]] = {}
+        self.batches = 0
+        self.stored = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(SCHEMA)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(queued_calculations)")}
+        for column, column_type in CLAIM_COLUMNS.items():
+            if column not in columns:
+                connection.execute(f"ALTER TABLE queued_calculations ADD COLUMN {column} {column_type}")
+        return connection
+
+    def start(self) -> None:
+        self._journal = self._connect()
+        # Only wakes the writer: the entries go to whichever writer claims them
+        with self._journal_lock:
+            backlog = self._journal.execute(
+                "SELECT COUNT(*) FROM queued_calculations WHERE status IN (?, ?)", (QUEUED, WRITING)
+            ).fetchone()[0]
+        if backlog:
+            logger.info("Resuming %d queued calculations", backlog)
+        with self._wakeup:
+            self._pending = backlog
+            self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="calculation-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        # The writer flushes what is queued before it exits
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def enqueue(self, user_id: int, house_type: HouseTypeEnum, input_data: Dict[str, Any],
+                result: CalculationResult) -> Dict[str, Any]:
+        entry_id = uuid.uuid4().hex
+        with self._journal_lock:
+            self._journal.execute(
+                "INSERT INTO queued_calculations (id, user_id, house_type, input_data, result_data, accepted_at, status)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, user_id, house_type.value, json.dumps(input_data, ensure_ascii=False),
+                 json.dumps(result.dict(), ensure_ascii=False), time.time(), QUEUED),
+            )
+        with self._wakeup:
+            self._pending += 1
+            self._wakeup.notify()
+        return {"id": entry_id, "status": QUEUED, "calculation_id": None}
+
+    def status(self, entry_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._journal_lock:
+            row = self._journal.execute(
+                "SELECT status, calculation_id FROM queued_calculations WHERE id = ? AND user_id = ?",
+                (entry_id, user_id),
+            ).fetchone()
+        if row is None:
+            return None
+        # A claimed entry is still queued as far as the client can tell
+        return {"id": entry_id, "status": STORED if row[0] == STORED else QUEUED, "calculation_id": row[1]}
+
+    async def wait(self, entry_id: str, user_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        # Long poll: park on a future the writer resolves, no thread is held
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.setdefault(entry_id, []).append((loop, future))
+        try:
+            current = self.status(entry_id, user_id)
+            if current is None or current["status"] != QUEUED:
+                return current
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.status(entry_id, user_id)
+        finally:
+            waiters = self._waiters.get(entry_id, [])
+            if (loop, future) in waiters:
+                waiters.remove((loop, future))
+            if not waiters:
+                self._waiters.pop(entry_id, None)
+
+    def _notify(self, entry_ids: List[str]) -> None:
+        for entry_id in entry_ids:
+            for loop, future in list(self._waiters.get(entry_id, ())):
+                loop.call_soon_threadsafe(lambda future=future: future.done() or future.set_result(None))
+
+    def _run(self) -> None:
+        retry_delay = 0.5
+        while True:
+            with self._wakeup:
+                # Idle writers look for abandoned batches once per claim timeout
+                if not self._pending and not self._stopping:
+                    self._wakeup.wait(self.claim_timeout)
+                if not self._pending and self._stopping:
+                    return
+                # Give the batch a short window to fill before writing it
+                deadline = time.monotonic() + self.window
+                while self._pending < self.batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                counted = self._pending
+
+            try:
+                written = self._write_batch()
+                retry_delay = 0.5
+            except Exception:
+                logger.exception("Writing queued calculations failed, retrying in %.1fs", retry_delay)
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+                if self._stopping:
+                    return
+                continue
+
+            # A short batch took everything claimable, so the entries counted
+            # before the claim are stored, here or by another worker's writer
+            with self._wakeup:
+                self._pending = max(self._pending - (written if written == self.batch_size else counted), 0)
+            self._prune()
+
+    def _claim(self) -> List[Any]:
+        # Queued entries, this writer's own unstored batch after a failed write
+        # and batches whose writer went away, oldest first
+        now = time.time()
+        with self._journal_lock:
+            rows = self._journal.execute(
+                "UPDATE queued_calculations SET status = ?, owner = ?, claimed_at = ?"
+                " WHERE seq IN (SELECT seq FROM queued_calculations"
+                " WHERE status = ? OR (status = ? AND (owner = ? OR claimed_at < ?))"
+                " ORDER BY seq LIMIT ?)"
+                " RETURNING seq, id, user_id, house_type, input_data, result_data, accepted_at",
+                (WRITING, self.owner, now, QUEUED, WRITING, self.owner, now - self.claim_timeout,
+                 self.batch_size),
+            ).fetchall()
+        # RETURNING has no order, the calculations are inserted in acceptance order
+        return [row[1:] for row in sorted(rows)]
+
+    def _write_batch(self) -> int:
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        documents = []
+        values = []
+        for entry_id, user_id, house_type, input_data, result_data, accepted_at in rows:
+            result = json.loads(result_data)
+            documents.append((house_type, json.loads(input_data), result))
+            values.append({
+                "user_id": user_id,
+                "house_type": HouseType(house_type),
+                "total_area": result.get("total_area"),
+                "total_cost": result.get("total_cost"),
+                "created_at": datetime.fromtimestamp(accepted_at, tz=timezone.utc),
+            })
+
+        # One upsert for the batch's documents and one multi-row
+        # INSERT ... RETURNING for the calculations, ids come back in row order
+        db = SessionLocal()
+        try:
+            for row_values, document_id in zip(values, store_documents(db, documents)):
+                row_values["document_id"] = document_id
+            record_calculations(db, [
+                (row_values["user_id"], house_type, result, 1)
+                for row_values, (house_type, _, result) in zip(values, documents)
+            ])
+            ids = db.scalars(
+                insert(Calculation).returning(Calculation.id, sort_by_parameter_order=True),
+                values,
+            ).all()
+            db.commit()
+        finally:
+            db.close()
+
+        # A crash between the commit above and this update writes the batch
+        # again on restart, delivery is at least once
+        stored_at = time.time()
+        with self._journal_lock:
+            self._journal.executemany(
+                "UPDATE queued_calculations SET status = ?, calculation_id = ?, stored_at = ? WHERE id = ?",
+                [(STORED, calculation_id, stored_at, row[0]) for row, calculation_id in zip(rows, ids)],
+            )
+        self.batches += 1
+        self.stored += len(rows)
+        self._notify([row[0] for row in rows])
+        return len(rows)
+
+    def _prune(self) -> None:
+        with self._journal_lock:
+            self._journal.execute(
+                "DELETE FROM queued_calculations WHERE status = ? AND stored_at < ?",
+                (STORED, time.time() - self.retention),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._wakeup:
+            pending = self._pending
+        return {"pending": pending, "batches": self.batches, "stored": self.stored,
+                "batch_size": self.batch_size, "window_ms": self.window * 1000}
+
+
+calculation_queue = CalculationQueue(
+    CALCULATION_QUEUE_PATH, CALCULATION_QUEUE_BATCH_SIZE, CALCULATION_QUEUE_WINDOW_MS, CALCULATION_QUEUE_RETENTION,
+    CALCULATION_QUEUE_CLAIM_TIMEOUT,
+)
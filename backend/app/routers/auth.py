@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
 from datetime import timedelta
-from app.models.schemas import UserCreate, UserResponse, Token, UserLogin
+from app.models.schemas import UserCreate, UserResponse, Token
 from app.models.models import User
-from app.database.database import get_db
+from app.database.database import get_async_db
 from app.auth.jwt import (
     authenticate_user, create_access_token,
-    get_password_hash, get_current_active_user,
+    get_current_active_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from app.auth.hashing import hash_password
+from app.auth.principal import principal_cache
 
 router = APIRouter(
     prefix="/api/auth",
@@ -19,9 +22,9 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)) -> Any:
     # Check if user with the same email already exists
-    db_user = db.query(User).filter(User.email == user_data.email).first()
+    db_user = await db.scalar(select(User).where(User.email == user_data.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,7 +32,7 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -41,14 +44,13 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)) -> Any:
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     return db_user
 
 @router.post("/login", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Any:
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)) -> Any:
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,10 +59,21 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "id": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_active_user)) -> Any:
-    return current_user 
\ No newline at end of file
+async def read_users_me(current_user: User = Depends(get_current_active_user)) -> Any:
+    return current_user
+
+@router.get("/cache/stats")
+async def get_principal_cache_stats(current_user: User = Depends(get_current_active_user)) -> Any:
+    # Only admin users can inspect the principal cache
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view cache statistics"
+        )
+
+    return principal_cache.stats()
@@ -1,10 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Any, List
-from app.database.database import get_db
-from app.models.schemas import CalculationCreate, CalculationResponse, CalculationResult
-from app.models.models import Calculation, User
-from app.models.calculations import calculate_materials
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from app.database.database import get_async_db
+from app.models.schemas import (
+    CalculationCreate, CalculationBatchCreate, CalculationResponse, CalculationResult, HouseTypeEnum,
+    CalculationPage, CalculationPatch, CalculationPatchResponse, SweepRequest, SweepResponse,
+    BatchJobStatus, QueuedCalculation, UserCalculationStatsResponse, HouseTypeStatsResponse
+)
+from app.models.models import (
+    Calculation, CalculationDocument, User, HouseType, HouseTypeMaterialTotal, HouseTypeStats,
+    UserCalculationStats, UserMaterialTotal
+)
+from app.models.documents import claim_document, input_digest, release_documents, store_documents
+from app.models.aggregates import record_calculations
+from app.models.cache import cached_calculate_materials, result_cache
+from app.models.pricing import price_index, price_result
+from app.models.profiling import phase, query_budget
+from app.models.incremental import (
+    CalculationParts, apply_patch, assemble, build_parts, component_cache, material_delta
+)
+from app.models.write_queue import calculation_queue
+from app.models.jobs import COMPLETED, Job, JobLimitError, job_manager
+from app.models.serialization import (
+    RawJSONResponse, calculation_json, result_content, result_response, results_response, summary_content
+)
+from app.models.export import csv_lines, export_calculations, ndjson_lines
+from app.models.pagination import InvalidCursor, after_cursor, decode_cursor, encode_cursor, history_order
 from app.auth.jwt import get_current_active_user
 
 router = APIRouter(
@@ -13,60 +40,373 @@ router = APIRouter(
     responses={401: {"description": "Unauthorized"}},
 )
 
-@router.post("/", response_model=CalculationResponse, status_code=status.HTTP_201_CREATED)
-def create_calculation(
+def summary_stats(stats: Any, materials: List[Any]) -> Dict[str, Any]:
+    calculations = stats.calculations if stats else 0
+    return {
+        "calculations": calculations,
+        "total_area": stats.total_area if stats else 0.0,
+        "total_cost": stats.total_cost if stats else 0.0,
+        "average_area": stats.total_area / calculations if calculations else None,
+        "materials": [
+            {"name": material.name, "unit": material.unit,
+             "quantity": material.quantity, "total_price": material.total_price}
+            for material in materials
+        ],
+    }
+
+@phase("engine")
+def calculate_priced(house_type: HouseTypeEnum, data: Dict[str, Any]) -> CalculationResult:
+    # Calculate materials, reusing the cached result for repeated inputs
+    result = cached_calculate_materials(house_type, data)
+    return price_result(house_type, result)
+
+@phase("engine")
+def patch_priced(
+    house_type: HouseTypeEnum, parts: Optional[CalculationParts], input_data: Dict[str, Any], patch: CalculationPatch
+) -> Tuple[CalculationParts, CalculationResult]:
+    if parts is None or parts.input_data != input_data:
+        parts = build_parts(house_type, input_data)
+    parts = apply_patch(parts, patch)
+    return parts, price_result(house_type, assemble(parts))
+
+# Query budgets count the whole request, including loading the user on a
+# principal cache miss. QUERY_AUDIT=raise answers requests over them with a 500,
+# tests/test_query_budgets.py calls every budgeted route in that mode
+@router.post("/", response_model=CalculationResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(query_budget(8))])
+async def create_calculation(
     calculation_data: CalculationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
-    # Calculate materials
-    result = calculate_materials(calculation_data.house_type, calculation_data.dict(by_alias=True))
-    
-    # Save calculation to database
+    input_data = calculation_data.dict(by_alias=True)
+    house_type = calculation_data.house_type
+
+    # An input saved before under the same rules and prices already has its
+    # document: reference it and skip the calculation
+    await run_in_threadpool(price_index.refresh_if_stale)
+    digest = input_digest(house_type, input_data, price_index.version)
+    stored = await db.run_sync(claim_document, digest)
+    if stored is not None:
+        document_id, result_data = stored
+    else:
+        # The calculation is CPU bound, keep it off the event loop
+        result = await run_in_threadpool(calculate_priced, house_type, input_data)
+        result_data = result.dict()
+        if input_digest(house_type, input_data, price_index.version) != digest:
+            # Prices were reloaded meanwhile, the result is not for that digest
+            digest = None
+        # Save calculation to database, the input and result are stored once
+        # however many calculations share them
+        document_ids = await db.run_sync(store_documents, [(house_type, input_data, result_data)], [digest])
+        document_id = document_ids[0]
+
     db_calculation = Calculation(
         user_id=current_user.id,
-        house_type=calculation_data.house_type.value,
-        input_data=calculation_data.dict(by_alias=True),
-        result_data=result.dict()
+        house_type=HouseType(house_type.value),
+        document_id=document_id,
+        total_area=result_data["total_area"],
+        total_cost=result_data["total_cost"]
     )
     
     db.add(db_calculation)
-    db.commit()
-    db.refresh(db_calculation)
+    await db.run_sync(record_calculations, [(current_user.id, house_type, result_data, 1)])
+    # The INSERT returns id and created_at, no refresh needed
+    await db.commit()
     
-    return db_calculation
+    return RawJSONResponse(
+        calculation_json(
+            db_calculation.id, house_type, input_data,
+            result_data, db_calculation.created_at
+        ),
+        status_code=status.HTTP_201_CREATED
+    )
+
+@router.post("/queue", response_model=QueuedCalculation, status_code=status.HTTP_202_ACCEPTED)
+def queue_calculation(
+    calculation_data: CalculationCreate,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Calculated now, saved by the background writer in a multi-row insert
+    input_data = calculation_data.dict(by_alias=True)
+    result = calculate_priced(calculation_data.house_type, input_data)
+    return calculation_queue.enqueue(current_user.id, calculation_data.house_type, input_data, result)
 
-@router.post("/calculate", response_model=CalculationResult)
+@router.get("/queue/{entry_id}", response_model=QueuedCalculation)
+async def get_queued_calculation(
+    entry_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # With wait set, long-polls up to that many seconds for the write
+    if wait:
+        entry = await calculation_queue.wait(entry_id, current_user.id, wait)
+    else:
+        entry = calculation_queue.status(entry_id, current_user.id)
+
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Queued calculation not found"
+        )
+
+    return entry
+
+@router.post("/calculate", response_model=CalculationResult, dependencies=[Depends(query_budget(1))])
 def calculate(
     calculation_data: CalculationCreate,
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     # Just calculate without saving to database
-    return calculate_materials(calculation_data.house_type, calculation_data.dict(by_alias=True))
+    result = calculate_priced(calculation_data.house_type, calculation_data.dict(by_alias=True))
+    return result_response(result)
 
-@router.get("/", response_model=List[CalculationResponse])
-def get_user_calculations(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    skip: int = 0,
-    limit: int = 100
+@router.get("/cache/stats")
+def get_cache_stats(
+    current_user: User = Depends(get_current_active_user)
 ) -> Any:
-    calculations = db.query(Calculation).filter(
-        Calculation.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    # Only admin users can inspect the result cache
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view cache statistics"
+        )
     
-    return calculations
+    return result_cache.stats()
+
+@router.get("/stats", response_model=UserCalculationStatsResponse, dependencies=[Depends(query_budget(3))])
+async def get_my_calculation_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Read from the summary tables, kept current by every save
+    stats = await db.get(UserCalculationStats, current_user.id)
+    materials = (await db.scalars(
+        select(UserMaterialTotal).where(UserMaterialTotal.user_id == current_user.id)
+        .order_by(UserMaterialTotal.name, UserMaterialTotal.unit)
+    )).all()
+    return summary_stats(stats, materials)
+
+@router.get("/stats/house-types", response_model=List[HouseTypeStatsResponse])
+async def get_house_type_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Only admin users can see totals across all users
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view house type statistics"
+        )
+
+    materials = {}
+    for material in await db.scalars(
+        select(HouseTypeMaterialTotal).order_by(HouseTypeMaterialTotal.name, HouseTypeMaterialTotal.unit)
+    ):
+        materials.setdefault(material.house_type, []).append(material)
+    return [
+        {"house_type": stats.house_type.value, **summary_stats(stats, materials.get(stats.house_type, []))}
+        for stats in await db.scalars(select(HouseTypeStats).order_by(HouseTypeStats.house_type))
+    ]
+
+@router.post("/batch", response_model=List[CalculationResult])
+def calculate_batch(
+    batch_data: CalculationBatchCreate,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Calculate a whole batch of houses in one vectorized pass, results keep the input order.
+    # The numpy engine is imported on first use, not when a worker starts
+    from app.models.batch import calculate_materials_batch
+    with phase("engine"):
+        results = calculate_materials_batch([
+            (calculation.house_type, calculation.dict(by_alias=True))
+            for calculation in batch_data.calculations
+        ])
+        results = [
+            price_result(calculation.house_type, result)
+            for calculation, result in zip(batch_data.calculations, results)
+        ]
+    return results_response(results)
+
+def get_own_job(job_id: str, current_user: User) -> Job:
+    job = job_manager.get(job_id)
+    # Jobs live in the worker process that accepted them
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.post("/jobs", response_model=BatchJobStatus, status_code=status.HTTP_202_ACCEPTED)
+def create_batch_job(
+    batch_data: CalculationBatchCreate,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Large batches are sharded across worker processes, poll the job for progress
+    try:
+        job = job_manager.submit(current_user.id, [
+            (calculation.house_type.value, calculation.dict(by_alias=True))
+            for calculation in batch_data.calculations
+        ])
+    except JobLimitError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc)
+        )
+    return job.progress()
+
+@router.get("/jobs/{job_id}", response_model=BatchJobStatus)
+def get_batch_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    return get_own_job(job_id, current_user).progress()
 
-@router.get("/{calculation_id}", response_model=CalculationResponse)
-def get_calculation(
+@router.post("/jobs/{job_id}/cancel", response_model=BatchJobStatus)
+def cancel_batch_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    job = get_own_job(job_id, current_user)
+    job_manager.cancel(job)
+    return job.progress()
+
+@router.get("/jobs/{job_id}/results")
+def get_batch_job_results(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    job = get_own_job(job_id, current_user)
+    if job.status != COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is {job.status}"
+        )
+
+    def lines():
+        # Priced here, the price index lives in this process. One result per
+        # line, in the order of the submitted calculations
+        for house_type, result in zip(job.house_types, job.merged_results()):
+            priced = price_result(HouseTypeEnum(house_type), CalculationResult(**result))
+            yield json.dumps(priced.dict(), ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/sweep", response_model=SweepResponse)
+def sweep_calculation(
+    sweep: SweepRequest,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Evaluates the cartesian grid of the parameters in vectorized chunks. With
+    # top set only the best points come back, otherwise every point is streamed.
+    # The chunks time themselves as the engine phase, also while streaming
+    from app.models.sweep import SweepError, evaluate, ndjson_points, top_points
+    try:
+        if sweep.top is not None:
+            points, results = top_points(sweep)
+            return {"points": points, "results": results}
+        points, results = evaluate(sweep)
+    except SweepError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+
+    return StreamingResponse(
+        ndjson_points(results),
+        media_type="application/x-ndjson",
+        headers={"X-Sweep-Points": str(points)}
+    )
+
+@router.get("/export")
+async def export_calculations_stream(
+    current_user: User = Depends(get_current_active_user),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None
+) -> Any:
+    # Users export their own history, admins any user's or everyone's
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to export other users' calculations"
+            )
+        user_id = current_user.id
+
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    rows = export_calculations(user_id, start, end, position)
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="calculations.csv"'}
+        )
+    return StreamingResponse(
+        ndjson_lines(rows),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="calculations.ndjson"'}
+    )
+
+@router.get("/", response_model=CalculationPage, dependencies=[Depends(query_budget(2))])
+async def get_user_calculations(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500)
+) -> Any:
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    # Summary columns only, full input and result come from get_calculation
+    rows = (await db.execute(
+        select(
+            Calculation.id, Calculation.house_type, Calculation.created_at,
+            Calculation.total_area, Calculation.total_cost
+        ).where(
+            Calculation.user_id == current_user.id,
+            after_cursor(position)
+        ).order_by(*history_order()).limit(limit + 1)
+    )).all()
+
+    # One extra row tells whether there is a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return RawJSONResponse({"items": [summary_content(row) for row in rows], "next_cursor": next_cursor})
+
+@router.get("/{calculation_id}", response_model=CalculationResponse, dependencies=[Depends(query_budget(2))])
+async def get_calculation(
     calculation_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
-    calculation = db.query(Calculation).filter(
+    # Columns only, the stored documents are decoded and encoded with orjson
+    # without building ORM objects or response models
+    calculation = (await db.execute(select(
+        Calculation.id, Calculation.house_type, CalculationDocument.input_data,
+        CalculationDocument.result_data, Calculation.created_at
+    ).join(Calculation.document).where(
         Calculation.id == calculation_id,
         Calculation.user_id == current_user.id
-    ).first()
+    ))).first()
     
     if not calculation:
         raise HTTPException(
@@ -74,4 +414,61 @@ def get_calculation(
             detail="Calculation not found"
         )
     
-    return calculation 
\ No newline at end of file
+    return RawJSONResponse(calculation_json(*calculation))
+
+@router.patch("/{calculation_id}", response_model=CalculationPatchResponse,
+              dependencies=[Depends(query_budget(10))])
+async def patch_calculation(
+    calculation_id: int,
+    patch: CalculationPatch,
+    include_result: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    calculation = await db.scalar(select(Calculation).options(joinedload(Calculation.document)).where(
+        Calculation.id == calculation_id,
+        Calculation.user_id == current_user.id
+    ))
+
+    if not calculation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Calculation not found"
+        )
+
+    # Reuse the cached per-component sums unless the saved input moved on.
+    # Pricing may reload the price index, so all of it runs off the event loop
+    house_type = HouseTypeEnum(calculation.house_type.value)
+    document = calculation.document
+    try:
+        parts, result = await run_in_threadpool(
+            patch_priced, house_type, component_cache.get(calculation.id), document.input_data, patch
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    delta = material_delta(document.result_data or {}, result)
+
+    # Point at the document for the new content, then let go of the old one
+    result_data = result.dict()
+    document_ids = await db.run_sync(store_documents, [(house_type, parts.input_data, result_data)])
+    await db.run_sync(release_documents, [calculation.document_id])
+    await db.run_sync(record_calculations, [
+        (current_user.id, house_type, document.result_data, -1),
+        (current_user.id, house_type, result_data, 1),
+    ])
+    calculation.document_id = document_ids[0]
+    calculation.total_area = result.total_area
+    calculation.total_cost = result.total_cost
+    await db.commit()
+    component_cache.set(calculation.id, parts)
+
+    return RawJSONResponse({
+        "id": calculation.id,
+        "total_area": result.total_area,
+        "total_cost": result.total_cost,
+        "delta": [change.dict() for change in delta],
+        "result": result_content(result) if include_result else None
+    })
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Any, List
-from app.database.database import get_db
-from app.models.schemas import MaterialCreate, MaterialResponse, HouseTypeEnum
-from app.models.models import Material, User, HouseType
+import io
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from app.database.database import AsyncSessionLocal, SessionLocal, get_async_db
+from app.models.schemas import MaterialCreate, MaterialResponse, MaterialImportReport, HouseTypeEnum
+from app.models.models import Material, User, HouseType, MaterialType
+from app.models.pricing import bump_catalog_version, get_catalog_version, price_index
+from app.models.catalog_cache import CACHE_CONTROL, catalog_cache, etag_matches, serialize_material, serialize_materials
+from app.models.catalog_import import FORMATS, ImportFormatError, import_materials
 from app.auth.jwt import get_current_active_user
 
 router = APIRouter(
@@ -12,55 +20,112 @@ router = APIRouter(
     responses={401: {"description": "Unauthorized"}},
 )
 
+async def catalog_version() -> int:
+    # The price index already follows the catalog version, it checks the
+    # database at most once per PRICE_INDEX_REFRESH_SECONDS
+    if price_index.version is None or price_index.due():
+        await run_in_threadpool(price_index.refresh_if_stale)
+    return price_index.version
+
+async def load_versioned(load: Callable[[AsyncSession], Awaitable[bytes]]) -> Tuple[int, bytes]:
+    # The version and the body come from one transaction, on PostgreSQL from
+    # one snapshot, so the body is the catalog at exactly that version. The
+    # version is read first: elsewhere a write in between can only make the
+    # body newer than its tag, never older
+    async with AsyncSessionLocal() as db:
+        if db.bind.dialect.name == "postgresql":
+            await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = await db.run_sync(get_catalog_version)
+        return version, await load(db)
+
+async def cached_catalog(
+    request: Request,
+    scope: str,
+    load: Callable[[AsyncSession], Awaitable[bytes]]
+) -> Response:
+    # A body this worker already serialized is served with the version it was
+    # built from, revalidating it needs no query. Otherwise the body is loaded
+    # first, so a missing material is a 404 and never a 304
+    version = await catalog_version()
+    body = catalog_cache.get(version, scope)
+    if body is None:
+        version, body = await load_versioned(load)
+        catalog_cache.put(version, scope, body)
+
+    etag = catalog_cache.etag(version, scope)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        catalog_cache.mark_not_modified()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/", response_model=List[MaterialResponse])
-def get_materials(
-    house_type: HouseTypeEnum = None,
-    db: Session = Depends(get_db)
+async def get_materials(
+    request: Request,
+    house_type: HouseTypeEnum = None
 ) -> Any:
-    query = db.query(Material)
-    
-    if house_type:
-        query = query.filter(Material.house_type == house_type.value)
-    
-    materials = query.all()
-    return materials
+    async def load(db: AsyncSession) -> bytes:
+        query = select(Material).order_by(Material.id)
+        if house_type:
+            query = query.where(Material.house_type == HouseType(house_type.value))
+        return serialize_materials(await db.scalars(query))
+
+    scope = f"house:{house_type.value}" if house_type else "all"
+    return await cached_catalog(request, scope, load)
 
 @router.get("/house-type/{house_type}", response_model=List[MaterialResponse])
-def get_materials_by_house_type(
-    house_type: HouseTypeEnum,
-    db: Session = Depends(get_db)
+async def get_materials_by_house_type(
+    request: Request,
+    house_type: HouseTypeEnum
 ) -> Any:
-    materials = db.query(Material).filter(
-        Material.house_type == house_type.value
-    ).all()
-    
-    if not materials:
+    async def load(db: AsyncSession) -> bytes:
+        materials = (await db.scalars(select(Material).where(
+            Material.house_type == HouseType(house_type.value)
+        ).order_by(Material.id))).all()
+
+        if not materials:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No materials found for house type: {house_type}"
+            )
+
+        return serialize_materials(materials)
+
+    return await cached_catalog(request, f"house:{house_type.value}", load)
+
+@router.get("/cache/stats")
+async def get_catalog_cache_stats(
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    if not current_user.is_admin:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No materials found for house type: {house_type}"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view cache statistics"
         )
-    
-    return materials
+    return catalog_cache.stats()
 
 @router.get("/{material_id}", response_model=MaterialResponse)
-def get_material(
-    material_id: int,
-    db: Session = Depends(get_db)
+async def get_material(
+    request: Request,
+    material_id: int
 ) -> Any:
-    material = db.query(Material).filter(Material.id == material_id).first()
-    
-    if not material:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Material not found"
-        )
-    
-    return material
+    async def load(db: AsyncSession) -> bytes:
+        material = await db.scalar(select(Material).where(Material.id == material_id))
+
+        if not material:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Material not found"
+            )
+
+        return serialize_material(material)
+
+    return await cached_catalog(request, f"id:{material_id}", load)
 
 @router.post("/", response_model=MaterialResponse, status_code=status.HTTP_201_CREATED)
-def create_material(
+async def create_material(
     material_data: MaterialCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     # Only admin users can create materials
@@ -70,7 +135,15 @@ def create_material(
             detail="Not authorized to create materials"
         )
     
-    # Convert house_type from string to enum
+    # Convert type and house_type from strings to enums
+    try:
+        material_type = MaterialType(material_data.type)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid material type: {material_data.type}"
+        )
+
     house_type_value = None
     if material_data.house_type:
         house_type_value = HouseType[material_data.house_type.upper()]
@@ -78,7 +151,7 @@ def create_material(
     # Create new material
     db_material = Material(
         name=material_data.name,
-        type=material_data.type,
+        type=material_type,
         house_type=house_type_value,
         price_per_unit=material_data.price_per_unit,
         unit=material_data.unit,
@@ -86,7 +159,75 @@ def create_material(
     )
     
     db.add(db_material)
-    db.commit()
-    db.refresh(db_material)
+    try:
+        catalog_version = await db.run_sync(bump_catalog_version)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A material with this name, house type and unit already exists"
+        )
+
+    # Keep this worker's price index current without a full reload, unless
+    # another worker wrote in between and the index has to catch up
+    if not price_index.add(db_material, catalog_version):
+        await run_in_threadpool(reload_price_index)
     
-    return db_material 
\ No newline at end of file
+    return db_material
+
+def reload_price_index() -> None:
+    db = SessionLocal()
+    try:
+        price_index.load(db)
+    finally:
+        db.close()
+
+
+# Request bodies above this size are spooled to a temporary file while they upload
+IMPORT_SPOOL_BYTES = 1024 * 1024
+
+
+def run_import(upload, format: str) -> dict:
+    db = SessionLocal()
+    try:
+        stream = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+        return import_materials(db, stream, format)
+    finally:
+        db.close()
+
+
+@router.post("/import", response_model=MaterialImportReport)
+async def import_catalog(
+    request: Request,
+    format: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+) -> Any:
+    # Only admin users can import materials
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to import materials"
+        )
+
+    content_type = request.headers.get("content-type", "")
+    format = format or ("ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv")
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported import format: {format}"
+        )
+
+    # The body is read as it arrives and parsed row by row from the spool,
+    # so a large catalog never sits in memory whole
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        try:
+            return await run_in_threadpool(run_import, upload, format)
+        except (ImportFormatError, UnicodeDecodeError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc)
+            )
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
-from app.database.database import get_db
+from app.database.database import get_async_db
 from app.models.schemas import UserResponse
 from app.models.models import User
-from app.auth.jwt import get_current_active_user, get_password_hash
+from app.auth.jwt import get_current_active_user
+from app.auth.hashing import hash_password
+from app.models.profiling import query_budget
 
 router = APIRouter(
     prefix="/api/users",
@@ -13,24 +15,19 @@ router = APIRouter(
 )
 
 @router.get("/profile", response_model=UserResponse)
-def get_user_profile(
+async def get_user_profile(
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     return current_user
 
-@router.put("/profile", response_model=UserResponse)
-def update_user_profile(
+@router.put("/profile", response_model=UserResponse, dependencies=[Depends(query_budget(2))])
+async def update_user_profile(
     update_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
-    # Get user from database
-    db_user = db.query(User).filter(User.id == current_user.id).first()
-    if not db_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    # current_user is already loaded (or cached), attach it without a SELECT
+    db_user = await db.merge(current_user, load=False)
     
     # Update user fields
     if "name" in update_data:
@@ -38,26 +35,20 @@ def update_user_profile(
     if "lastname" in update_data:
         db_user.lastname = update_data["lastname"]
     if "password" in update_data:
-        db_user.hashed_password = get_password_hash(update_data["password"])
+        db_user.hashed_password = await hash_password(update_data["password"])
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     return db_user
 
-@router.put("/subscription", response_model=UserResponse)
-def update_subscription(
+@router.put("/subscription", response_model=UserResponse, dependencies=[Depends(query_budget(2))])
+async def update_subscription(
     subscription_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
-    # Get user from database
-    db_user = db.query(User).filter(User.id == current_user.id).first()
-    if not db_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    # current_user is already loaded (or cached), attach it without a SELECT
+    db_user = await db.merge(current_user, load=False)
     
     # Update subscription type
     subscription_type = subscription_data.get("subscription_type")
@@ -69,7 +60,6 @@ def update_subscription(
             detail="Invalid subscription type"
         )
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     return db_user 
\ No newline at end of file
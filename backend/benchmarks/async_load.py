@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+# Compares a sync handler (blocking Session, one threadpool thread per request)
+# with an async handler (AsyncSession on the event loop) doing the same queries
+# under the same concurrency and threadpool size. Every request also waits on a
+# simulated database round trip, which is where the two models differ.
+# Run from backend/: python -m benchmarks.async_load [--latency-ms 20 ...]
+# Uses DATABASE_URL if set, otherwise a local SQLite file. aiosqlite runs every
+# connection in its own thread, so only a PostgreSQL DATABASE_URL shows the gain
+# of not holding a threadpool thread while a query waits.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import anyio
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database.database import DATABASE_URL, SessionLocal, async_engine, engine, get_async_db, get_db
+from app.models.models import Base, Material, MaterialType
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _add_sleep_function(dbapi_connection, connection_record):
+    # SQLite has no sleep(), register one so both drivers can simulate latency
+    dbapi_connection.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000) or 0)
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _add_sleep_function)
+    event.listen(async_engine.sync_engine, "connect", _add_sleep_function)
+
+
+def latency_statement(latency_ms: float):
+    if IS_SQLITE:
+        return text("SELECT sleep(:value)").bindparams(value=latency_ms)
+    return text("SELECT pg_sleep(:value)").bindparams(value=latency_ms / 1000)
+
+
+def build_app(latency_ms: float) -> FastAPI:
+    bench_app = FastAPI()
+    statement = latency_statement(latency_ms)
+
+    @bench_app.get("/sync/{material_id}")
+    def sync_material(material_id: int, db: Session = Depends(get_db)):
+        db.execute(statement)
+        return db.query(Material).filter(Material.id == material_id).first().name
+
+    @bench_app.get("/async/{material_id}")
+    async def async_material(material_id: int, db: AsyncSession = Depends(get_async_db)):
+        await db.execute(statement)
+        return (await db.scalar(select(Material).where(Material.id == material_id))).name
+
+    return bench_app
+
+
+def prepare_database() -> int:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        material = db.query(Material).first()
+        if material is None:
+            material = Material(name="Benchmark Brick", type=MaterialType.BRICK, price_per_unit=1.0, unit="piece")
+            db.add(material)
+            db.commit()
+        return material.id
+    finally:
+        db.close()
+
+
+async def drive(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    material_id = prepare_database()
+    # Same number of threads for both modes, as a single uvicorn worker would have
+    anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+
+    transport = httpx.ASGITransport(app=build_app(args.latency_ms))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.requests} requests, concurrency {args.concurrency}, {args.threads} threads, "
+              f"{args.latency_ms} ms simulated query latency")
+        print(f"{'mode':>6} {'req/s':>9} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9}")
+        for mode in ("sync", "async"):
+            await drive(client, f"/{mode}/{material_id}", args.concurrency, args.concurrency)
+            start = time.perf_counter()
+            latencies = await drive(client, f"/{mode}/{material_id}", args.requests, args.concurrency)
+            elapsed = time.perf_counter() - start
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"{mode:>6} {args.requests / elapsed:>9.1f} {quantiles[49] * 1000:>9.1f} "
+                  f"{quantiles[94] * 1000:>9.1f} {quantiles[98] * 1000:>9.1f}")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    asyncio.run(run(parser.parse_args()))
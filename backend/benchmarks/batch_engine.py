@@ -0,0 +1,95 @@
+import gc
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.schemas import CalculationCreate, HouseTypeEnum
+from app.models.calculations import calculate_materials
+from app.models.batch import calculate_materials_batch
+
+# Compares the scalar calculate_materials loop with the vectorized batch engine.
+# Run from backend/: python -m benchmarks.batch_engine [houses ...]
+
+FOUNDATION_TYPES = ["Железобетон", "Ленточный", "Свайный"]
+ROOF_TYPES = ["Деревянная", "Металлическая"]
+WALL_MATERIALS = {
+    HouseTypeEnum.BRICK: ["Standard Brick"],
+    HouseTypeEnum.CONCRETE: ["Concrete"],
+    HouseTypeEnum.WOODEN: ["Timber", "Log"],
+    HouseTypeEnum.BLOCKS: ["Gas Block", "Foam Block"],
+}
+
+
+def make_payload(rng: random.Random, walls: int, house_type: Optional[HouseTypeEnum] = None) -> Dict[str, Any]:
+    house_type = house_type or rng.choice(list(HouseTypeEnum))
+    return {
+        "houseType": house_type.value,
+        "foundation": {
+            "width": round(rng.uniform(6, 15), 2),
+            "depth": round(rng.uniform(0.5, 2.5), 2),
+            "length": round(rng.uniform(6, 20), 2),
+            "type": rng.choice(FOUNDATION_TYPES),
+            "hasBasement": rng.random() < 0.3,
+            "hasBasementFloor": rng.random() < 0.2,
+        },
+        "walls": [
+            {
+                "width": rng.choice([1, 1.5, 2, 20, 25]),
+                "length": round(rng.uniform(2, 15), 2),
+                "height": round(rng.uniform(2.4, 3.5), 2),
+                "material": rng.choice(WALL_MATERIALS[house_type]),
+                "insulation": "Mineral Wool",
+                "finishing": rng.choice([None, "", "Plaster"]),
+            }
+            for _ in range(walls)
+        ],
+        "roof": {
+            "type": rng.choice(ROOF_TYPES),
+            "material": "Metal",
+            "length": round(rng.uniform(6, 20), 2),
+            "width": round(rng.uniform(6, 15), 2),
+        },
+    }
+
+
+def make_items(houses: int, seed: int = 42) -> List[Tuple[HouseTypeEnum, Dict[str, Any]]]:
+    rng = random.Random(seed)
+    items = []
+    for _ in range(houses):
+        calculation = CalculationCreate(**make_payload(rng, rng.randint(12, 48)))
+        items.append((calculation.house_type, calculation.dict(by_alias=True)))
+    return items
+
+
+def best_of(func, repeat: int) -> float:
+    # Like timeit: keep the garbage collector out of the measurement
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+def run(sizes: List[int]) -> None:
+    print(f"{'houses':>8} {'scalar, s':>12} {'batch, s':>12} {'speedup':>8}")
+    for houses in sizes:
+        items = make_items(houses)
+
+        scalar = [calculate_materials(house_type, data) for house_type, data in items]
+        batch = calculate_materials_batch(items)
+        if scalar != batch:
+            raise SystemExit(f"Batch results differ from scalar results for {houses} houses")
+
+        repeat = 5 if houses < 1000 else 2
+        scalar_time = best_of(lambda: [calculate_materials(t, d) for t, d in items], repeat)
+        batch_time = best_of(lambda: calculate_materials_batch(items), repeat)
+        print(f"{houses:>8} {scalar_time:>12.4f} {batch_time:>12.4f} {scalar_time / batch_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1, 100, 10000])
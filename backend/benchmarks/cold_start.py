@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Cold start of one worker: a fresh interpreter importing app.main, then
+# running the startup handlers against a database that is already set up,
+# which is what every new worker pays when autoscaling. Also prints an
+# import-time profile (python -X importtime) of the heaviest modules.
+# Run from backend/: python -m benchmarks.cold_start [--runs 10] [--target-ms 1500]
+# Exits with status 1 when the median time to ready is over the target.
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median import plus startup, in milliseconds, that a worker should stay under
+COLD_START_TARGET_MS = float(os.getenv("COLD_START_TARGET_MS", "1500"))
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def start_and_stop():
+    await app.main.app.router.startup()
+    ready = time.perf_counter()
+    await app.main.app.router.shutdown()
+    return ready
+
+ready = asyncio.run(start_and_stop())
+print(json.dumps({"import": imported - start, "startup": ready - imported}))
+"""
+
+
+def child_env(database_url: Optional[str], directory: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    if database_url:
+        env["DATABASE_URL"] = database_url
+        env.pop("ASYNC_DATABASE_URL", None)
+    env.setdefault("CALCULATION_QUEUE_PATH", os.path.join(directory, "calculation_queue.db"))
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+
+def start_worker(env: Dict[str, str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - started
+    return timings
+
+
+def summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "iterations": len(ordered),
+        "ops_per_sec": round(1 / statistics.mean(ordered), 2),
+        "p50_us": round(statistics.median(ordered) * 1e6, 1),
+        "p95_us": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1e6, 1),
+        "p99_us": round(ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)] * 1e6, 1),
+    }
+
+
+def measure_cold_start(runs: int, database_url: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    # The first run sets up a fresh database and is left out
+    directory = tempfile.mkdtemp(prefix="house-calc-cold-start-")
+    try:
+        env = child_env(database_url or "sqlite:///" + os.path.join(directory, "cold_start.db"), directory)
+        start_worker(env)
+        samples = [start_worker(env) for _ in range(runs)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "startup.import app.main": summary([sample["import"] for sample in samples]),
+        "startup.startup handlers": summary([sample["startup"] for sample in samples]),
+        "startup.ready": summary([sample["import"] + sample["startup"] for sample in samples]),
+        "startup.process": summary([sample["process"] for sample in samples]),
+    }
+
+
+def import_profile() -> List[Tuple[str, int, int]]:
+    # (module, self us, cumulative us) from python -X importtime
+    directory = tempfile.mkdtemp(prefix="house-calc-import-")
+    try:
+        env = child_env("sqlite:///" + os.path.join(directory, "import.db"), directory)
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app.main"],
+            cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+        ).stderr
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+
+def print_profile(modules: List[Tuple[str, int, int]], top: int) -> None:
+    packages: Dict[str, int] = defaultdict(int)
+    for name, own, _ in modules:
+        packages[name.split(".")[0]] += own
+    total = sum(packages.values())
+    print(f"Import time by top-level package ({total / 1000:.0f} ms in total)")
+    for package, own in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:>32} {own / 1000:>8.1f} ms {own / total:>6.1%}")
+    print(f"Slowest modules (self time)")
+    for name, own, cumulative in sorted(modules, key=lambda item: -item[1])[:top]:
+        print(f"{name:>48} {own / 1000:>8.1f} ms (cumulative {cumulative / 1000:.1f} ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure worker cold start and profile imports")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="rows in the import profile")
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS)
+    parser.add_argument("--database-url", help="already set up database, a fresh SQLite file by default")
+    args = parser.parse_args()
+
+    print_profile(import_profile(), args.top)
+    results = measure_cold_start(args.runs, args.database_url)
+    print(f"{'':>28} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, result in results.items():
+        print(f"{name:>28} {result['p50_us'] / 1000:>8.0f} {result['p95_us'] / 1000:>8.0f}")
+
+    ready = results["startup.ready"]["p50_us"] / 1000
+    print(f"Ready in {ready:.0f} ms, target {args.target_ms:.0f} ms")
+    if ready > args.target_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
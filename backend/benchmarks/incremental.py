@@ -0,0 +1,62 @@
+import random
+import sys
+from app.models.schemas import CalculationCreate, CalculationPatch
+from app.models.calculations import calculate_materials
+from app.models.incremental import apply_patch, assemble, build_parts
+from benchmarks.batch_engine import best_of, make_payload
+
+# Checks that patching a saved calculation gives exactly the full recalculation
+# of the patched input, then times one wall edit both ways.
+# Run from backend/: python -m benchmarks.incremental [walls]
+
+
+def random_patch(rng: random.Random, walls: int) -> CalculationPatch:
+    wall = make_payload(rng, 1)["walls"][0]
+    choice = rng.random()
+    if choice < 0.5 or walls == 0:
+        change = {"op": "update" if walls else "add", "index": rng.randrange(walls) if walls else None, "wall": wall}
+    elif choice < 0.75:
+        change = {"op": "add", "index": rng.randint(0, walls), "wall": wall}
+    else:
+        change = {"op": "remove", "index": rng.randrange(walls)}
+    patch = {"walls": [change]}
+    if rng.random() < 0.1:
+        patch["roof"] = make_payload(rng, 0)["roof"]
+    if rng.random() < 0.1:
+        patch["foundation"] = make_payload(rng, 0)["foundation"]
+    return CalculationPatch(**patch)
+
+
+def check_parity(houses: int, edits: int) -> int:
+    rng = random.Random(11)
+    checked = 0
+    for _ in range(houses):
+        calculation = CalculationCreate(**make_payload(rng, rng.randint(0, 48)))
+        parts = build_parts(calculation.house_type, calculation.dict(by_alias=True))
+        for _ in range(edits):
+            parts = apply_patch(parts, random_patch(rng, len(parts.walls)))
+            expected = calculate_materials(calculation.house_type, parts.input_data)
+            if assemble(parts) != expected:
+                raise SystemExit(f"Patched {calculation.house_type.value} result differs for {parts.input_data}")
+            checked += 1
+    return checked
+
+
+def run(walls: int) -> None:
+    print(f"{check_parity(50, 20)} patched results match the full recalculation")
+
+    rng = random.Random(42)
+    calculation = CalculationCreate(**make_payload(rng, walls))
+    parts = build_parts(calculation.house_type, calculation.dict(by_alias=True))
+    patch = CalculationPatch(walls=[{"op": "update", "index": walls // 2, "wall": make_payload(rng, 1)["walls"][0]}])
+    patched = apply_patch(parts, patch).input_data
+
+    repeat = 2000
+    full_time = best_of(lambda: [calculate_materials(calculation.house_type, patched) for _ in range(repeat)], 5)
+    incremental_time = best_of(lambda: [assemble(apply_patch(parts, patch)) for _ in range(repeat)], 5)
+    print(f"one wall of {walls}: full {full_time / repeat * 1e6:.1f} us, "
+          f"incremental {incremental_time / repeat * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+from typing import List
+from app.models.calculations import calculate_shard
+from app.models.jobs import BATCH_JOB_SHARD_SIZE, JobManager
+from benchmarks.batch_engine import make_items
+
+# Measures batch job throughput with 1..N worker processes against the same
+# batch computed in this process, to check how close to linear it scales.
+# Run from backend/: python -m benchmarks.process_pool [houses] [workers ...]
+
+
+def run_job(manager: JobManager, items) -> float:
+    start = time.perf_counter()
+    job = manager.submit(0, items)
+    job.done.wait()
+    elapsed = time.perf_counter() - start
+    if job.status != "completed":
+        raise SystemExit(f"Job {job.status}: {job.error}")
+    return elapsed
+
+
+def run(houses: int, worker_counts: List[int]) -> None:
+    items = [(house_type.value, data) for house_type, data in make_items(houses)]
+
+    start = time.perf_counter()
+    expected = calculate_shard(items)
+    inline_time = time.perf_counter() - start
+    print(f"{houses} houses on {os.cpu_count()} cores, shards of {BATCH_JOB_SHARD_SIZE}")
+    print(f"{'workers':>8} {'houses/s':>10} {'speedup':>8} {'efficiency':>10}")
+    print(f"{'inline':>8} {houses / inline_time:>10.0f} {'1.0x':>8} {'':>10}")
+
+    for workers in worker_counts:
+        manager = JobManager(workers, BATCH_JOB_SHARD_SIZE, retention=0)
+        try:
+            # Warm up, so process start-up is not part of the measurement
+            run_job(manager, items[:workers * BATCH_JOB_SHARD_SIZE])
+            elapsed = min(run_job(manager, items) for _ in range(3))
+            job = manager.submit(0, items)
+            job.done.wait()
+            if job.merged_results() != expected:
+                raise SystemExit(f"Results with {workers} workers differ from the inline results")
+        finally:
+            manager.shutdown()
+        speedup = inline_time / elapsed
+        print(f"{workers:>8} {houses / elapsed:>10.0f} {speedup:>7.1f}x {speedup / workers:>9.0%}")
+
+
+if __name__ == "__main__":
+    houses = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    run(houses, [int(arg) for arg in sys.argv[2:]] or default_workers)
@@ -0,0 +1,49 @@
+import sys
+from typing import Any, Dict, List
+from app.models.schemas import HouseTypeEnum
+from app.models.calculations import CALCULATORS, REFERENCE_CALCULATORS
+from app.models.batch import calculate_materials_batch
+from app.models.rules import RULES_VERSION
+from benchmarks.batch_engine import best_of, make_items
+
+# Checks that the calculators compiled from the rule table produce exactly the
+# same results as the reference calculate_*_house functions, then times both.
+# Run from backend/: python -m benchmarks.rules_parity [houses]
+
+# Hand-built payloads with missing keys and empty sections
+EDGE_CASES: List[Dict[str, Any]] = [
+    {},
+    {"walls": []},
+    {"foundation": {"width": 3, "type": "Железобетон", "has_basement": True, "has_basement_floor": True}},
+    {"walls": [{"length": 2, "height": 3, "width": 1}, {"length": 2.5, "height": 3, "finishing": "x"}]},
+    {"roof": {"type": "Деревянная", "length": 4, "width": 5}},
+]
+
+
+def check_parity(houses: int) -> int:
+    items = make_items(houses, seed=7)
+    items += [(house_type, data) for house_type in HouseTypeEnum for data in EDGE_CASES]
+
+    batch = calculate_materials_batch(items)
+    for (house_type, data), batch_result in zip(items, batch):
+        expected = REFERENCE_CALCULATORS[house_type](data)
+        compiled = CALCULATORS[house_type](data)
+        if compiled != expected:
+            raise SystemExit(f"Compiled {house_type.value} calculator differs for {data}")
+        if batch_result != expected:
+            raise SystemExit(f"Batch {house_type.value} calculator differs for {data}")
+    return len(items)
+
+
+def run(houses: int) -> None:
+    checked = check_parity(houses)
+    print(f"rules {RULES_VERSION}: {checked} payloads match the reference calculators")
+
+    items = make_items(houses)
+    reference_time = best_of(lambda: [REFERENCE_CALCULATORS[t](d) for t, d in items], 3)
+    compiled_time = best_of(lambda: [CALCULATORS[t](d) for t, d in items], 3)
+    print(f"reference {reference_time:.4f}s, compiled {compiled_time:.4f}s for {houses} houses")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app.models.batch import calculate_materials_batch
+from app.models.models import HouseType
+from app.models.schemas import CalculationResponse, CalculationResult
+from app.models.serialization import calculation_json, results_response
+from benchmarks.batch_engine import best_of, make_items
+
+# Compares the default response path (response model validation, then the
+# standard JSON encoder) with the orjson fast path, for result lists of
+# growing size and for a stored calculation read back from the database.
+# Run from backend/: python -m benchmarks.serialization [results ...]
+
+
+LOOP = asyncio.new_event_loop()
+
+
+def default_body(field, content) -> bytes:
+    # What FastAPI does for a route with response_model and JSONResponse
+    value = LOOP.run_until_complete(serialize_response(field=field, response_content=content))
+    return JSONResponse(value).body
+
+
+def run(sizes: List[int]) -> None:
+    items = make_items(max(sizes))
+    results = calculate_materials_batch(items)
+    list_field = create_response_field(name="response", type_=List[CalculationResult])
+    stored_field = create_response_field(name="response", type_=CalculationResponse)
+
+    print(f"{'results':>8} {'bytes':>10} {'default':>12} {'fast':>12} {'speedup':>8}")
+    for size in sizes:
+        content = results[:size]
+        body = results_response(content).body
+        if json.loads(body) != json.loads(default_body(list_field, content)):
+            raise SystemExit(f"Fast path output differs for {size} results")
+        repeat = max(1, 2000 // size)
+        default_time = best_of(lambda: [default_body(list_field, content) for _ in range(repeat)], 5) / repeat
+        fast_time = best_of(lambda: [results_response(content).body for _ in range(repeat)], 5) / repeat
+        print(f"{size:>8} {len(body):>10} {default_time * 1e6:>10.1f}us {fast_time * 1e6:>10.1f}us "
+              f"{default_time / fast_time:>7.1f}x")
+
+    # A saved calculation: the default path parses both JSON columns and
+    # validates them, the fast path splices the stored text into the response
+    house_type, input_data = items[0]
+    input_text = json.dumps(input_data)
+    result_text = json.dumps(results[0].dict())
+    created_at = datetime(2026, 10, 18, 9, 0, 0)
+
+    def default_stored():
+        row = SimpleNamespace(id=1, house_type=HouseType(house_type.value), input_data=json.loads(input_text),
+                              result_data=json.loads(result_text), created_at=created_at)
+        return default_body(stored_field, row)
+
+    def fast_stored():
+        return calculation_json(1, HouseType(house_type.value), input_text, result_text, created_at)
+
+    if json.loads(fast_stored()) != json.loads(default_stored()):
+        raise SystemExit("Fast path output differs for a stored calculation")
+    repeat = 2000
+    default_time = best_of(lambda: [default_stored() for _ in range(repeat)], 5) / repeat
+    fast_time = best_of(lambda: [fast_stored() for _ in range(repeat)], 5) / repeat
+    print(f"{'stored':>8} {len(fast_stored()):>10} {default_time * 1e6:>10.1f}us {fast_time * 1e6:>10.1f}us "
+          f"{default_time / fast_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1, 10, 100, 1000])
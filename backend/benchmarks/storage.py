@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from app.models.calculations import calculate_materials
+from app.models.compact import INPUT_LAYOUT, RESULT_LAYOUT, decode, encode
+from benchmarks.batch_engine import best_of, make_items
+
+# Compares calculation documents stored as JSON text with the compact binary
+# encoding: bytes per row, database file size, and the time to read and decode
+# every row back, using SQLite files so both sides pay the same page reads.
+# Run from backend/: python -m benchmarks.storage [calculations]
+
+
+def build_database(path: str, rows) -> int:
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE calculations (id INTEGER PRIMARY KEY, input_data BLOB, result_data BLOB)")
+    connection.executemany("INSERT INTO calculations (input_data, result_data) VALUES (?, ?)", rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+    return os.path.getsize(path)
+
+
+def read_all(path: str, loads) -> None:
+    connection = sqlite3.connect(path)
+    try:
+        for input_data, result_data in connection.execute("SELECT input_data, result_data FROM calculations"):
+            loads(input_data)
+            loads(result_data)
+    finally:
+        connection.close()
+
+
+def run(calculations: int) -> None:
+    documents = []
+    for house_type, data in make_items(calculations):
+        documents.append((data, calculate_materials(house_type, data).dict()))
+
+    # What the JSON column held: json.dumps with the default separators
+    json_rows = [(json.dumps(data), json.dumps(result)) for data, result in documents]
+    compact_rows = [(encode(data, INPUT_LAYOUT), encode(result, RESULT_LAYOUT)) for data, result in documents]
+    for (data, result), (input_blob, result_blob) in zip(documents, compact_rows):
+        if json.dumps(decode(input_blob)) != json.dumps(data) or decode(result_blob) != result:
+            raise SystemExit("A compact document does not decode to the original")
+
+    json_bytes = sum(len(input_text) + len(result_text) for input_text, result_text in json_rows)
+    compact_bytes = sum(len(input_blob) + len(result_blob) for input_blob, result_blob in compact_rows)
+    print(f"{calculations} calculations")
+    print(f"{'':>12} {'bytes/row':>10} {'file':>10} {'read+decode':>12}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "json.db")
+        compact_path = os.path.join(directory, "compact.db")
+        json_file = build_database(json_path, json_rows)
+        compact_file = build_database(compact_path, compact_rows)
+        json_time = best_of(lambda: read_all(json_path, json.loads), 5)
+        compact_time = best_of(lambda: read_all(compact_path, decode), 5)
+
+    print(f"{'json':>12} {json_bytes / calculations:>10.0f} {json_file / 1024:>8.0f}KB "
+          f"{json_time / calculations * 1e6:>10.1f}us")
+    print(f"{'compact':>12} {compact_bytes / calculations:>10.0f} {compact_file / 1024:>8.0f}KB "
+          f"{compact_time / calculations * 1e6:>10.1f}us")
+    print(f"compact is {compact_bytes / json_bytes:.0%} of the JSON size")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,258 @@
+import argparse
+import functools
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Reproducible benchmark suite: every house calculator across wall counts,
+# end-to-end requests through the whole app (middleware, auth, database) on a
+# throwaway SQLite database, and worker cold start (benchmarks/cold_start.py). Reports throughput, p50/p95/p99 latency and the
+# peak memory allocated per operation, saves the results as JSON and compares
+# them with a stored baseline, failing when one regresses past --threshold.
+# Run from backend/: python -m benchmarks.suite [--filter api] [--output results.json]
+# Timings only compare on the same machine: regenerate the baseline with
+# --save-baseline on the machine that runs the comparison.
+DIRECTORY = tempfile.mkdtemp(prefix="house-calc-bench-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(DIRECTORY, "benchmark.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["CALCULATION_QUEUE_PATH"] = os.path.join(DIRECTORY, "calculation_queue.db")
+
+from fastapi.testclient import TestClient
+from app.models.calculations import (
+    calculate_blocks_house, calculate_brick_house, calculate_concrete_house, calculate_wooden_house
+)
+from app.models.schemas import CalculationCreate, HouseTypeEnum
+from benchmarks.batch_engine import make_payload
+from benchmarks.cold_start import measure_cold_start
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+WALL_COUNTS = (1, 10, 100, 1000)
+CALCULATORS = (
+    (HouseTypeEnum.BRICK, calculate_brick_house),
+    (HouseTypeEnum.CONCRETE, calculate_concrete_house),
+    (HouseTypeEnum.WOODEN, calculate_wooden_house),
+    (HouseTypeEnum.BLOCKS, calculate_blocks_house),
+)
+
+# Metrics checked against the baseline. Tail latencies and throughput are
+# reported, but p50 is the one stable enough to gate on
+COMPARED = ("p50_us", "alloc_peak_kb")
+
+# Fresh interpreters started for the startup.* results, at --scale 1
+COLD_START_RUNS = 10
+
+# Operations run under tracemalloc, which slows them down too much to time
+ALLOCATION_SAMPLES = 50
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def warmup_for(iterations: int) -> int:
+    return max(5, iterations // 20)
+
+
+def measure(operation: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    for _ in range(warmup_for(iterations)):
+        operation()
+
+    # Like best_of: keep the garbage collector out of the timings
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+    timings.sort()
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, ALLOCATION_SAMPLES)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            operation()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "p50_us": round(percentile(timings, 0.5) * 1e6, 1),
+        "p95_us": round(percentile(timings, 0.95) * 1e6, 1),
+        "p99_us": round(percentile(timings, 0.99) * 1e6, 1),
+        "alloc_peak_kb": round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def engine_cases(rng: random.Random, scale: float) -> Iterator[Tuple[str, Callable[[], Any], int]]:
+    for house_type, calculator in CALCULATORS:
+        for walls in WALL_COUNTS:
+            data = CalculationCreate(**make_payload(rng, walls, house_type)).dict(by_alias=True)
+            iterations = max(20, int(20000 / walls * scale))
+            operation = functools.partial(calculator, data)
+            yield f"engine.{calculator.__name__}.walls={walls}", operation, iterations
+
+
+def payloads(rng: random.Random, count: int) -> Iterator[Dict[str, Any]]:
+    # Distinct inputs, so the result cache and document deduplication never hit
+    for _ in range(count):
+        yield make_payload(rng, rng.randint(12, 48))
+
+
+def api_cases(client: TestClient, rng: random.Random, scale: float) -> Iterator[Tuple[str, Callable[[], Any], int]]:
+    user = {"email": "bench@example.com", "name": "Bench", "lastname": "User", "password": "benchmark-password"}
+    client.post("/api/register", json=user)
+    token = client.post("/api/auth/login", data={"username": user["email"], "password": user["password"]})
+    headers = {"Authorization": "Bearer " + token.json()["access_token"]}
+    # Read back by the GET cases, whichever cases --filter leaves in
+    saved = client.post("/api/calculations/", json=make_payload(rng, 24), headers=headers).json()
+
+    def request(method: str, path: str, expected: int, bodies: Optional[Iterator[Dict[str, Any]]] = None,
+                extra_headers: Optional[Dict[str, str]] = None) -> Callable[[], Any]:
+        request_headers = {**headers, **(extra_headers or {})}
+
+        def operation() -> None:
+            body = next(bodies) if bodies is not None else None
+            response = client.request(method, path, headers=request_headers, json=body)
+            if response.status_code != expected:
+                raise SystemExit(f"{method} {path} answered {response.status_code}: {response.text[:200]}")
+        return operation
+
+    iterations = max(20, int(500 * scale))
+    # Every run of both cases below takes a fresh input
+    unique = payloads(rng, 2 * (warmup_for(iterations) + iterations + ALLOCATION_SAMPLES))
+    repeated = itertools.repeat(make_payload(rng, 24))
+    yield "api.POST /api/calculations/calculate", \
+        request("POST", "/api/calculations/calculate", 200, unique), iterations
+    yield "api.POST /api/calculations/calculate (cached)", \
+        request("POST", "/api/calculations/calculate", 200, repeated), iterations
+    yield "api.POST /api/calculations/", request("POST", "/api/calculations/", 201, unique), iterations
+    yield "api.GET /api/calculations/", request("GET", "/api/calculations/", 200), iterations
+    yield "api.GET /api/calculations/{id}", request("GET", f"/api/calculations/{saved['id']}", 200), iterations
+
+    materials = client.get("/api/materials/", headers=headers)
+    etag = materials.headers["etag"]
+    material_id = materials.json()[0]["id"]
+    yield "api.GET /api/materials/", request("GET", "/api/materials/", 200), iterations
+    yield "api.GET /api/materials/ (304)", \
+        request("GET", "/api/materials/", 304, extra_headers={"If-None-Match": etag}), iterations
+    yield "api.GET /api/materials/house-type/{house_type}", \
+        request("GET", "/api/materials/house-type/brick", 200), iterations
+    yield "api.GET /api/materials/{id}", request("GET", f"/api/materials/{material_id}", 200), iterations
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        for metric in COMPARED:
+            # Startup is timed in a child process, without allocations
+            if metric not in reference or metric not in result:
+                continue
+            if reference[metric] > 0 and result[metric] > reference[metric] * (1 + threshold / 100):
+                change = result[metric] / reference[metric] - 1
+                regressions.append(f"{name}: {metric} {reference[metric]} -> {result[metric]} ({change:+.0%})")
+    return regressions
+
+
+def run(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'benchmark':<58} {'ops/s':>10} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'alloc KB':>9} {'p50 vs base':>12}")
+
+    def show(name: str, result: Dict[str, float]) -> None:
+        results[name] = result
+        reference = (baseline or {}).get("results", {}).get(name)
+        change = f"{result['p50_us'] / reference['p50_us'] - 1:+.0%}" if reference else ""
+        alloc = f"{result['alloc_peak_kb']:.1f}" if "alloc_peak_kb" in result else ""
+        print(f"{name:<58} {result['ops_per_sec']:>10.0f} {result['p50_us']:>10.1f} {result['p95_us']:>10.1f} "
+              f"{result['p99_us']:>10.1f} {alloc:>9} {change:>12}")
+
+    def report(cases: Iterator[Tuple[str, Callable[[], Any], int]]) -> None:
+        for name, operation, iterations in cases:
+            if args.filter and args.filter not in name:
+                continue
+            show(name, measure(operation, iterations))
+
+    report(engine_cases(rng, args.scale))
+    if not args.filter or args.filter.startswith("startup"):
+        for name, result in measure_cold_start(max(3, int(COLD_START_RUNS * args.scale))).items():
+            if not args.filter or args.filter in name:
+                show(name, result)
+    from app.main import app
+    with TestClient(app) as client:
+        report(api_cases(client, rng, args.scale))
+
+    document = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "scale": args.scale,
+        },
+        "results": results,
+    }
+    output = BASELINE_PATH if args.save_baseline else args.output
+    if output:
+        with open(output, "w") as target:
+            json.dump(document, target, indent=2)
+            target.write("\n")
+        print(f"Saved to {output}")
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions over {args.threshold:g}% against {args.baseline}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the calculation engine and the API")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="replace the stored baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed regression in percent")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the iteration counts")
+    parser.add_argument("--seed", type=int, default=42)
+    try:
+        status = run(parser.parse_args())
+    finally:
+        shutil.rmtree(DIRECTORY, ignore_errors=True)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import httpx
+from app.models.schemas import HouseTypeEnum
+
+# Synthetic traffic for load tests. payloads() lazily yields CalculationCreate
+# bodies with realistic shapes: the first four walls follow the foundation
+# outline, partitions are shorter, storeys set the wall height, and foundation,
+# roof, basement and material choices follow per house type weights. replay()
+# sends a weighted mix of calculate, save, read, list, materials, profile and
+# login requests at a fixed rate, in-process or against a running server.
+# Everything derives from --seed, and payloads are built one request at a time.
+# Run from backend/:
+#   python -m benchmarks.workload payloads --count 1000000 > payloads.ndjson
+#   python -m benchmarks.workload replay --rps 200 --duration 60 [--url http://localhost:8000]
+
+Weights = Tuple[Tuple[Any, float], ...]
+
+HOUSE_TYPES: Weights = (
+    (HouseTypeEnum.BRICK, 0.35), (HouseTypeEnum.WOODEN, 0.25),
+    (HouseTypeEnum.BLOCKS, 0.25), (HouseTypeEnum.CONCRETE, 0.15),
+)
+
+# Per house type: foundation types, roof types, wall materials, wall
+# thickness (bricks or blocks across, centimeters for concrete and timber),
+# insulation, and how often there is a basement
+PROFILES: Dict[HouseTypeEnum, Dict[str, Any]] = {
+    HouseTypeEnum.BRICK: {
+        "foundations": (("Железобетон", 0.55), ("Ленточный", 0.4), ("Свайный", 0.05)),
+        "roofs": (("Деревянная", 0.6), ("Металлическая", 0.4)),
+        "materials": (("Standard Brick", 1.0),),
+        "thickness": ((1, 0.15), (1.5, 0.35), (2, 0.35), (2.5, 0.15)),
+        "insulation": (("Mineral Wool", 0.7), ("Expanded Polystyrene", 0.3)),
+        "basement": 0.35,
+    },
+    HouseTypeEnum.CONCRETE: {
+        "foundations": (("Железобетон", 0.8), ("Ленточный", 0.2)),
+        "roofs": (("Металлическая", 0.55), ("Деревянная", 0.45)),
+        "materials": (("Concrete", 1.0),),
+        "thickness": ((15, 0.2), (20, 0.45), (25, 0.25), (30, 0.1)),
+        "insulation": (("Fiberglass Insulation", 0.5), ("Mineral Wool", 0.5)),
+        "basement": 0.4,
+    },
+    HouseTypeEnum.WOODEN: {
+        "foundations": (("Свайный", 0.5), ("Ленточный", 0.35), ("Железобетон", 0.15)),
+        "roofs": (("Деревянная", 0.75), ("Металлическая", 0.25)),
+        "materials": (("Timber", 0.6), ("Log", 0.4)),
+        "thickness": ((15, 0.3), (18, 0.3), (20, 0.25), (24, 0.15)),
+        "insulation": (("Polyethylene Insulation", 0.5), ("Mineral Wool", 0.5)),
+        "basement": 0.1,
+    },
+    HouseTypeEnum.BLOCKS: {
+        "foundations": (("Ленточный", 0.55), ("Железобетон", 0.4), ("Свайный", 0.05)),
+        "roofs": (("Металлическая", 0.5), ("Деревянная", 0.5)),
+        "materials": (("Gas Block", 0.6), ("Foam Block", 0.4)),
+        "thickness": ((1, 0.6), (1.5, 0.3), (2, 0.1)),
+        "insulation": (("Expanded Polystyrene", 0.6), ("Mineral Wool", 0.4)),
+        "basement": 0.25,
+    },
+}
+
+# Foundation depth range in meters by foundation type
+DEPTHS = {"Железобетон": (0.3, 1.5), "Ленточный": (0.8, 2.0), "Свайный": (1.5, 3.0)}
+STOREYS: Weights = ((1, 0.6), (2, 0.35), (3, 0.05))
+ROOF_MATERIALS: Weights = (("Metal", 0.45), ("Shingle", 0.3), ("Corrugated Roofing", 0.25))
+FINISHING: Weights = ((None, 0.5), ("Plaster", 0.3), ("Vinyl Siding", 0.1), ("Brick Veneer", 0.1))
+
+# Share of each request kind in the replayed traffic
+DEFAULT_MIX: Dict[str, float] = {
+    "calculate": 40, "save": 10, "read": 15, "list": 10, "materials": 15, "profile": 9, "login": 1,
+}
+
+
+def pick(rng: random.Random, weights: Weights) -> Any:
+    return rng.choices([value for value, _ in weights], [weight for _, weight in weights])[0]
+
+
+def wall_count(rng: random.Random) -> int:
+    # Four outer walls plus partitions, log-normal with a median of about 8
+    # and a long tail of large buildings
+    return min(max(4, round(rng.lognormvariate(2.1, 0.5))), 200)
+
+
+def make_house(rng: random.Random, house_type: Optional[HouseTypeEnum] = None) -> Dict[str, Any]:
+    house_type = house_type or pick(rng, HOUSE_TYPES)
+    profile = PROFILES[house_type]
+    width = round(rng.uniform(6, 14), 2)
+    length = round(width * rng.uniform(1.0, 1.8), 2)
+    foundation_type = pick(rng, profile["foundations"])
+    has_basement = rng.random() < profile["basement"]
+    storey_height = rng.uniform(2.7, 3.2)
+    height = round(storey_height * pick(rng, STOREYS), 2)
+    thickness = pick(rng, profile["thickness"])
+    # Partitions are one brick or block across, or 10 cm
+    partition = 10 if thickness >= 10 else 1
+    insulation = pick(rng, profile["insulation"])
+    finishing = pick(rng, FINISHING)
+
+    walls = []
+    for index in range(wall_count(rng)):
+        # The outline first, then partitions of one storey
+        outer = index < 4
+        walls.append({
+            "width": thickness if outer else partition,
+            "length": (length, width)[index % 2] if outer else round(rng.uniform(2, min(width, 6)), 2),
+            "height": height if outer else round(storey_height, 2),
+            "material": pick(rng, profile["materials"]),
+            "insulation": insulation if outer else "",
+            "finishing": finishing,
+        })
+
+    overhang = rng.uniform(0.3, 0.8)
+    return {
+        "houseType": house_type.value,
+        "foundation": {
+            "width": width,
+            "depth": round(rng.uniform(*DEPTHS[foundation_type]), 2),
+            "length": length,
+            "type": foundation_type,
+            "hasBasement": has_basement,
+            "hasBasementFloor": has_basement and rng.random() < 0.7,
+        },
+        "walls": walls,
+        "roof": {
+            "type": pick(rng, profile["roofs"]),
+            "material": pick(rng, ROOF_MATERIALS),
+            "length": round(length + 2 * overhang, 2),
+            "width": round(width + 2 * overhang, 2),
+        },
+    }
+
+
+def payloads(seed: int = 42, count: Optional[int] = None, repeat_rate: float = 0.0,
+             recent: int = 100) -> Iterator[Dict[str, Any]]:
+    # Endless unless count is given. With repeat_rate, that share of payloads
+    # resubmits one of the last `recent` houses, like users retrying or
+    # sharing templates, which is what the result cache sees in production
+    rng = random.Random(seed)
+    history: Deque[Dict[str, Any]] = deque(maxlen=recent)
+    produced = 0
+    while count is None or produced < count:
+        if history and rng.random() < repeat_rate:
+            payload = rng.choice(history)
+        else:
+            payload = make_house(rng)
+            history.append(payload)
+        produced += 1
+        yield payload
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown request kind {name!r}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class Replay:
+    # Open loop: request n is due at start + n / rps whatever happened to the
+    # earlier ones, and its latency counts from when it was due, so a slow
+    # server shows up as latency instead of quietly lowering the rate
+
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.houses = payloads(args.seed, repeat_rate=args.repeat_rate)
+        self.mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+        self.users: List[Tuple[Dict[str, str], Dict[str, str]]] = []
+        self.saved: Deque[Tuple[int, int]] = deque(maxlen=1000)
+        self.latencies: Dict[str, array] = {kind: array("d") for kind in self.mix}
+        self.errors: Dict[str, int] = {kind: 0 for kind in self.mix}
+        self.in_flight: set = set()
+
+    async def setup(self) -> None:
+        for index in range(self.args.users):
+            credentials = {"username": f"load{index}@example.com", "password": f"workload-password-{index}"}
+            await self.client.post("/api/register", json={
+                "email": credentials["username"], "name": f"Load{index}", "lastname": "Test",
+                "password": credentials["password"],
+            })
+            response = await self.client.post("/api/auth/login", data=credentials)
+            response.raise_for_status()
+            self.users.append((credentials, {"Authorization": "Bearer " + response.json()["access_token"]}))
+
+    def request(self, kind: str) -> Tuple[str, str, Dict[str, Any], Optional[Callable[[httpx.Response], None]]]:
+        user = self.rng.randrange(len(self.users))
+        credentials, headers = self.users[user]
+        if kind == "calculate":
+            return "POST", "/api/calculations/calculate", {"headers": headers, "json": next(self.houses)}, None
+        if kind == "save":
+            def remember(response: httpx.Response) -> None:
+                self.saved.append((user, response.json()["id"]))
+            return "POST", "/api/calculations/", {"headers": headers, "json": next(self.houses)}, remember
+        if kind == "read" and self.saved:
+            owner, calculation_id = self.rng.choice(self.saved)
+            return "GET", f"/api/calculations/{calculation_id}", {"headers": self.users[owner][1]}, None
+        if kind in ("read", "list"):
+            return "GET", "/api/calculations/", {"headers": headers}, None
+        if kind == "materials":
+            return "GET", "/api/materials/", {"headers": headers}, None
+        if kind == "profile":
+            return "GET", "/api/users/profile", {"headers": headers}, None
+        return "POST", "/api/auth/login", {"data": credentials}, None
+
+    async def send(self, kind: str, due: float) -> None:
+        method, path, options, on_success = self.request(kind)
+        try:
+            response = await self.client.request(method, path, **options)
+            failed = response.status_code >= 400
+            if not failed and on_success is not None:
+                on_success(response)
+        except httpx.HTTPError:
+            failed = True
+        if failed:
+            self.errors[kind] += 1
+        else:
+            self.latencies[kind].append(time.perf_counter() - due)
+
+    async def run(self) -> float:
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        interval = 1 / self.args.rps
+        total = int(self.args.rps * self.args.duration)
+        start = time.perf_counter()
+        for number in range(total):
+            due = start + number * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(self.in_flight) >= self.args.max_in_flight:
+                # Wait for a slot rather than open unbounded connections, the
+                # wait still counts in the latency of the late request
+                await asyncio.wait(self.in_flight, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(self.send(self.rng.choices(kinds, weights)[0], due))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+        if self.in_flight:
+            await asyncio.wait(self.in_flight)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> None:
+        sent = sum(len(latencies) for latencies in self.latencies.values()) + sum(self.errors.values())
+        print(f"{sent} requests in {elapsed:.1f}s, {sent / elapsed:.1f} rps (target {self.args.rps:g})")
+        print(f"{'request':>10} {'ok':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for kind, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            if ordered:
+                p50, p95, p99 = (ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000 for q in (0.5, 0.95, 0.99))
+                timings = f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {ordered[-1] * 1000:>9.1f}"
+            else:
+                timings = ""
+            print(f"{kind:>10} {len(ordered):>8} {self.errors[kind]:>7} {timings}")
+
+
+async def replay(args: argparse.Namespace) -> None:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        app = None
+    else:
+        # In-process: the app runs on this event loop through the ASGI
+        # transport, against DATABASE_URL or a throwaway SQLite database
+        directory = tempfile.mkdtemp(prefix="house-calc-workload-")
+        os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(directory, "workload.db"))
+        os.environ.setdefault("CALCULATION_QUEUE_PATH", os.path.join(directory, "calculation_queue.db"))
+        from app.main import app
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://workload", timeout=30)
+
+    try:
+        workload = Replay(client, args)
+        await workload.setup()
+        workload.report(await workload.run())
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate and replay synthetic house calculation traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("payloads", help="write CalculationCreate payloads as NDJSON")
+    generate.add_argument("--count", type=int, help="stop after this many, endless by default")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--repeat-rate", type=float, default=0.0, help="share of resubmitted recent payloads")
+
+    load = commands.add_parser("replay", help="send a request mix at a target rate")
+    load.add_argument("--url", help="server to load, the app runs in-process when omitted")
+    load.add_argument("--rps", type=float, default=50.0)
+    load.add_argument("--duration", type=float, default=10.0, help="seconds")
+    load.add_argument("--mix", help="weights such as calculate=40,save=10,read=15,list=10,materials=15,"
+                                    "profile=9,login=1")
+    load.add_argument("--users", type=int, default=10)
+    load.add_argument("--repeat-rate", type=float, default=0.2, help="share of resubmitted recent payloads")
+    load.add_argument("--max-in-flight", type=int, default=256)
+    load.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+    if args.command == "payloads":
+        for payload in payloads(args.seed, args.count, args.repeat_rate):
+            sys.stdout.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    else:
+        asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""calculation history keyset index and summary columns
+
+Revision ID: 3f1c2a9d7b01
+Revises: 
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+calculations = sa.table(
+    "calculations",
+    sa.column("id", sa.Integer),
+    sa.column("result_data", sa.JSON),
+    sa.column("total_area", sa.Float),
+    sa.column("total_cost", sa.Float),
+)
+
+
+def upgrade():
+    # Databases created by older versions of the app, which ran create_all at
+    # startup, may already have everything this revision adds. New databases
+    # are created at head by python -m app.database.init_db and never run it
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("calculations")}
+    indexes = {index["name"] for index in inspector.get_indexes("calculations")}
+
+    if "total_area" not in columns:
+        op.add_column("calculations", sa.Column("total_area", sa.Float(), nullable=True))
+    if "total_cost" not in columns:
+        op.add_column("calculations", sa.Column("total_cost", sa.Float(), nullable=True))
+    if "ix_calculations_user_created_id" not in indexes:
+        op.create_index(
+            "ix_calculations_user_created_id", "calculations", ["user_id", "created_at", "id"]
+        )
+
+    # Backfill the summary columns from the stored results, in id order batches
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(calculations.c.id, calculations.c.result_data)
+            .where(calculations.c.id > last_id, calculations.c.total_area.is_(None))
+            .order_by(calculations.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for calculation_id, result_data in rows:
+            result_data = result_data or {}
+            connection.execute(
+                calculations.update()
+                .where(calculations.c.id == calculation_id)
+                .values(total_area=result_data.get("total_area"), total_cost=result_data.get("total_cost"))
+            )
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.drop_index("ix_calculations_user_created_id", table_name="calculations")
+    op.drop_column("calculations", "total_cost")
+    op.drop_column("calculations", "total_area")
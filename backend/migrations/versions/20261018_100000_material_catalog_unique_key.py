@@ -0,0 +1,70 @@
+"""material catalog unique key for upserting imports
+
+Revision ID: 8b2e4f6a1c03
+Revises: 3f1c2a9d7b01
+Create Date: 2026-10-18 10:00:00
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c03'
+down_revision = '3f1c2a9d7b01'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+
+materials = sa.table(
+    "materials",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("type", sa.String),
+    sa.column("house_type", sa.String),
+    sa.column("price_per_unit", sa.Float),
+    sa.column("unit", sa.String),
+    sa.column("description", sa.Text),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    indexes = {index["name"] for index in inspector.get_indexes("materials")}
+
+    # Duplicates would fail the unique indexes, keep the newest row of each key.
+    # Downgrade cannot bring the others back, so every removed row is logged in
+    # full, enough to insert it again by hand
+    connection = op.get_bind()
+    newest = (
+        sa.select(sa.func.max(materials.c.id))
+        .group_by(materials.c.name, materials.c.house_type, materials.c.unit)
+    )
+    duplicates = connection.execute(
+        sa.select(materials).where(materials.c.id.not_in(newest)).order_by(materials.c.id)
+    ).mappings().all()
+    for row in duplicates:
+        log.warning("Removing duplicate material %s", dict(row))
+    if duplicates:
+        connection.execute(materials.delete().where(materials.c.id.in_([row["id"] for row in duplicates])))
+        log.warning("Removed %d duplicate materials, the newest row of each (name, house_type, unit) is kept",
+                    len(duplicates))
+
+    if "uq_materials_name_house_type_unit" not in indexes:
+        op.create_index(
+            "uq_materials_name_house_type_unit", "materials", ["name", "house_type", "unit"], unique=True,
+            postgresql_where=sa.text("house_type IS NOT NULL"), sqlite_where=sa.text("house_type IS NOT NULL"),
+        )
+    if "uq_materials_name_unit_any_house" not in indexes:
+        op.create_index(
+            "uq_materials_name_unit_any_house", "materials", ["name", "unit"], unique=True,
+            postgresql_where=sa.text("house_type IS NULL"), sqlite_where=sa.text("house_type IS NULL"),
+        )
+
+
+def downgrade():
+    op.drop_index("uq_materials_name_unit_any_house", table_name="materials")
+    op.drop_index("uq_materials_name_house_type_unit", table_name="materials")
@@ -0,0 +1,77 @@
+"""store calculation input and result documents in the compact binary encoding
+
+Revision ID: c4d7a9e2b605
+Revises: 8b2e4f6a1c03
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.models.compact import INPUT_LAYOUT, RESULT_LAYOUT, decode, encode
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7a9e2b605'
+down_revision = '8b2e4f6a1c03'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+
+def convert(source_type, target_type, transform):
+    # Copies both documents into new columns in id order batches, then swaps
+    # the new columns in under the old names
+    connection = op.get_bind()
+    op.add_column("calculations", sa.Column("input_data_new", target_type, nullable=True))
+    op.add_column("calculations", sa.Column("result_data_new", target_type, nullable=True))
+    calculations = sa.table(
+        "calculations",
+        sa.column("id", sa.Integer),
+        sa.column("input_data", source_type),
+        sa.column("result_data", source_type),
+        sa.column("input_data_new", target_type),
+        sa.column("result_data_new", target_type),
+    )
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(calculations.c.id, calculations.c.input_data, calculations.c.result_data)
+            .where(calculations.c.id > last_id)
+            .order_by(calculations.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for calculation_id, input_data, result_data in rows:
+            connection.execute(
+                calculations.update()
+                .where(calculations.c.id == calculation_id)
+                .values(
+                    input_data_new=transform(input_data, INPUT_LAYOUT),
+                    result_data_new=transform(result_data, RESULT_LAYOUT),
+                )
+            )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_column("input_data")
+        batch.drop_column("result_data")
+        batch.alter_column("input_data_new", new_column_name="input_data")
+        batch.alter_column("result_data_new", new_column_name="result_data")
+
+
+def upgrade():
+    # A database created by the app already has the binary columns
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"]: column["type"] for column in inspector.get_columns("calculations")}
+    if isinstance(columns["result_data"], sa.LargeBinary):
+        return
+
+    convert(sa.JSON, sa.LargeBinary, lambda document, layout: None if document is None else encode(document, layout))
+
+
+def downgrade():
+    convert(sa.LargeBinary, sa.JSON, lambda data, layout: None if data is None else decode(bytes(data)))
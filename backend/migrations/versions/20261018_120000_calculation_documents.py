@@ -0,0 +1,140 @@
+"""move calculation inputs and results into deduplicated calculation_documents
+
+Revision ID: e1a5c3b8d207
+Revises: c4d7a9e2b605
+Create Date: 2026-10-18 12:00:00
+
+"""
+from collections import Counter
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.compact import decode
+from app.models.documents import document_digest
+from app.models.models import HouseType
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a5c3b8d207'
+down_revision = 'c4d7a9e2b605'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+documents = sa.table(
+    "calculation_documents",
+    sa.column("id", sa.Integer),
+    sa.column("digest", sa.String),
+    sa.column("input_data", sa.LargeBinary),
+    sa.column("result_data", sa.LargeBinary),
+    sa.column("refcount", sa.Integer),
+)
+
+calculations = sa.table(
+    "calculations",
+    sa.column("id", sa.Integer),
+    sa.column("house_type", sa.String),
+    sa.column("document_id", sa.Integer),
+    sa.column("input_data", sa.LargeBinary),
+    sa.column("result_data", sa.LargeBinary),
+)
+
+
+def upgrade():
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns = {column["name"] for column in inspector.get_columns("calculations")}
+    if "input_data" not in columns:
+        # Created by the app with the documents table already in place
+        return
+
+    if not inspector.has_table("calculation_documents"):
+        op.create_table(
+            "calculation_documents",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("digest", sa.String(64), nullable=False, unique=True),
+            sa.Column("input_data", sa.LargeBinary(), nullable=True),
+            sa.Column("result_data", sa.LargeBinary(), nullable=True),
+            sa.Column("refcount", sa.Integer(), nullable=False),
+        )
+    if "document_id" not in columns:
+        with op.batch_alter_table("calculations") as batch:
+            batch.add_column(sa.Column("document_id", sa.Integer(), nullable=True))
+            batch.create_index("ix_calculations_document_id", ["document_id"])
+            batch.create_foreign_key(
+                "fk_calculations_document_id", "calculation_documents", ["document_id"], ["id"]
+            )
+
+    # Deduplicate in id order batches: identical documents collapse into one
+    # row whose refcount is the number of calculations using it. The encoded
+    # bytes are copied as they are, only the digest needs the decoded content
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(calculations.c.id, calculations.c.house_type,
+                      calculations.c.input_data, calculations.c.result_data)
+            .where(calculations.c.id > last_id, calculations.c.document_id.is_(None))
+            .order_by(calculations.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        digests = []
+        values = {}
+        for _, house_type, input_data, result_data in rows:
+            house_type = HouseType[house_type].value if house_type else None
+            digest = document_digest(
+                house_type,
+                decode(bytes(input_data)) if input_data is not None else None,
+                decode(bytes(result_data)) if result_data is not None else None,
+            )
+            digests.append(digest)
+            values.setdefault(digest, {"digest": digest, "input_data": input_data, "result_data": result_data})
+        references = Counter(digests)
+        for digest, value in values.items():
+            value["refcount"] = references[digest]
+
+        statement = dialect.insert(documents).values(list(values.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=["digest"],
+            set_={"refcount": documents.c.refcount + statement.excluded.refcount},
+        ).returning(documents.c.digest, documents.c.id)
+        ids = dict(connection.execute(statement).all())
+
+        connection.execute(
+            calculations.update()
+            .where(calculations.c.id == sa.bindparam("calculation_id"))
+            .values(document_id=sa.bindparam("new_document_id")),
+            [{"calculation_id": row[0], "new_document_id": ids[digest]} for row, digest in zip(rows, digests)],
+        )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_column("input_data")
+        batch.drop_column("result_data")
+
+
+def downgrade():
+    with op.batch_alter_table("calculations") as batch:
+        batch.add_column(sa.Column("input_data", sa.LargeBinary(), nullable=True))
+        batch.add_column(sa.Column("result_data", sa.LargeBinary(), nullable=True))
+
+    # Every calculation gets its own copy back
+    for column in ("input_data", "result_data"):
+        op.get_bind().execute(
+            calculations.update().values({
+                column: sa.select(documents.c[column])
+                .where(documents.c.id == calculations.c.document_id)
+                .scalar_subquery()
+            })
+        )
+
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_constraint("fk_calculations_document_id", type_="foreignkey")
+        batch.drop_index("ix_calculations_document_id")
+        batch.drop_column("document_id")
+    op.drop_table("calculation_documents")
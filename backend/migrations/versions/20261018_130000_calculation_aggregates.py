@@ -0,0 +1,76 @@
+"""summary tables for per-user and per-house-type calculation totals
+
+Revision ID: 5a9f0d3c6e18
+Revises: e1a5c3b8d207
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from app.models.aggregates import rebuild_aggregates
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9f0d3c6e18'
+down_revision = 'e1a5c3b8d207'
+branch_labels = None
+depends_on = None
+
+
+HOUSE_TYPE = sa.Enum("BRICK", "WOODEN", "CONCRETE", "BLOCKS", name="housetype", create_type=False)
+
+
+def totals_columns():
+    return [
+        sa.Column("calculations", sa.Integer(), nullable=False),
+        sa.Column("total_area", sa.Float(), nullable=False),
+        sa.Column("total_cost", sa.Float(), nullable=False),
+    ]
+
+
+def material_columns():
+    return [
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("unit", sa.String(), primary_key=True),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("total_price", sa.Float(), nullable=False),
+    ]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("user_calculation_stats"):
+        op.create_table(
+            "user_calculation_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            *totals_columns(),
+        )
+    if not inspector.has_table("house_type_stats"):
+        op.create_table(
+            "house_type_stats",
+            sa.Column("house_type", HOUSE_TYPE, primary_key=True),
+            *totals_columns(),
+        )
+    if not inspector.has_table("user_material_totals"):
+        op.create_table(
+            "user_material_totals",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            *material_columns(),
+        )
+    if not inspector.has_table("house_type_material_totals"):
+        op.create_table(
+            "house_type_material_totals",
+            sa.Column("house_type", HOUSE_TYPE, primary_key=True),
+            *material_columns(),
+        )
+
+    # Fill the tables from the saved calculations, in this migration's transaction
+    rebuild_aggregates(Session(bind=op.get_bind()))
+
+
+def downgrade():
+    op.drop_table("house_type_material_totals")
+    op.drop_table("user_material_totals")
+    op.drop_table("house_type_stats")
+    op.drop_table("user_calculation_stats")
@@ -0,0 +1,34 @@
+"""input digest on calculation documents, to reuse results of repeated inputs
+
+Revision ID: 7c4d2e9a1b56
+Revises: 5a9f0d3c6e18
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4d2e9a1b56'
+down_revision = '5a9f0d3c6e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("calculation_documents")}
+    indexes = {index["name"] for index in inspector.get_indexes("calculation_documents")}
+
+    # Existing documents keep a NULL digest, the next save of their input
+    # calculates once and fills it in
+    if "input_digest" not in columns:
+        op.add_column("calculation_documents", sa.Column("input_digest", sa.String(64), nullable=True))
+    if "ix_calculation_documents_input_digest" not in indexes:
+        op.create_index("ix_calculation_documents_input_digest", "calculation_documents", ["input_digest"])
+
+
+def downgrade():
+    op.drop_index("ix_calculation_documents_input_digest", table_name="calculation_documents")
+    op.drop_column("calculation_documents", "input_digest")
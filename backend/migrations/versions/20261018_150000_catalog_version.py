@@ -0,0 +1,46 @@
+"""catalog version row the workers compare to tell whether their price index is stale
+
+Revision ID: 9d2b7e4f1a63
+Revises: 7c4d2e9a1b56
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2b7e4f1a63'
+down_revision = '7c4d2e9a1b56'
+branch_labels = None
+depends_on = None
+
+
+catalog_version = sa.table(
+    "catalog_version",
+    sa.column("id", sa.Integer),
+    sa.column("version", sa.Integer),
+)
+
+
+def upgrade():
+    # Databases created by the app's create_all at startup may already have
+    # the table and its row
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("catalog_version"):
+        op.create_table(
+            "catalog_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+
+    # The single row every material write bumps
+    connection = op.get_bind()
+    exists = connection.scalar(sa.select(catalog_version.c.id).where(catalog_version.c.id == 1))
+    if exists is None:
+        op.bulk_insert(catalog_version, [{"id": 1, "version": 1}])
+
+
+def downgrade():
+    op.drop_table("catalog_version")
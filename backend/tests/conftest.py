@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import pytest
+
+# Settings are read when the app modules are imported, so the test database
+# and queue file are set before anything from app is loaded
+DIRECTORY = tempfile.mkdtemp(prefix="house-calc-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(DIRECTORY, "test.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["CALCULATION_QUEUE_PATH"] = os.path.join(DIRECTORY, "calculation_queue.db")
+# Cheap hashes, the work factor is not what the tests check
+os.environ["BCRYPT_ROUNDS"] = "4"
+# Every request is audited like in CI: one over its query budget, or repeating
+# a statement, fails with a 500. The price index reloads on every request, so
+# the budgets hold whenever the reload happens
+os.environ["QUERY_AUDIT"] = "raise"
+os.environ["PRICE_INDEX_REFRESH_SECONDS"] = "0"
+
+ADMIN = {"username": "admin@example.com", "password": "adminpassword"}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # One app for the session: startup sets up the fresh database and seeds it
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def headers(client):
+    # The admin user seeded at startup
+    token = client.post("/api/auth/login", data=ADMIN).json()["access_token"]
+    return {"Authorization": "Bearer " + token}
+
+
+@pytest.fixture
+def user_headers(client):
+    # A new user per test, so its calculation history starts empty
+    from uuid import uuid4
+    email = f"user-{uuid4().hex[:12]}@example.com"
+    user = {"email": email, "name": "Test", "lastname": "User", "password": "userpassword"}
+    assert client.post("/api/auth/register", json=user).status_code == 201
+    token = client.post("/api/auth/login", data={"username": email, "password": "userpassword"}).json()["access_token"]
+    return {"Authorization": "Bearer " + token}
+
+
+@pytest.fixture
+def save(client):
+    # Stores count generated calculations for a user and returns their ids
+    import random
+    from benchmarks.batch_engine import make_payload
+
+    def save(headers, count, seed, walls=2):
+        rng = random.Random(seed)
+        ids = []
+        for _ in range(count):
+            response = client.post("/api/calculations/", json=make_payload(rng, walls), headers=headers)
+            assert response.status_code == 201, response.text
+            ids.append(response.json()["id"])
+        return ids
+
+    return save
@@ -0,0 +1,48 @@
+import pytest
+from app.database.database import SessionLocal
+from app.models.aggregates import rebuild_aggregates
+from app.models.models import HouseTypeMaterialTotal, UserCalculationStats
+
+
+@pytest.fixture
+def db(client):
+    db = SessionLocal()
+    yield db
+    db.rollback()
+    db.close()
+
+
+def test_saved_and_patched_calculations_keep_the_totals_exact(client, user_headers, db, save):
+    save(user_headers, 5, seed=51, walls=4)
+    # A patch takes the old result out of the totals and adds the new one
+    latest = client.get("/api/calculations/", headers=user_headers).json()["items"][0]["id"]
+    patch = {"walls": [{"op": "remove", "index": 0}]}
+    assert client.patch(f"/api/calculations/{latest}", json=patch, headers=user_headers).status_code == 200
+
+    assert rebuild_aggregates(db, check=True)["differences"] == 0
+
+
+def test_check_reports_drift_and_changes_nothing(client, user_headers, db, save):
+    save(user_headers, 2, seed=52, walls=4)
+    stats = db.query(UserCalculationStats).order_by(UserCalculationStats.calculations.desc()).first()
+    stats.calculations += 3
+    material = db.query(HouseTypeMaterialTotal).first()
+    material.quantity += 10.0
+    db.flush()
+
+    report = rebuild_aggregates(db, check=True)
+    assert report["differences"] == 2
+    assert not report["rebuilt"]
+    assert {detail["table"] for detail in report["details"]} == {
+        UserCalculationStats.__tablename__, HouseTypeMaterialTotal.__tablename__,
+    }
+    assert rebuild_aggregates(db, check=True)["differences"] == 2
+
+
+def test_rebuild_replaces_drifted_totals(client, user_headers, db, save):
+    save(user_headers, 2, seed=53, walls=4)
+    db.query(UserCalculationStats).delete()
+    db.flush()
+
+    assert rebuild_aggregates(db)["differences"] > 0
+    assert rebuild_aggregates(db, check=True)["differences"] == 0
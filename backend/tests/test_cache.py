@@ -0,0 +1,54 @@
+from app.models.cache import ResultCache, cached_calculate_materials, result_cache
+from app.models.calculations import calculate_materials
+from app.models.schemas import HouseTypeEnum
+from benchmarks.batch_engine import make_items
+
+BLOCKS_HOUSE = {
+    "foundation": {"width": 10, "depth": 1, "length": 12},
+    "walls": [
+        {"length": 10, "height": 3, "width": 2, "material": "Gas Block"},
+        {"length": 0.1, "height": 0.7, "width": 3, "material": "Foam Block"},
+    ],
+    "roof": {"length": 10, "width": 12},
+}
+
+
+def test_cached_results_match_calculate_materials():
+    result_cache.clear()
+    for house_type, data in make_items(200, seed=3):
+        # First call misses and calculates, the second one is served from the cache
+        assert cached_calculate_materials(house_type, data) == calculate_materials(house_type, data)
+        assert cached_calculate_materials(house_type, data) == calculate_materials(house_type, data)
+
+
+def test_wall_order_is_part_of_the_key():
+    result_cache.clear()
+    reordered = dict(BLOCKS_HOUSE, walls=BLOCKS_HOUSE["walls"][::-1])
+    for data in (BLOCKS_HOUSE, reordered, BLOCKS_HOUSE):
+        result = cached_calculate_materials(HouseTypeEnum.BLOCKS, data)
+        assert result == calculate_materials(HouseTypeEnum.BLOCKS, data)
+        assert result.materials[1].name == data["walls"][-1]["material"]
+
+
+def test_cached_result_is_a_copy():
+    result_cache.clear()
+    first = cached_calculate_materials(HouseTypeEnum.BLOCKS, BLOCKS_HOUSE)
+    first.materials[0].quantity = -1
+    assert cached_calculate_materials(HouseTypeEnum.BLOCKS, BLOCKS_HOUSE) == \
+        calculate_materials(HouseTypeEnum.BLOCKS, BLOCKS_HOUSE)
+
+
+def test_lru_eviction_and_expiry():
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+    expired = ResultCache(max_size=2, ttl=0)
+    expired.set("a", 1)
+    assert expired.get("a") is None
+    assert expired.stats()["expirations"] == 1
@@ -0,0 +1,86 @@
+import uuid
+import pytest
+from app.database.database import SessionLocal
+from app.models.models import Material, MaterialType
+from app.models.pricing import bump_catalog_version, get_catalog_version, price_index
+
+
+def catalog_version():
+    db = SessionLocal()
+    try:
+        return get_catalog_version(db)
+    finally:
+        db.close()
+
+
+def new_material():
+    return {"name": f"Plank {uuid.uuid4().hex[:8]}", "type": "wood", "house_type": None,
+            "price_per_unit": 2.0, "unit": "m"}
+
+
+def test_the_catalog_is_tagged_with_its_version(client):
+    response = client.get("/api/materials/")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"materials-{catalog_version()}-all"'
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+
+@pytest.mark.parametrize("path", ["/api/materials/", "/api/materials/house-type/brick", "/api/materials/1"])
+def test_a_matching_tag_is_not_modified(client, path):
+    etag = client.get(path).headers["etag"]
+    for if_none_match in (etag, "W/" + etag, '"other", ' + etag, "*"):
+        response = client.get(path, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+
+def test_a_missing_material_is_not_found_whatever_the_tag(client):
+    etag = f'"materials-{catalog_version()}-id:999999"'
+    for if_none_match in (etag, "*"):
+        response = client.get("/api/materials/999999", headers={"If-None-Match": if_none_match})
+        assert response.status_code == 404
+
+
+def test_creating_a_material_changes_the_tag(client, headers):
+    old = client.get("/api/materials/").headers["etag"]
+    material = new_material()
+    assert client.post("/api/materials/", json=material, headers=headers).status_code == 201
+
+    response = client.get("/api/materials/", headers={"If-None-Match": old})
+    assert response.status_code == 200
+    assert response.headers["etag"] != old
+    assert material["name"] in {item["name"] for item in response.json()}
+
+
+def test_importing_materials_changes_the_tag(client, headers):
+    old = client.get("/api/materials/").headers["etag"]
+    name = new_material()["name"]
+    body = f"name,type,price_per_unit,unit\n{name},wood,3.5,m\n"
+    report = client.post("/api/materials/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+    assert report.json()["inserted"] == 1
+
+    response = client.get("/api/materials/", headers={"If-None-Match": old})
+    assert response.status_code == 200
+    assert response.headers["etag"] != old
+
+
+def test_a_body_is_never_tagged_with_an_older_version(client, monkeypatch):
+    # Another worker writes while this one's price index is not due for a check
+    client.get("/api/materials/")
+    monkeypatch.setattr(price_index, "refresh_seconds", 3600)
+    stale = price_index.version
+    name = new_material()["name"]
+    db = SessionLocal()
+    try:
+        db.add(Material(name=name, type=MaterialType.WOOD, price_per_unit=1.0, unit="m"))
+        bump_catalog_version(db)
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get("/api/materials/house-type/brick")
+    assert response.headers["etag"] == f'"materials-{stale + 1}-house:brick"'
+    response = client.get("/api/materials/")
+    assert name in {item["name"] for item in response.json()}
+    assert response.headers["etag"] == f'"materials-{stale + 1}-all"'
@@ -0,0 +1,130 @@
+import json
+import uuid
+import pytest
+from app.database.database import SessionLocal
+from app.models.models import HouseType, Material
+from app.models.pricing import get_catalog_version
+
+
+@pytest.fixture
+def name():
+    # A fresh material name per test, the catalog is shared by the session
+    return f"Board {uuid.uuid4().hex[:8]}"
+
+
+def import_csv(client, headers, body):
+    response = client.post("/api/materials/import", content=body, headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def import_ndjson(client, headers, records):
+    body = "\n".join(record if isinstance(record, str) else json.dumps(record) for record in records)
+    response = client.post("/api/materials/import", content=body,
+                           headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def counts(report):
+    return report["inserted"], report["updated"], report["unchanged"], report["rejected"]
+
+
+def stored(name):
+    db = SessionLocal()
+    try:
+        return {
+            material.house_type: material.price_per_unit
+            for material in db.query(Material).filter(Material.name == name)
+        }
+    finally:
+        db.close()
+
+
+def catalog_version():
+    db = SessionLocal()
+    try:
+        return get_catalog_version(db)
+    finally:
+        db.close()
+
+
+def test_csv_rows_are_counted_and_rejections_carry_their_line(client, headers, name):
+    body = (
+        "name,type,house_type,price_per_unit,unit,description\n"
+        f"{name},wood,,10,m,\n"
+        f"{name},wood,brick,12,m,for brick houses\n"
+        f"{name},plastic,,1,m,\n"
+        f"{name},wood,,not a number,m,\n"
+    )
+    report = import_csv(client, headers, body)
+    assert counts(report) == (2, 0, 0, 2)
+    assert [error["line"] for error in report["errors"]] == [4, 5]
+    assert "Invalid material type: plastic" in report["errors"][0]["error"]
+    assert "price_per_unit" in report["errors"][1]["error"]
+
+    body = (
+        "name,type,house_type,price_per_unit,unit,description\n"
+        f"{name},wood,,10,m,\n"
+        f"{name},wood,brick,15,m,for brick houses\n"
+    )
+    assert counts(import_csv(client, headers, body)) == (0, 1, 1, 0)
+    assert stored(name) == {None: 10.0, HouseType.BRICK: 15.0}
+
+
+def test_ndjson_rows_are_counted_and_bad_lines_rejected(client, headers, name):
+    report = import_ndjson(client, headers, [
+        {"name": name, "type": "wood", "price_per_unit": 4.0, "unit": "m"},
+        "{not json",
+        "[1, 2]",
+        {"name": name, "type": "wood", "house_type": "wooden", "price_per_unit": 5.0, "unit": "m"},
+        {"name": name, "type": "wood", "house_type": "castle", "price_per_unit": 5.0, "unit": "m"},
+    ])
+    assert counts(report) == (2, 0, 0, 3)
+    assert [error["line"] for error in report["errors"]] == [2, 3, 5]
+    assert stored(name) == {None: 4.0, HouseType.WOODEN: 5.0}
+
+
+def test_a_repeated_key_keeps_the_last_row(client, headers, name):
+    body = (
+        "name,type,price_per_unit,unit\n"
+        f"{name},wood,1,m\n"
+        f"{name},wood,2,m\n"
+        f"{name},wood,3,m\n"
+    )
+    assert counts(import_csv(client, headers, body)) == (1, 0, 0, 0)
+    assert stored(name) == {None: 3.0}
+
+
+def test_house_type_null_and_set_are_separate_materials(client, headers, name):
+    import_csv(client, headers, f"name,type,house_type,price_per_unit,unit\n{name},wood,,1,m\n{name},wood,brick,2,m\n")
+    # Updating the material for every house type leaves the brick one alone
+    report = import_csv(client, headers, f"name,type,price_per_unit,unit\n{name},wood,7,m\n")
+    assert counts(report) == (0, 1, 0, 0)
+    assert stored(name) == {None: 7.0, HouseType.BRICK: 2.0}
+
+
+def test_an_import_bumps_the_catalog_version_once_when_it_changes_something(client, headers, name):
+    before = catalog_version()
+    body = f"name,type,price_per_unit,unit\n{name},wood,1,m\n{name}-2,wood,1,m\n"
+    import_csv(client, headers, body)
+    assert catalog_version() == before + 1
+
+    # Nothing changed, nothing for the workers to reload
+    assert counts(import_csv(client, headers, body)) == (0, 0, 2, 0)
+    assert catalog_version() == before + 1
+
+
+def test_malformed_files_and_formats_are_a_400(client, headers):
+    response = client.post("/api/materials/import", content="name,unit\nx,m\n",
+                           headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 400
+    assert "price_per_unit" in response.json()["detail"]
+    response = client.post("/api/materials/import", params={"format": "xml"}, content="<x/>", headers=headers)
+    assert response.status_code == 400
+
+
+def test_only_admins_import(client, user_headers, name):
+    response = client.post("/api/materials/import", content=f"name,type,price_per_unit,unit\n{name},wood,1,m\n",
+                           headers={**user_headers, "Content-Type": "text/csv"})
+    assert response.status_code == 403
@@ -0,0 +1,60 @@
+import json
+import pytest
+from app.models.compact import HEADER, INPUT_LAYOUT, JSON_LAYOUT, MAGIC, RESULT_LAYOUT, decode, encode
+from app.models.calculations import calculate_materials
+from benchmarks.batch_engine import make_items
+
+
+def same(first, second):
+    # Stricter than ==, which takes 1 for 1.0
+    return json.dumps(first, sort_keys=True) == json.dumps(second, sort_keys=True)
+
+
+def layout(data):
+    return HEADER.unpack_from(data)[2]
+
+
+@pytest.fixture(scope="module")
+def documents():
+    documents = []
+    for index, (house_type, data) in enumerate(make_items(200, seed=13)):
+        result = calculate_materials(house_type, data).dict()
+        if index % 2:
+            # Priced like price_result does, some materials have no price
+            for position, item in enumerate(result["materials"]):
+                if position % 3:
+                    item["price_per_unit"] = 0.5 * position
+                    item["total_price"] = round(item["quantity"] * item["price_per_unit"], 2)
+            result["total_cost"] = sum(item["total_price"] or 0 for item in result["materials"])
+        documents.append((data, result))
+    return documents
+
+
+def test_calculation_documents_round_trip(documents):
+    for input_data, result_data in documents:
+        packed_input, packed_result = encode(input_data, INPUT_LAYOUT), encode(result_data, RESULT_LAYOUT)
+        assert layout(packed_input) == INPUT_LAYOUT and layout(packed_result) == RESULT_LAYOUT
+        assert same(decode(packed_input), input_data)
+        assert same(decode(packed_result), result_data)
+
+
+def test_documents_the_layouts_do_not_fit_are_kept_as_json(documents):
+    input_data, result_data = documents[0]
+    odd = [
+        (dict(input_data, extra="kept"), INPUT_LAYOUT),
+        (dict(input_data, walls=[dict(input_data["walls"][0], width="25")]), INPUT_LAYOUT),
+        (dict(result_data, total_area=1), RESULT_LAYOUT),
+        ({"materials": [{"name": "Plank", "quantity": 1.5}]}, RESULT_LAYOUT),
+        ([], RESULT_LAYOUT),
+    ]
+    for document, document_layout in odd:
+        packed = encode(document, document_layout)
+        assert layout(packed) == JSON_LAYOUT
+        assert same(decode(packed), document)
+
+
+def test_values_written_before_the_conversion_are_read_as_json():
+    document = {"materials": [], "total_area": 0.0}
+    assert decode(json.dumps(document).encode("utf-8")) == document
+    assert decode(json.dumps(document)) == document
+    assert not json.dumps(document).encode("utf-8").startswith(MAGIC)
@@ -0,0 +1,89 @@
+import random
+import pytest
+import app.routers.calculations as calculations
+from app.database.database import SessionLocal
+from app.models.documents import recount_documents, release_documents, store_documents
+from app.models.models import Calculation, CalculationDocument
+from benchmarks.batch_engine import make_payload
+
+
+@pytest.fixture
+def db(client):
+    db = SessionLocal()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def calculated(monkeypatch):
+    # Counts the calculations the save route actually runs
+    calls = []
+    calculate_priced = calculations.calculate_priced
+
+    def counting(house_type, data):
+        calls.append(house_type)
+        return calculate_priced(house_type, data)
+
+    monkeypatch.setattr(calculations, "calculate_priced", counting)
+    return calls
+
+
+def document_of(db, calculation_id):
+    db.expire_all()
+    return db.get(CalculationDocument, db.get(Calculation, calculation_id).document_id)
+
+
+def test_saving_the_same_input_reuses_the_stored_result(client, headers, db, calculated):
+    payload = make_payload(random.Random(21), 8)
+    first = client.post("/api/calculations/", json=payload, headers=headers).json()
+    second = client.post("/api/calculations/", json=payload, headers=headers).json()
+
+    assert len(calculated) == 1
+    assert first["result_data"] == second["result_data"]
+    document = document_of(db, first["id"])
+    assert document.id == document_of(db, second["id"]).id
+    assert document.refcount == 2
+    assert document.input_digest is not None
+
+
+def test_a_catalog_change_calculates_again(client, headers, calculated):
+    payload = make_payload(random.Random(22), 8)
+    client.post("/api/calculations/", json=payload, headers=headers)
+    material = {"name": "Test Plank", "type": "wood", "house_type": None, "price_per_unit": 1.0, "unit": "m"}
+    assert client.post("/api/materials/", json=material, headers=headers).status_code == 201
+    client.post("/api/calculations/", json=payload, headers=headers)
+    assert len(calculated) == 2
+
+
+def test_patching_releases_the_old_document(client, headers, db):
+    payload = make_payload(random.Random(23), 4)
+    ids = [client.post("/api/calculations/", json=payload, headers=headers).json()["id"] for _ in range(2)]
+    shared = document_of(db, ids[0]).id
+
+    patch = {"walls": [{"op": "remove", "index": 0}]}
+    client.patch(f"/api/calculations/{ids[0]}", json=patch, headers=headers)
+    db.expire_all()
+    assert db.get(CalculationDocument, shared).refcount == 1
+
+    client.patch(f"/api/calculations/{ids[1]}", json=patch, headers=headers)
+    db.expire_all()
+    # The last reference went away, and both now share the patched document
+    assert db.get(CalculationDocument, shared) is None
+    patched = document_of(db, ids[0])
+    assert patched.id == document_of(db, ids[1]).id and patched.refcount == 2
+
+
+def test_release_deletes_unreferenced_documents_and_recount_repairs(db):
+    documents = [("brick", {"walls": [index]}, {"materials": [], "total_area": float(index)}) for index in range(2)]
+    first, second, again = store_documents(db, documents + documents[:1])
+    assert again == first
+    assert db.get(CalculationDocument, first).refcount == 2
+
+    assert release_documents(db, [first, second, None]) == 1
+    db.expire_all()
+    assert db.get(CalculationDocument, first).refcount == 1
+    assert db.get(CalculationDocument, second) is None
+
+    # Nothing points at the first one either, recount finds it
+    assert recount_documents(db)["deleted"] >= 1
+    assert db.get(CalculationDocument, first) is None
@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+
+
+def export(client, headers, **params):
+    response = client.get("/api/calculations/export", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.text
+
+
+def test_ndjson_export_resumes_after_the_cursor(client, user_headers, save):
+    ids = save(user_headers, 5, seed=41)
+    records = [json.loads(line) for line in export(client, user_headers).splitlines()]
+    assert [record["id"] for record in records] == sorted(ids, reverse=True)
+
+    # A connection dropped after the second line picks up with the third
+    rest = [json.loads(line) for line in export(client, user_headers, cursor=records[1]["cursor"]).splitlines()]
+    assert rest == records[2:]
+
+
+def test_csv_export_resumes_after_the_cursor(client, user_headers, save):
+    save(user_headers, 4, seed=42)
+    rows = list(csv.DictReader(io.StringIO(export(client, user_headers, format="csv"))))
+    first = rows[0]["calculation_id"]
+    cursor = next(row["cursor"] for row in rows if row["calculation_id"] == first)
+
+    rest = list(csv.DictReader(io.StringIO(export(client, user_headers, format="csv", cursor=cursor))))
+    assert rest == [row for row in rows if row["calculation_id"] != first]
+
+
+def test_users_only_export_their_own_history(client, user_headers, headers, save):
+    save(user_headers, 1, seed=43)
+    admin_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    response = client.get("/api/calculations/export", params={"user_id": admin_id}, headers=user_headers)
+    assert response.status_code == 403
+
+
+def test_an_invalid_export_cursor_is_a_400(client, user_headers):
+    response = client.get("/api/calculations/export", params={"cursor": "not-a-cursor"}, headers=user_headers)
+    assert response.status_code == 400
@@ -0,0 +1,75 @@
+import math
+import uuid
+import pytest
+from passlib.hash import bcrypt
+from app.auth.hashing import password_hasher
+from app.database.database import SessionLocal
+from app.models.models import User
+
+
+@pytest.fixture
+def email(client):
+    email = f"hash-{uuid.uuid4().hex[:12]}@example.com"
+    user = {"email": email, "name": "Hash", "lastname": "User", "password": "userpassword"}
+    assert client.post("/api/auth/register", json=user).status_code == 201
+    return email
+
+
+def stored_hash(email):
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.email == email).one().hashed_password
+    finally:
+        db.close()
+
+
+def set_hash(email, hashed_password):
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.email == email).update({"hashed_password": hashed_password})
+        db.commit()
+    finally:
+        db.close()
+
+
+def login(client, email):
+    return client.post("/api/auth/login", data={"username": email, "password": "userpassword"})
+
+
+def test_a_full_pool_is_a_503_with_retry_after(client, email, monkeypatch):
+    monkeypatch.setattr(password_hasher, "pending", password_hasher.capacity)
+    monkeypatch.setattr(password_hasher, "average_seconds", 0.5)
+    rejected = password_hasher.rejected
+
+    response = login(client, email)
+    assert response.status_code == 503
+    # Long enough for the queue ahead of it to drain
+    expected = math.ceil(password_hasher.capacity / password_hasher.workers * 0.5)
+    assert response.headers["retry-after"] == str(max(expected, 1))
+    assert password_hasher.rejected == rejected + 1
+
+    # Once a slot frees up the same login goes through
+    monkeypatch.setattr(password_hasher, "pending", 0)
+    assert login(client, email).status_code == 200
+
+
+def test_a_hash_with_another_cost_is_replaced_on_login(client, email):
+    assert stored_hash(email).startswith("$2b$04$")
+    set_hash(email, bcrypt.using(rounds=5).hash("userpassword"))
+
+    assert login(client, email).status_code == 200
+    rehashed = stored_hash(email)
+    assert rehashed.startswith("$2b$04$")
+    assert bcrypt.verify("userpassword", rehashed)
+
+    # The new hash has the configured cost, the next login leaves it alone
+    assert login(client, email).status_code == 200
+    assert stored_hash(email) == rehashed
+
+
+def test_a_wrong_password_does_not_rehash(client, email):
+    old = bcrypt.using(rounds=5).hash("userpassword")
+    set_hash(email, old)
+    response = client.post("/api/auth/login", data={"username": email, "password": "wrong"})
+    assert response.status_code == 401
+    assert stored_hash(email) == old
@@ -0,0 +1,51 @@
+import random
+from app.models.calculations import calculate_materials
+from app.models.incremental import apply_patch, assemble, build_parts
+from app.models.schemas import CalculationCreate, CalculationPatch, HouseTypeEnum
+from benchmarks.batch_engine import make_payload
+from benchmarks.incremental import random_patch
+
+
+def test_patch_matches_a_full_calculation(client, headers):
+    rng = random.Random(5)
+    payload = make_payload(rng, 6)
+    saved = client.post("/api/calculations/", json=payload, headers=headers).json()
+
+    wall = make_payload(rng, 1)["walls"][0]
+    patch = {"walls": [{"op": "update", "index": 2, "wall": wall}, {"op": "remove", "index": 0}]}
+    response = client.patch(f"/api/calculations/{saved['id']}", json=patch, headers=headers)
+    assert response.status_code == 200, response.text
+
+    payload["walls"][2] = wall
+    del payload["walls"][0]
+    expected = client.post("/api/calculations/calculate", json=payload, headers=headers).json()
+    assert response.json()["result"] == expected
+    assert response.json()["total_cost"] == expected["total_cost"]
+    saved = client.get(f"/api/calculations/{saved['id']}", headers=headers).json()
+    assert saved["result_data"] == expected
+
+
+def test_patch_out_of_range_is_rejected(client, headers):
+    saved = client.post("/api/calculations/", json=make_payload(random.Random(6), 2), headers=headers).json()
+    response = client.patch(f"/api/calculations/{saved['id']}",
+                            json={"walls": [{"op": "remove", "index": 5}]}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_patched_parts_match_the_full_calculation():
+    rng = random.Random(11)
+    for _ in range(100):
+        calculation = CalculationCreate(**make_payload(rng, rng.randint(0, 48)))
+        parts = build_parts(calculation.house_type, calculation.dict(by_alias=True))
+        for _ in range(20):
+            parts = apply_patch(parts, random_patch(rng, len(parts.walls)))
+            # Bit for bit, also when a running sum sits on a rounding boundary
+            assert assemble(parts) == calculate_materials(calculation.house_type, parts.input_data)
+
+
+def test_running_sums_follow_removed_walls():
+    wall = {"width": 2, "length": 10, "height": 3, "material": "Gas Block", "insulation": "x"}
+    parts = build_parts(HouseTypeEnum.BLOCKS, {"walls": [wall, dict(wall, material="Foam Block")]})
+    parts = apply_patch(parts, CalculationPatch(walls=[{"op": "remove", "index": 1}, {"op": "remove", "index": 0}]))
+    assert parts.wall_sums == (0,) * len(parts.wall_sums)
+    assert assemble(parts) == calculate_materials(HouseTypeEnum.BLOCKS, parts.input_data)
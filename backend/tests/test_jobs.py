@@ -0,0 +1,126 @@
+from concurrent.futures import Executor, Future
+import pytest
+from app.models.calculations import calculate_shard
+from app.models.jobs import CANCELLED, COMPLETED, FAILED, RUNNING, JobLimitError, JobManager, job_manager
+from benchmarks.batch_engine import make_items
+
+
+class ManualExecutor(Executor):
+    # Runs submitted shards only when the test says so, in any order
+
+    def __init__(self):
+        self.queued = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.queued.append((future, fn, args, kwargs))
+        return future
+
+    def run(self, index=0):
+        future, fn, args, kwargs = self.queued.pop(index)
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+
+    def run_all(self):
+        while self.queued:
+            self.run()
+
+
+@pytest.fixture
+def executor():
+    return ManualExecutor()
+
+
+@pytest.fixture
+def manager(executor):
+    return JobManager(workers=1, shard_size=2, retention=3600, max_per_user=3, max_calculations=20,
+                      executor=executor)
+
+
+def items(count, seed=91):
+    return [(house_type.value, data) for house_type, data in make_items(count, seed=seed)]
+
+
+def test_progress_counts_finished_shards(manager, executor):
+    job = manager.submit(1, items(5))
+    assert job.progress()["status"] == RUNNING
+    assert (job.progress()["completed"], job.progress()["total"]) == (0, 5)
+
+    executor.run()
+    assert job.progress()["completed"] == 2
+    assert job.progress()["progress"] == 0.4
+    executor.run_all()
+    assert job.progress()["status"] == COMPLETED
+    assert job.progress()["progress"] == 1.0
+
+
+def test_results_keep_input_order_whatever_order_shards_finish(manager, executor):
+    batch = items(7)
+    job = manager.submit(1, batch)
+    while executor.queued:
+        executor.run(len(executor.queued) - 1)
+    assert job.status == COMPLETED
+    assert job.merged_results() == calculate_shard(batch)
+
+
+def test_cancel_stops_queued_shards_and_drops_results(manager, executor):
+    job = manager.submit(1, items(6))
+    executor.run()
+    manager.cancel(job)
+    assert job.status == CANCELLED
+    assert job.results == []
+    assert [future.cancelled() for future in job.futures] == [False, True, True]
+    executor.run_all()
+    assert job.progress()["completed"] == 2
+
+
+def test_a_failing_shard_fails_the_job(manager, executor):
+    job = manager.submit(1, [("castle", {})])
+    executor.run()
+    assert job.status == FAILED
+    assert "castle" in job.error
+
+
+def test_a_new_job_drops_the_users_oldest_finished_job(manager, executor):
+    jobs = [manager.submit(1, items(1, seed)) for seed in range(3)]
+    executor.run_all()
+    other = manager.submit(2, items(1))
+    newest = manager.submit(1, items(1))
+
+    assert manager.get(jobs[0].id) is None
+    assert all(manager.get(job.id) is job for job in (jobs[1], jobs[2], other, newest))
+
+
+def test_a_user_with_only_running_jobs_is_refused(manager):
+    for seed in range(3):
+        manager.submit(1, items(1, seed))
+    with pytest.raises(JobLimitError):
+        manager.submit(1, items(1))
+    # Other users are not held back by it
+    manager.submit(2, items(1))
+
+
+def test_the_calculation_cap_drops_finished_jobs_then_refuses(manager, executor):
+    finished = manager.submit(1, items(8))
+    executor.run_all()
+    running = manager.submit(2, items(8))
+
+    # With 8 finished and 8 running, 10 more only fit once the finished job goes
+    manager.submit(3, items(10))
+    assert manager.get(finished.id) is None
+    assert manager.get(running.id) is running
+    with pytest.raises(JobLimitError):
+        manager.submit(3, items(3))
+    with pytest.raises(JobLimitError):
+        manager.submit(4, items(21))
+
+
+def test_a_refused_job_is_a_429(client, headers, monkeypatch):
+    monkeypatch.setattr(job_manager, "max_calculations", 1)
+    calculations = [{"houseType": house_type, **data} for house_type, data in items(2)]
+    response = client.post("/api/calculations/jobs", json={"calculations": calculations}, headers=headers)
+    assert response.status_code == 429
@@ -0,0 +1,47 @@
+import re
+from app.models import profiling
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return response.text
+
+
+def sample(text, name, **labels):
+    # The value of one series, None when the scrape does not have it
+    label_text = ",".join(f'{label}="{value}"' for label, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(label_text)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_pool_checkouts_are_scraped(client):
+    before = sample(scrape(client), "db_pool_checkout_seconds_count", pool="async") or 0
+    client.get("/api/materials/")
+    text = scrape(client)
+    assert "# TYPE db_pool_checkout_seconds histogram" in text
+    assert sample(text, "db_pool_checkout_seconds_count", pool="async") > before
+    assert sample(text, "db_pool_checkout_seconds_bucket", pool="async", le="+Inf") is not None
+
+
+def test_routes_are_scraped_by_template(client, headers):
+    client.get("/api/materials/1")
+    client.get("/api/materials/999999")
+    client.get("/api/auth/me", headers=headers)
+    text = scrape(client)
+
+    route = {"method": "GET", "route": "/api/materials/{material_id}"}
+    assert sample(text, "http_request_duration_seconds_count", **route, status="200") >= 1
+    assert sample(text, "http_request_duration_seconds_count", **route, status="404") >= 1
+    assert sample(text, "http_request_duration_seconds_bucket", **route, status="200", le="+Inf") >= 1
+    assert 'route="/api/materials/1"' not in text
+    assert sample(text, "http_request_phase_seconds_count", method="GET", route="/api/auth/me", phase="auth") >= 1
+    assert sample(text, "http_request_db_queries_count", **route) >= 2
+
+
+def test_scrapes_need_the_token_when_one_is_set(client, monkeypatch):
+    monkeypatch.setattr(profiling, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
@@ -0,0 +1,43 @@
+from datetime import datetime
+import pytest
+from app.models.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 18, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "bnVsbA", "WyJ4IiwxXQ"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_the_history_once_newest_first(client, user_headers, save):
+    # Saved within the same second on sqlite, so the id breaks the ties
+    ids = save(user_headers, 7, seed=31)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/calculations/", params=params, headers=user_headers).json()
+        assert len(page["items"]) <= 3
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_the_last_full_page_has_no_next_cursor(client, user_headers, save):
+    save(user_headers, 2, seed=32)
+    page = client.get("/api/calculations/", params={"limit": 2}, headers=user_headers).json()
+    assert len(page["items"]) == 2
+    assert page["next_cursor"] is None
+
+
+def test_an_invalid_cursor_is_a_400(client, user_headers):
+    response = client.get("/api/calculations/", params={"cursor": "not-a-cursor"}, headers=user_headers)
+    assert response.status_code == 400
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import event
+from app.auth.principal import principal_cache
+from app.database.database import SessionLocal, async_engine
+from app.models.models import User
+
+
+@pytest.fixture
+def user_id(client, user_headers):
+    return client.get("/api/auth/me", headers=user_headers).json()["id"]
+
+
+@pytest.fixture
+def user_queries():
+    # Statements that read the users table, as the requests issue them
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def test_a_cached_principal_skips_the_user_query(client, user_headers, user_id, user_queries):
+    principal_cache.invalidate(user_id)
+    assert client.get("/api/auth/me", headers=user_headers).status_code == 200
+    assert len(user_queries) == 1
+    assert principal_cache.get(user_id) is not None
+
+    for _ in range(3):
+        assert client.get("/api/auth/me", headers=user_headers).status_code == 200
+    assert len(user_queries) == 1
+
+
+def test_a_profile_change_is_seen_by_the_next_request(client, user_headers, user_id):
+    client.get("/api/auth/me", headers=user_headers)
+    response = client.put("/api/users/profile", json={"name": "Renamed"}, headers=user_headers)
+    assert response.status_code == 200
+    assert principal_cache.get(user_id) is None
+    assert client.get("/api/auth/me", headers=user_headers).json()["name"] == "Renamed"
+
+
+def test_deactivating_a_user_drops_the_cached_principal(client, user_headers, user_id):
+    assert client.get("/api/auth/me", headers=user_headers).status_code == 200
+    assert principal_cache.get(user_id) is not None
+
+    # Any session that commits the change invalidates, not only the routes
+    db = SessionLocal()
+    try:
+        db.get(User, user_id).is_active = False
+        db.commit()
+    finally:
+        db.close()
+    assert principal_cache.get(user_id) is None
+    assert client.get("/api/auth/me", headers=user_headers).status_code == 400
+
+
+def test_a_rolled_back_change_keeps_the_cached_principal(client, user_headers, user_id):
+    client.get("/api/auth/me", headers=user_headers)
+    db = SessionLocal()
+    try:
+        db.get(User, user_id).is_active = False
+        db.flush()
+        db.rollback()
+    finally:
+        db.close()
+    assert principal_cache.get(user_id) is not None
+    assert client.get("/api/auth/me", headers=user_headers).status_code == 200
@@ -0,0 +1,62 @@
+import random
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.auth.principal import principal_cache
+from app.database.database import engine
+from app.models.profiling import ProfilingMiddleware, query_budget
+from benchmarks.batch_engine import make_payload
+
+
+@pytest.fixture
+def saved(client, headers):
+    return client.post("/api/calculations/", json=make_payload(random.Random(31), 6), headers=headers).json()
+
+
+def budgeted_requests(saved):
+    payload = make_payload(random.Random(32), 12)
+    wall = make_payload(random.Random(33), 1)["walls"][0]
+    return [
+        ("POST", "/api/calculations/", payload),
+        # The same input again, served from its stored document
+        ("POST", "/api/calculations/", payload),
+        ("POST", "/api/calculations/calculate", payload),
+        ("GET", "/api/calculations/stats", None),
+        ("GET", "/api/calculations/", None),
+        ("GET", f"/api/calculations/{saved['id']}", None),
+        ("PATCH", f"/api/calculations/{saved['id']}", {"walls": [{"op": "add", "wall": wall}]}),
+        ("PUT", "/api/users/profile", {"name": "Admin"}),
+        ("PUT", "/api/users/subscription", {"subscription_type": "premium"}),
+    ]
+
+
+@pytest.mark.parametrize("cached_user", [False, True])
+def test_budgeted_routes_stay_within_their_budget(client, headers, saved, cached_user):
+    for method, path, body in budgeted_requests(saved):
+        if not cached_user:
+            # The budgets include loading the user on a principal cache miss
+            principal_cache.clear()
+        response = client.request(method, path, json=body, headers=headers)
+        assert response.status_code < 400, f"{method} {path}: {response.text}"
+
+
+def test_a_route_over_its_budget_answers_500():
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/one", dependencies=[Depends(query_budget(1))])
+    def one():
+        with engine.connect() as connection:
+            return connection.scalar(text("SELECT 1"))
+
+    @app.get("/two", dependencies=[Depends(query_budget(1))])
+    def two():
+        with engine.connect() as connection:
+            return connection.scalar(text("SELECT 1")) + connection.scalar(text("SELECT 2"))
+
+    with TestClient(app) as client:
+        assert client.get("/one").json() == 1
+        response = client.get("/two")
+        assert response.status_code == 500
+        assert "2 statements, budget is 1" in response.json()["detail"]
@@ -0,0 +1,25 @@
+import pytest
+from app.models.batch import calculate_materials_batch
+from app.models.calculations import CALCULATORS, REFERENCE_CALCULATORS
+from app.models.schemas import HouseTypeEnum
+from benchmarks.batch_engine import make_items
+from benchmarks.rules_parity import EDGE_CASES
+
+ITEMS = make_items(300, seed=7)
+
+
+@pytest.mark.parametrize("house_type", list(HouseTypeEnum))
+@pytest.mark.parametrize("data", EDGE_CASES)
+def test_compiled_calculator_matches_reference_on_edge_cases(house_type, data):
+    assert CALCULATORS[house_type](data) == REFERENCE_CALCULATORS[house_type](data)
+
+
+def test_compiled_calculators_match_reference_exactly():
+    # Exact equality, every quantity to the last bit and every name in order
+    for house_type, data in ITEMS:
+        assert CALCULATORS[house_type](data) == REFERENCE_CALCULATORS[house_type](data), data
+
+
+def test_batch_engine_matches_reference_exactly():
+    for (house_type, data), result in zip(ITEMS, calculate_materials_batch(ITEMS)):
+        assert result == REFERENCE_CALCULATORS[house_type](data), data
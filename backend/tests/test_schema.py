@@ -0,0 +1,111 @@
+import os
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+from app.database.init_db import (
+    SCHEMA_VERSION, SchemaVersionError, check_schema, schema_version, upgrade_database,
+)
+from app.models.models import Base
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The tables as the app created them before the first migration
+BASELINE_TABLES = (
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY, email VARCHAR, name VARCHAR, lastname VARCHAR,
+        hashed_password VARCHAR, is_active BOOLEAN, is_admin BOOLEAN, subscription_type VARCHAR
+    )""",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE materials (
+        id INTEGER NOT NULL PRIMARY KEY, name VARCHAR, type VARCHAR(10), house_type VARCHAR(8),
+        price_per_unit FLOAT, unit VARCHAR, description TEXT
+    )""",
+    "CREATE INDEX ix_materials_id ON materials (id)",
+    "CREATE INDEX ix_materials_name ON materials (name)",
+    """CREATE TABLE calculations (
+        id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER REFERENCES users (id), house_type VARCHAR(8),
+        input_data JSON, result_data JSON, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+    )""",
+    "CREATE INDEX ix_calculations_id ON calculations (id)",
+)
+
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND, "migrations"))
+    return config
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine("sqlite:///" + str(tmp_path / "schema.db"))
+    yield engine
+    engine.dispose()
+
+
+def test_schema_version_is_the_migration_head():
+    assert ScriptDirectory.from_config(alembic_config()).get_heads() == [SCHEMA_VERSION]
+
+
+def test_migrating_a_baseline_database_reaches_the_models(engine, monkeypatch):
+    with engine.begin() as connection:
+        for statement in BASELINE_TABLES:
+            connection.execute(text(statement))
+    monkeypatch.setenv("DATABASE_URL", str(engine.url))
+    upgrade_database(engine)
+
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+        assert connection.scalar(text("SELECT version FROM catalog_version WHERE id = 1")) is not None
+    check_schema(engine)
+
+
+def test_an_empty_database_is_set_up_once(engine):
+    assert schema_version(engine) is None
+    check_schema(engine)
+    assert schema_version(engine) == SCHEMA_VERSION
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT count(*) FROM users")) == 1
+
+    # Already at the head: nothing is created or seeded again
+    check_schema(engine)
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT count(*) FROM users")) == 1
+
+
+def test_an_old_revision_is_refused(engine):
+    check_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE alembic_version SET version_num = '5a9f0d3c6e18'"))
+    with pytest.raises(SchemaVersionError, match="at revision 5a9f0d3c6e18"):
+        check_schema(engine)
+
+
+def test_tables_without_a_revision_are_refused(engine):
+    Base.metadata.create_all(bind=engine)
+    with pytest.raises(SchemaVersionError, match="not versioned"):
+        check_schema(engine)
+
+
+def test_an_older_revision_is_migrated_to_the_head(engine, monkeypatch):
+    check_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE catalog_version"))
+        connection.execute(text("UPDATE alembic_version SET version_num = '7c4d2e9a1b56'"))
+    monkeypatch.setenv("DATABASE_URL", str(engine.url))
+    upgrade_database(engine)
+
+    assert schema_version(engine) == SCHEMA_VERSION
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT count(*) FROM catalog_version")) == 1
+
+
+def test_an_empty_database_is_created_without_the_migrations(engine):
+    upgrade_database(engine)
+    assert schema_version(engine) == SCHEMA_VERSION
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
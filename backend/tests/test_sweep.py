@@ -0,0 +1,121 @@
+import copy
+import itertools
+import json
+import random
+import pytest
+from app.models.profiling import RequestProfile, current_profile
+from app.models.schemas import HouseTypeEnum, SweepRequest
+from app.models.sweep import SweepError, evaluate, parameter_values
+from app.routers.calculations import calculate_priced
+from benchmarks.batch_engine import make_payload
+
+BASE = make_payload(random.Random(81), 3)
+
+
+def sweep(client, headers, parameters, **options):
+    return client.post("/api/calculations/sweep", json={"base": BASE, "parameters": parameters, **options},
+                       headers=headers)
+
+
+def streamed(response):
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def expected(parameters):
+    # What one calculation of the base with these values set gives
+    data = copy.deepcopy(BASE)
+    for path, value in parameters.items():
+        parts = path.split(".")
+        if parts[0] != "walls":
+            data[parts[0]][parts[1]] = value
+        elif len(parts) == 2:
+            for wall in data["walls"]:
+                wall[parts[1]] = value
+        else:
+            data["walls"][int(parts[1])][parts[2]] = value
+    return calculate_priced(HouseTypeEnum(data["houseType"]), data).dict()
+
+
+def test_value_lists_cover_the_grid_in_order(client, headers):
+    parameters = [
+        {"path": "walls.height", "values": [2.5, 3.1]},
+        {"path": "walls.1.finishing", "values": ["", "Plaster"]},
+        {"path": "roof.material", "values": ["Metal", "Tile", "Slate"]},
+    ]
+    response = sweep(client, headers, parameters)
+    points = streamed(response)
+    assert response.headers["x-sweep-points"] == "12"
+
+    grid = itertools.product(*(parameter["values"] for parameter in parameters))
+    for index, (point, values) in enumerate(zip(points, grid)):
+        assert point["index"] == index
+        assert point["parameters"] == {parameter["path"]: value for parameter, value in zip(parameters, values)}
+        assert point["result"] == expected(point["parameters"])
+
+
+def test_numeric_ranges_include_the_stop():
+    parameter = SweepRequest(base=BASE, parameters=[{"path": "foundation.depth", "start": 2.5, "stop": 3.0,
+                                                     "step": 0.1}]).parameters[0]
+    assert parameter_values(parameter) == [2.5, 2.6, 2.7, 2.8, 2.9, 3.0]
+
+
+def test_a_range_sweep_matches_single_calculations(client, headers):
+    points = streamed(sweep(client, headers, [
+        {"path": "foundation.depth", "start": 1, "stop": 2, "step": 0.25},
+        {"path": "walls.0.width", "start": 40, "stop": 10, "step": -15},
+    ]))
+    assert len(points) == 15
+    for point in points:
+        assert point["result"] == expected(point["parameters"])
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort_by", ["total_cost", "total_area"])
+def test_top_points_are_the_best_of_the_grid(client, headers, sort_by, descending):
+    parameters = [
+        {"path": "walls.length", "start": 5, "stop": 15, "step": 2.5},
+        {"path": "roof.width", "values": [8, 10, 12]},
+    ]
+    everything = streamed(sweep(client, headers, parameters))
+    response = sweep(client, headers, parameters, top=4, sort_by=sort_by, descending=descending)
+    assert response.status_code == 200, response.text
+    top = response.json()
+
+    ranked = sorted(everything, key=lambda point: point["result"][sort_by], reverse=descending)
+    assert top["points"] == len(everything)
+    assert [point["result"][sort_by] for point in top["results"]] == [point["result"][sort_by] for point in ranked[:4]]
+
+
+@pytest.mark.parametrize("parameter", [
+    {"path": "chimney.height", "values": [1]},
+    {"path": "walls.9.height", "values": [1]},
+    {"path": "walls.0.height.extra", "values": [1]},
+    {"path": "foundation.colour", "values": [1]},
+    {"path": "foundation.depth", "values": []},
+    {"path": "foundation.depth", "start": 1, "stop": 2},
+    {"path": "foundation.depth", "start": 1, "stop": 2, "step": 0},
+    {"path": "foundation.depth", "start": 2, "stop": 1, "step": 0.5},
+    {"path": "foundation.depth", "values": ["deep"]},
+    {"path": "foundation.depth", "start": 0, "stop": 1000000, "step": 1},
+])
+def test_invalid_parameters_are_a_400(client, headers, parameter):
+    response = sweep(client, headers, [parameter])
+    assert response.status_code == 400
+
+
+def test_a_sweep_needs_a_parameter():
+    with pytest.raises(SweepError):
+        evaluate(SweepRequest(base=BASE, parameters=[]))
+
+
+def test_streamed_chunks_are_timed_as_the_engine(client):
+    points, results = evaluate(SweepRequest(base=BASE, parameters=[{"path": "walls.height", "values": [2, 3]}]))
+    profile = RequestProfile(sampled=False)
+    token = current_profile.set(profile)
+    try:
+        assert "engine" not in profile.phases
+        assert len(list(results)) == points
+    finally:
+        current_profile.reset(token)
+    assert profile.phases["engine"] > 0
@@ -0,0 +1,117 @@
+import json
+import random
+import sqlite3
+import time
+import pytest
+from app.database.database import SessionLocal
+from app.models.aggregates import rebuild_aggregates
+from app.models.models import Calculation
+from app.models.schemas import CalculationCreate
+from app.models.write_queue import QUEUED, SCHEMA, STORED, WRITING, CalculationQueue
+from app.routers.calculations import calculate_priced
+from benchmarks.batch_engine import make_payload
+
+
+@pytest.fixture
+def user_id(client, user_headers):
+    return client.get("/api/auth/me", headers=user_headers).json()["id"]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def calculation(seed):
+    data = CalculationCreate(**make_payload(random.Random(seed), 2))
+    input_data = data.dict(by_alias=True)
+    return data.house_type, input_data, calculate_priced(data.house_type, input_data)
+
+
+def wait_until_stored(queue, entry_ids, user_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entries = [queue.status(entry_id, user_id) for entry_id in entry_ids]
+        if all(entry["status"] == STORED for entry in entries):
+            return entries
+        time.sleep(0.01)
+    raise AssertionError("queued calculations were not stored")
+
+
+def saved_calculations(user_id):
+    db = SessionLocal()
+    try:
+        return db.query(Calculation).filter(Calculation.user_id == user_id).count()
+    finally:
+        db.close()
+
+
+def test_queued_calculation_is_stored_and_long_polled(client, user_headers):
+    payload = make_payload(random.Random(61), 3)
+    response = client.post("/api/calculations/queue", json=payload, headers=user_headers)
+    assert response.status_code == 202
+    entry = response.json()
+    assert entry["status"] == QUEUED
+
+    stored = client.get(f"/api/calculations/queue/{entry['id']}", params={"wait": 5}, headers=user_headers).json()
+    assert stored["status"] == STORED
+    saved = client.get(f"/api/calculations/{stored['calculation_id']}", headers=user_headers).json()
+    expected = client.post("/api/calculations/calculate", json=payload, headers=user_headers).json()
+    assert saved["result_data"] == expected
+
+
+def test_other_users_entries_are_not_found(client, headers, user_headers):
+    entry = client.post("/api/calculations/queue", json=make_payload(random.Random(62), 1), headers=headers).json()
+    response = client.get(f"/api/calculations/queue/{entry['id']}", headers=user_headers)
+    assert response.status_code == 404
+
+
+def test_a_restart_resumes_the_backlog(journal, user_id):
+    # Left behind by a worker that stopped: one entry never claimed, one
+    # claimed long ago by a writer that did not store it
+    connection = sqlite3.connect(journal, isolation_level=None)
+    connection.execute(SCHEMA)
+    for seq, (status, owner, claimed_at) in enumerate([(QUEUED, None, None), (WRITING, "gone", 0.0)]):
+        house_type, input_data, result = calculation(63 + seq)
+        connection.execute(
+            "INSERT INTO queued_calculations (id, user_id, house_type, input_data, result_data, accepted_at, status)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (f"entry-{seq}", user_id, house_type.value, json.dumps(input_data), json.dumps(result.dict()),
+             time.time(), status),
+        )
+        connection.execute("UPDATE queued_calculations SET owner = ?, claimed_at = ? WHERE id = ?",
+                           (owner, claimed_at, f"entry-{seq}"))
+    connection.close()
+
+    queue = CalculationQueue(journal, batch_size=10, window_ms=0, retention=60, claim_timeout=5)
+    queue.start()
+    try:
+        entries = wait_until_stored(queue, ["entry-0", "entry-1"], user_id)
+    finally:
+        queue.stop()
+    assert len({entry["calculation_id"] for entry in entries}) == 2
+    assert saved_calculations(user_id) == 2
+
+
+def test_workers_sharing_a_journal_store_each_entry_once(journal, user_id):
+    queues = [CalculationQueue(journal, batch_size=3, window_ms=0, retention=60) for _ in range(3)]
+    for queue in queues:
+        queue.start()
+    try:
+        entry_ids = [
+            queues[index % 3].enqueue(user_id, *calculation(70 + index))["id"]
+            for index in range(30)
+        ]
+        entries = wait_until_stored(queues[0], entry_ids, user_id)
+    finally:
+        for queue in queues:
+            queue.stop()
+
+    assert len({entry["calculation_id"] for entry in entries}) == 30
+    assert sum(queue.stored for queue in queues) == 30
+    assert saved_calculations(user_id) == 30
+    db = SessionLocal()
+    try:
+        assert rebuild_aggregates(db, check=True)["differences"] == 0
+    finally:
+        db.close()